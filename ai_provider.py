@@ -0,0 +1,316 @@
+"""OpenAI-compatible chat completion client with retries, hedging and a
+circuit breaker.
+
+    provider = ChatProvider('https://api.openai.com/v1', api_key, 'gpt-4o-mini')
+    content = provider.complete(messages)
+
+Each call is bounded by `timeout` seconds in total. Failed attempts
+(connection errors, timeouts, 429 and 5xx) are retried up to `retries`
+times, sleeping a random time up to backoff * 2**attempt ("full jitter",
+so clients that failed together do not retry in lockstep). A 429's
+Retry-After is honoured when it fits in the remaining time.
+
+With hedge_after set, an attempt that has not answered after that many
+seconds gets a second, identical request racing it; whichever answers
+first wins. This trades a few duplicate requests for a much shorter tail
+when the upstream occasionally stalls.
+
+stream() yields the reply in pieces as the provider sends them
+(server-sent events, `"stream": true`). Retries and hedging cover
+opening the stream, up to the response headers; a failure after content
+has been yielded is raised, not retried, since the caller may already
+have acted on it. A provider that ignores `stream` and answers with a
+plain completion is yielded in one piece.
+
+The circuit breaker counts calls that found the provider unavailable
+(still failing with a retryable error after all their retries); a
+refusal such as a 401 shows the provider is up and does not count.
+After `failures` in a row it opens, and calls fail at once with
+CircuitOpen instead of waiting out timeouts. After `reset_after` seconds
+one trial call is let through; its result closes or re-opens the circuit.
+
+mock_provider.py serves the same API locally for offline tests and
+benchmarks.
+"""
+
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import requests
+
+DEFAULT_BASE_URL = 'https://api.openai.com/v1'
+DEFAULT_MODEL = 'gpt-4o-mini'
+RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class ProviderError(Exception):
+    """The provider could not produce a completion.
+
+    status is the provider's HTTP status (None for network errors) and
+    details a short excerpt of its reply.
+    """
+
+    def __init__(self, message, status=None, details=None):
+        super().__init__(message)
+        self.status = status
+        self.details = details
+
+
+class CircuitOpen(ProviderError):
+    """Raised without contacting the provider while the breaker is open."""
+
+
+class _Retryable(ProviderError):
+    """A failure worth retrying: network error, timeout, 429 or 5xx."""
+
+    def __init__(self, message, status=None, details=None, retry_after=None):
+        super().__init__(message, status, details)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open -> half-open -> closed."""
+
+    def __init__(self, failures=5, reset_after=30.0):
+        self.threshold = failures
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        return 'half-open' if time.monotonic() - self.opened_at >= self.reset_after else 'open'
+
+    def allow(self):
+        """True if a call may go ahead; while half-open only one trial at a time does."""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_after or self._trial:
+                return False
+            self._trial = True
+            return True
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self._trial = False
+
+    def to_dict(self):
+        state = self.state
+        out = {'state': state, 'failures': self.failures}
+        if state == 'open':
+            out['retry_in'] = round(self.reset_after - (time.monotonic() - self.opened_at), 1)
+        return out
+
+
+# Attempts run here so a hedge can race the original request
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='ai-provider')
+
+
+def _close_result(future):
+    # Done callback for a losing attempt: close the stream it opened
+    if not future.cancelled() and future.exception() is None:
+        close = getattr(future.result(), 'close', None)
+        if close is not None:
+            close()
+
+
+class ChatProvider:
+    """Chat completions from one OpenAI-compatible endpoint."""
+
+    def __init__(self, base_url=None, api_key=None, model=None, timeout=20.0, retries=2,
+                 backoff=0.25, hedge_after=None, breaker=None):
+        self.base_url = (base_url or DEFAULT_BASE_URL).rstrip('/')
+        self.api_key = api_key
+        self.model = model or DEFAULT_MODEL
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.hedge_after = hedge_after
+        self.breaker = breaker or CircuitBreaker()
+        self.stats = {'calls': 0, 'attempts': 0, 'retries': 0, 'hedges': 0, 'hedge_wins': 0,
+                      'failures': 0, 'short_circuited': 0}
+        # Keep-alive connections to the provider, one session per worker thread
+        self._local = threading.local()
+
+    def complete(self, messages, temperature=0.0, max_tokens=512):
+        """Return the assistant message content; raises ProviderError."""
+        self.stats['calls'] += 1
+        if not self.breaker.allow():
+            self.stats['short_circuited'] += 1
+            raise CircuitOpen('AI provider unavailable (circuit open)')
+        payload = {'model': self.model, 'messages': messages,
+                   'temperature': temperature, 'max_tokens': max_tokens}
+        deadline = time.monotonic() + self.timeout
+        try:
+            content = self._with_retries(self._attempt, payload, deadline)
+        except _Retryable:
+            self.stats['failures'] += 1
+            self.breaker.failure()
+            raise
+        except ProviderError:
+            self.stats['failures'] += 1
+            self.breaker.success()
+            raise
+        self.breaker.success()
+        return content
+
+    def stream(self, messages, temperature=0.0, max_tokens=512):
+        """Yield the assistant message content piece by piece; raises ProviderError."""
+        self.stats['calls'] += 1
+        if not self.breaker.allow():
+            self.stats['short_circuited'] += 1
+            raise CircuitOpen('AI provider unavailable (circuit open)')
+        payload = {'model': self.model, 'messages': messages,
+                   'temperature': temperature, 'max_tokens': max_tokens, 'stream': True}
+        deadline = time.monotonic() + self.timeout
+        try:
+            resp = self._with_retries(self._open_stream, payload, deadline)
+            yield from self._read_stream(resp, deadline)
+        except _Retryable:
+            self.stats['failures'] += 1
+            self.breaker.failure()
+            raise
+        except ProviderError:
+            self.stats['failures'] += 1
+            self.breaker.success()
+            raise
+        except GeneratorExit:
+            # The caller stopped reading; the provider itself was fine
+            self.breaker.success()
+            raise
+        self.breaker.success()
+
+    def _with_retries(self, call, payload, deadline):
+        attempt = 0
+        while True:
+            try:
+                return self._hedged(call, payload, deadline)
+            except _Retryable as e:
+                remaining = deadline - time.monotonic()
+                if attempt >= self.retries or remaining <= 0:
+                    raise
+                delay = random.uniform(0, self.backoff * (2 ** attempt))
+                if e.retry_after is not None:
+                    delay = max(delay, e.retry_after)
+                if delay >= remaining:
+                    raise
+                attempt += 1
+                self.stats['retries'] += 1
+                time.sleep(delay)
+
+    def _hedged(self, call, payload, deadline):
+        if not self.hedge_after:
+            return call(payload, deadline)
+        first = _executor.submit(call, payload, deadline)
+        done, _ = wait([first], timeout=min(self.hedge_after, max(0.0, deadline - time.monotonic())))
+        if done:
+            return first.result()
+        self.stats['hedges'] += 1
+        hedge = _executor.submit(call, payload, deadline)
+        pending = {first, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    content = future.result()
+                except ProviderError as e:
+                    error = error or e
+                    continue
+                if future is hedge:
+                    self.stats['hedge_wins'] += 1
+                # The loser finishes in the background; a stream it opens is closed
+                (first if future is hedge else hedge).add_done_callback(_close_result)
+                return content
+        raise error
+
+    def _session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def _post(self, payload, deadline, stream=False):
+        self.stats['attempts'] += 1
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise _Retryable('AI provider timed out')
+        try:
+            resp = self._session().post(
+                self.base_url + '/chat/completions',
+                headers={'Authorization': f'Bearer {self.api_key}', 'Content-Type': 'application/json'},
+                json=payload, timeout=remaining, stream=stream)
+        except requests.Timeout:
+            raise _Retryable('AI provider timed out') from None
+        except requests.RequestException as e:
+            raise _Retryable(f'Provider request failed: {e}') from None
+        if resp.status_code != 200:
+            details = (resp.text or '')[:400]
+            resp.close()
+            if resp.status_code in RETRY_STATUS:
+                retry_after = resp.headers.get('Retry-After')
+                try:
+                    retry_after = float(retry_after) if retry_after is not None else None
+                except ValueError:
+                    retry_after = None
+                raise _Retryable('Provider returned error', resp.status_code, details, retry_after)
+            raise ProviderError('Provider returned error', resp.status_code, details)
+        return resp
+
+    @staticmethod
+    def _content(resp):
+        try:
+            return resp.json()['choices'][0]['message']['content']
+        except Exception as e:
+            raise ProviderError('Malformed provider response', resp.status_code, str(e)) from None
+
+    def _attempt(self, payload, deadline):
+        return self._content(self._post(payload, deadline))
+
+    def _open_stream(self, payload, deadline):
+        return self._post(payload, deadline, stream=True)
+
+    def _read_stream(self, resp, deadline):
+        with resp:
+            if not resp.headers.get('Content-Type', '').startswith('text/event-stream'):
+                yield self._content(resp)
+                return
+            try:
+                # chunk_size=None hands over each chunk as it arrives
+                for line in resp.iter_lines(chunk_size=None):
+                    if time.monotonic() > deadline:
+                        raise _Retryable('AI provider timed out')
+                    if not line.startswith(b'data:'):
+                        continue
+                    data = line[5:].strip()
+                    if data == b'[DONE]':
+                        return
+                    try:
+                        piece = json.loads(data)['choices'][0]['delta'].get('content')
+                    except Exception as e:
+                        raise ProviderError('Malformed provider stream', resp.status_code, str(e)) from None
+                    if piece:
+                        yield piece
+            except requests.RequestException as e:
+                raise _Retryable(f'Provider stream failed: {e}') from None
+
+    def to_dict(self):
+        return {'base_url': self.base_url, 'model': self.model, 'breaker': self.breaker.to_dict(),
+                'stats': dict(self.stats)}
@@ -0,0 +1,131 @@
+"""Server-side AI chat conversations with token-budgeted history.
+
+The chat UI sends only its new message plus a conversation id; the
+earlier turns live here. Each conversation keeps its most recent
+messages up to a token budget (not a message count), dropping the
+oldest whole turns (a user message and the replies to it) first, so what
+goes to the provider stays small no matter how long the chat runs and
+never starts with a reply cut off from its question. The latest turn is
+kept even when it alone is over the budget. Assistant turns are stored as the
+compact JSON the model replied with, which is both short and the format
+it is asked to keep using.
+
+Token counts are estimated (about four characters per token plus a
+small per-message overhead), which is close enough for a budget and
+needs no tokenizer. Conversations idle for longer than the TTL, and the
+least recently used ones beyond max_conversations, are forgotten.
+"""
+
+import secrets
+import threading
+import time
+from collections import OrderedDict, deque
+
+# Roughly what chat APIs add per message for the role and separators
+MESSAGE_OVERHEAD = 4
+ROLES = ('user', 'assistant', 'system')
+
+
+def estimate_tokens(text):
+    return MESSAGE_OVERHEAD + (len(text) + 3) // 4
+
+
+class Conversation:
+    def __init__(self, budget):
+        self.id = secrets.token_urlsafe(9)
+        self.budget = budget
+        self.messages = deque()     # {'role', 'content'}, oldest first
+        self._sizes = deque()       # [messages, tokens] per turn, oldest first
+        self.tokens = 0
+        self.turns = 0
+        self.last_used = time.monotonic()
+
+    def add(self, role, content):
+        """Append a message; a user message starts a new turn."""
+        cost = estimate_tokens(content)
+        if role == 'user' or not self._sizes:
+            self._sizes.append([0, 0])
+        size = self._sizes[-1]
+        size[0] += 1
+        size[1] += cost
+        self.messages.append({'role': role, 'content': content})
+        self.tokens += cost
+        while self.tokens > self.budget and len(self._sizes) > 1:
+            count, tokens = self._sizes.popleft()
+            for _ in range(count):
+                self.messages.popleft()
+            self.tokens -= tokens
+
+    def to_dict(self):
+        return {'conversation': self.id, 'messages': len(self.messages), 'tokens': self.tokens,
+                'turns': self.turns, 'idle': round(time.monotonic() - self.last_used, 1)}
+
+
+class ConversationStore:
+    """Conversations by id, each trimmed to `budget` estimated tokens."""
+
+    def __init__(self, budget=1500, max_conversations=64, ttl=3600.0):
+        self.budget = budget
+        self.max_conversations = max_conversations
+        self.ttl = ttl
+        self._conversations = OrderedDict()     # id -> Conversation, least recently used first
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._conversations)
+
+    def _expire(self, now):
+        # Caller holds _lock
+        while self._conversations:
+            oldest = next(iter(self._conversations.values()))
+            if now - oldest.last_used <= self.ttl and len(self._conversations) <= self.max_conversations:
+                break
+            del self._conversations[oldest.id]
+
+    def history(self, conversation_id):
+        """Messages to send before the new one, or [] for an unknown id."""
+        with self._lock:
+            self._expire(time.monotonic())
+            conv = self._conversations.get(conversation_id)
+            return list(conv.messages) if conv is not None else []
+
+    def record(self, conversation_id, user_msg, reply):
+        """Append a completed turn; starts a new conversation when the id is
+        unknown or expired. Returns the conversation id to use next time."""
+        now = time.monotonic()
+        with self._lock:
+            conv = self._conversations.get(conversation_id)
+            if conv is None:
+                conv = Conversation(self.budget)
+                self._conversations[conv.id] = conv
+            else:
+                self._conversations.move_to_end(conv.id)
+            conv.add('user', user_msg)
+            conv.add('assistant', reply)
+            conv.turns += 1
+            conv.last_used = now
+            self._expire(now)
+            return conv.id
+
+    def seed(self, messages):
+        """Start a conversation from a client-side history list (legacy
+        clients); malformed entries are coerced or skipped."""
+        with self._lock:
+            conv = Conversation(self.budget)
+            for m in messages:
+                if not isinstance(m, dict):
+                    continue
+                role = m.get('role') if m.get('role') in ROLES else 'user'
+                content = m.get('content')
+                conv.add(role, content if isinstance(content, str) else str(content or ''))
+            self._conversations[conv.id] = conv
+            self._expire(time.monotonic())
+            return conv.id
+
+    def get(self, conversation_id):
+        with self._lock:
+            return self._conversations.get(conversation_id)
+
+    def discard(self, conversation_id):
+        with self._lock:
+            return self._conversations.pop(conversation_id, None) is not None
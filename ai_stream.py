@@ -0,0 +1,123 @@
+"""Incremental parser for the model's streamed JSON reply.
+
+The model answers with one object:
+
+    {"response": "Okay, going forward", "commands": [{...}, {...}]}
+
+Fed the reply text as it streams in, ReplyParser hands back each part
+as soon as it is complete: the `response` string once its closing quote
+arrives, and every object in `commands` once its closing brace does, so
+the first command can run while the model is still writing the rest.
+
+The scanner only tracks string, escape and bracket state; each finished
+piece is then decoded with json.loads. Text before the first `{` (a
+code fence, a stray sentence) is skipped, and so is anything after the
+object closes. Entries of `commands` that are not objects are ignored.
+
+    parser = ReplyParser()
+    for chunk in provider.stream(messages):
+        for kind, value in parser.feed(chunk):
+            ...     # ('response', str), ('command', dict) or ('invalid', str)
+"""
+
+import json
+
+
+class ReplyParser:
+    def __init__(self):
+        self.response = None
+        self.commands = []
+        self.done = False
+        self._chunks = []
+        self._buf = ''          # reply text from the opening brace on
+        self._pos = 0           # next character of _buf to scan
+        self._stack = []        # open '{' / '['
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._expect_key = False
+        self._key = None        # last key of the top-level object
+        self._command_start = None
+        self._command_depth = 0
+
+    @property
+    def text(self):
+        """Everything fed so far."""
+        return ''.join(self._chunks)
+
+    def feed(self, chunk):
+        """Scan more reply text; returns the pieces it completed, in order."""
+        self._chunks.append(chunk)
+        if self.done:
+            return []
+        if not self._stack and not self._buf:
+            start = chunk.find('{')
+            if start == -1:
+                return []
+            chunk = chunk[start:]
+        self._buf += chunk
+        events = []
+        buf, stack = self._buf, self._stack
+        for i in range(self._pos, len(buf)):
+            c = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == '\\':
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if len(stack) == 1:
+                        self._top_level_string(buf[self._string_start:i + 1], events)
+            elif c == '"':
+                self._in_string = True
+                self._string_start = i
+            elif c == '{' or c == '[':
+                if c == '{' and self._key == 'commands' and self._command_start is None and (
+                        len(stack) == 1 or (len(stack) == 2 and stack[1] == '[')):
+                    self._command_start, self._command_depth = i, len(stack)
+                stack.append(c)
+                self._expect_key = len(stack) == 1
+            elif c == '}' or c == ']':
+                if stack:
+                    stack.pop()
+                if self._command_start is not None and len(stack) == self._command_depth:
+                    self._command(buf[self._command_start:i + 1], events)
+                    self._command_start = None
+                if not stack:
+                    self.done = True
+                    self._buf = buf[:i + 1]
+                    break
+            elif c == ',' and len(stack) == 1:
+                self._expect_key = True
+        self._pos = len(self._buf)
+        return events
+
+    def _top_level_string(self, raw, events):
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            return
+        if self._expect_key:
+            self._key, self._expect_key = value, False
+        elif self._key == 'response' and self.response is None:
+            self.response = value
+            events.append(('response', value))
+
+    def _command(self, raw, events):
+        try:
+            cmd = json.loads(raw)
+        except ValueError:
+            events.append(('invalid', raw))
+            return
+        self.commands.append(cmd)
+        events.append(('command', cmd))
+
+    def result(self):
+        """The whole reply object once it has closed, else None."""
+        if not self.done:
+            return None
+        try:
+            return json.loads(self._buf)
+        except ValueError:
+            return None
@@ -0,0 +1,374 @@
+"""RobotCLI command language, shared by the CLI, the web API and the AI path.
+
+Grammar:
+
+    program  := seq
+    seq      := par ( (';' | newline | 'then') par )*
+    par      := unit ( '&' unit )*
+    unit     := '{' seq '}' | call
+    call     := 'stop' [ '(' [ NAME | duration ] ')' ]
+              | ('wait' | 'sleep') '(' duration ')'
+              | NAME [ '(' duration ')' ]
+
+    duration := NUMBER                 seconds, e.g. 2.5
+              | (NUMBER UNIT)+         compound, e.g. 1m30s, 250ms, 1h 5m
+              | WORD [UNIT]            e.g. two minutes, forty seconds
+
+Examples:
+
+    motor_1(2.5)
+    forward(1m30s); left(500ms); stop
+    { forward(2); right(1) } & alarm(3)
+    lights_on(10) then wait(2) then buzzer(250ms)
+
+`stop` alone stops everything, `stop(name)` stops one alias or group and
+`stop(<duration>)` runs a group that is literally named `stop`. `then`,
+`wait` and `sleep` (RESERVED_NAMES) cannot name an alias or group.
+
+compile_program() turns source text into an immutable plan (nested
+namedtuples) and memoizes it by source string; names are only resolved
+when the plan runs, so cached plans stay valid across config changes.
+execute() walks a plan against a handler object (see PlanHandler).
+"""
+
+import re
+import threading
+import time
+from collections import namedtuple
+from functools import lru_cache
+
+DEFAULT_DURATION = 1.0
+
+Activate = namedtuple('Activate', 'target duration')  # duration None = default
+Stop = namedtuple('Stop', 'target')                   # target None = everything
+Wait = namedtuple('Wait', 'duration')
+Seq = namedtuple('Seq', 'steps')
+Par = namedtuple('Par', 'branches')
+
+
+class CommandSyntaxError(ValueError):
+    def __init__(self, message, source='', pos=None):
+        if pos is not None:
+            message = f'{message} at position {pos}'
+        super().__init__(message)
+        self.pos = pos
+        self.source = source
+
+
+# ---- Tokenizer ----
+_UNITS = {
+    'ms': 0.001, 'msec': 0.001, 'msecs': 0.001, 'millisecond': 0.001, 'milliseconds': 0.001,
+    's': 1.0, 'sec': 1.0, 'secs': 1.0, 'second': 1.0, 'seconds': 1.0,
+    'm': 60.0, 'min': 60.0, 'mins': 60.0, 'minute': 60.0, 'minutes': 60.0,
+    'h': 3600.0, 'hr': 3600.0, 'hrs': 3600.0, 'hour': 3600.0, 'hours': 3600.0,
+}
+_UNIT_RE = '|'.join(sorted(_UNITS, key=len, reverse=True))
+_NUMBER_WORDS = {
+    'zero': 0, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6,
+    'seven': 7, 'eight': 8, 'nine': 9, 'ten': 10, 'eleven': 11, 'twelve': 12,
+    'fifteen': 15, 'twenty': 20, 'thirty': 30, 'forty': 40, 'fifty': 50,
+    'sixty': 60, 'ninety': 90, 'half': 0.5,
+}
+
+_TOKEN_RE = re.compile(
+    r'(?P<ws>[ \t\r]+)'
+    r'|(?P<nl>\n)'
+    rf'|(?P<dur>(?:\d+(?:\.\d+)?|\.\d+)\s*(?:{_UNIT_RE})(?![A-Za-z])'
+    rf'(?:\s*(?:\d+(?:\.\d+)?|\.\d+)\s*(?:{_UNIT_RE})(?![A-Za-z]))*)'
+    r'|(?P<num>\d+(?:\.\d+)?|\.\d+)'
+    r'|(?P<name>[A-Za-z_]\w*)'
+    r'|(?P<op>[(){};&])',
+    re.IGNORECASE,
+)
+_DUR_PART_RE = re.compile(rf'(\d+(?:\.\d+)?|\.\d+)\s*({_UNIT_RE})', re.IGNORECASE)
+
+
+def tokenize(source):
+    """Yield (kind, text, pos) tokens; kinds: nl, dur, num, name, op."""
+    pos = 0
+    end = len(source)
+    while pos < end:
+        m = _TOKEN_RE.match(source, pos)
+        if m is None:
+            raise CommandSyntaxError(f'Unexpected character {source[pos]!r}', source, pos)
+        kind = m.lastgroup
+        if kind != 'ws':
+            yield kind, m.group(), pos
+        pos = m.end()
+
+
+def _duration_value(kind, text):
+    if kind == 'num':
+        return float(text)
+    return sum(float(n) * _UNITS[u.lower()] for n, u in _DUR_PART_RE.findall(text))
+
+
+# ---- Parser ----
+# Words the grammar takes for itself, matched in any case: an alias or
+# group with one of these names could never be called
+RESERVED_NAMES = frozenset({'then', 'wait', 'sleep'})
+
+
+class _Parser:
+    def __init__(self, source):
+        self.source = source
+        self.tokens = list(tokenize(source))
+        self.i = 0
+
+    def peek(self):
+        return self.tokens[self.i] if self.i < len(self.tokens) else (None, None, len(self.source))
+
+    def take(self):
+        tok = self.peek()
+        self.i += 1
+        return tok
+
+    def expect(self, text):
+        kind, value, pos = self.take()
+        if value != text:
+            found = repr(value) if value is not None else 'end of input'
+            raise CommandSyntaxError(f'Expected {text!r}, found {found}', self.source, pos)
+
+    def error(self, message):
+        raise CommandSyntaxError(message, self.source, self.peek()[2])
+
+    def _is_separator(self, tok):
+        kind, value, _ = tok
+        return kind == 'nl' or value == ';' or (kind == 'name' and value.lower() == 'then')
+
+    def skip_separators(self):
+        while self.peek()[0] is not None and self._is_separator(self.peek()):
+            self.take()
+
+    def program(self):
+        self.skip_separators()
+        if self.peek()[0] is None:
+            self.error('Empty command')
+        plan = self.seq()
+        if self.peek()[0] is not None:
+            self.error(f'Unexpected {self.peek()[1]!r}')
+        return plan
+
+    def seq(self):
+        steps = [self.par()]
+        while self._is_separator(self.peek()):
+            self.skip_separators()
+            if self.peek()[0] is None or self.peek()[1] == '}':
+                break  # trailing separator
+            steps.append(self.par())
+        return steps[0] if len(steps) == 1 else Seq(tuple(steps))
+
+    def par(self):
+        branches = [self.unit()]
+        while self.peek()[1] == '&':
+            self.take()
+            branches.append(self.unit())
+        return branches[0] if len(branches) == 1 else Par(tuple(branches))
+
+    def unit(self):
+        kind, value, pos = self.peek()
+        if value == '{':
+            self.take()
+            self.skip_separators()
+            inner = self.seq()
+            self.expect('}')
+            return inner
+        if kind != 'name':
+            self.error('Expected a command name' if kind else 'Unexpected end of input')
+        self.take()
+        keyword = value.lower()
+        if keyword == 'stop':
+            return self.stop_call()
+        if keyword in ('wait', 'sleep'):
+            self.expect('(')
+            duration = self.duration()
+            self.expect(')')
+            return Wait(duration)
+        duration = None
+        if self.peek()[1] == '(':
+            self.take()
+            duration = self.duration()
+            self.expect(')')
+        return Activate(value, duration)
+
+    def stop_call(self):
+        if self.peek()[1] != '(':
+            return Stop(None)
+        self.take()
+        kind, value, _ = self.peek()
+        if value == ')':
+            self.take()
+            return Stop(None)
+        if kind == 'name' and value.lower() not in _NUMBER_WORDS:
+            self.take()
+            self.expect(')')
+            return Stop(value)
+        # stop(<duration>) runs a group or alias literally named "stop"
+        duration = self.duration()
+        self.expect(')')
+        return Activate('stop', duration)
+
+    def duration(self):
+        kind, value, pos = self.take()
+        if kind in ('num', 'dur'):
+            return _duration_value(kind, value)
+        if kind == 'name' and value.lower() in _NUMBER_WORDS:
+            number = float(_NUMBER_WORDS[value.lower()])
+            unit_kind, unit, _ = self.peek()
+            if unit_kind == 'name' and unit.lower() in _UNITS:
+                self.take()
+                return number * _UNITS[unit.lower()]
+            return number
+        found = repr(value) if value is not None else 'end of input'
+        raise CommandSyntaxError(f'Expected a duration, found {found}', self.source, pos)
+
+
+@lru_cache(maxsize=1024)
+def compile_program(source):
+    """Compile source text to a plan. Memoized by source string.
+
+    Raises CommandSyntaxError (a ValueError) on invalid input.
+    """
+    return _Parser(source).program()
+
+
+def parse_duration(value, default=DEFAULT_DURATION):
+    """Parse a duration given as a number or text ('40 seconds', '1m30s', 'two min').
+
+    Returns float seconds (`default` for None); raises ValueError otherwise.
+    """
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        raise ValueError(f'Cannot parse duration: {value}')
+    if isinstance(value, (int, float)):
+        return float(value)
+    return _parse_duration_text(str(value).strip())
+
+
+@lru_cache(maxsize=256)
+def _parse_duration_text(text):
+    p = _Parser(text)
+    try:
+        duration = p.duration()
+    except CommandSyntaxError as e:
+        raise ValueError(f'Cannot parse duration: {text}') from e
+    if p.peek()[0] is not None:
+        raise ValueError(f'Cannot parse duration: {text}')
+    return duration
+
+
+# ---- Plan inspection ----
+def iter_nodes(plan):
+    """Yield every Activate/Stop/Wait node in plan order."""
+    kind = type(plan)
+    if kind is Seq:
+        for step in plan.steps:
+            yield from iter_nodes(step)
+    elif kind is Par:
+        for branch in plan.branches:
+            yield from iter_nodes(branch)
+    else:
+        yield plan
+
+
+def targets(plan):
+    """Names referenced by a plan (activations and targeted stops)."""
+    names = []
+    for node in iter_nodes(plan):
+        if type(node) is Activate or (type(node) is Stop and node.target is not None):
+            names.append(node.target)
+    return names
+
+
+def blocking_time(plan, last=True):
+    """Seconds a non-blocking executor spends waiting while running plan.
+
+    0 means the plan completes immediately (timed pins still turn off on
+    their own timers afterwards).
+    """
+    kind = type(plan)
+    if kind is Seq:
+        n = len(plan.steps)
+        return sum(blocking_time(step, last and i == n - 1) for i, step in enumerate(plan.steps))
+    if kind is Par:
+        return max(blocking_time(b, last) for b in plan.branches)
+    if last:
+        return 0.0
+    if kind is Activate:
+        return DEFAULT_DURATION if plan.duration is None else plan.duration
+    if kind is Wait:
+        return plan.duration
+    return 0.0
+
+
+# ---- Execution ----
+class PlanHandler:
+    """Interface used by execute().
+
+    blocking: True if activate() itself holds the pins for the duration
+    (CLI); False if it returns at once and pins turn off on a timer (web).
+    """
+    blocking = False
+
+    def activate(self, target, duration):
+        raise NotImplementedError
+
+    def stop(self, target):
+        raise NotImplementedError
+
+    def wait(self, seconds):
+        time.sleep(seconds)
+
+
+def execute(plan, handler):
+    """Run a plan step by step; returns the list of handler results.
+
+    If any step raises, parallel branches still running stop before their
+    next step and the exception propagates.
+    """
+    results = []
+    _run(plan, handler, results, True, threading.Event())
+    return results
+
+
+def _run(node, handler, results, last, cancel):
+    if cancel.is_set():
+        return
+    kind = type(node)
+    if kind is Activate:
+        duration = DEFAULT_DURATION if node.duration is None else node.duration
+        results.append(handler.activate(node.target, duration))
+        if not last and not handler.blocking:
+            handler.wait(duration)
+    elif kind is Stop:
+        results.append(handler.stop(node.target))
+    elif kind is Wait:
+        if not last:
+            handler.wait(node.duration)
+    elif kind is Seq:
+        n = len(node.steps)
+        for i, step in enumerate(node.steps):
+            _run(step, handler, results, last and i == n - 1, cancel)
+    elif kind is Par:
+        errors = []
+
+        def branch(b):
+            try:
+                _run(b, handler, results, last, cancel)
+            except BaseException as e:
+                errors.append(e)
+                cancel.set()
+
+        threads = [threading.Thread(target=branch, args=(b,), daemon=True) for b in node.branches[1:]]
+        for t in threads:
+            t.start()
+        try:
+            _run(node.branches[0], handler, results, last, cancel)
+        except BaseException:
+            cancel.set()
+            raise
+        for t in threads:
+            t.join()
+        if errors:
+            raise errors[0]
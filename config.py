@@ -3,6 +3,18 @@
 # ==============================
 
 
+# ---- GPIO backend ----
+# Which driver switches the pins (see gpio_backend.py): "rpi" (RPi.GPIO),
+# "gpiochip" (the Linux GPIO character device named by 'chip') or "fake"
+# (in memory, nothing is driven). Saved in config.json; read once at
+# startup, so a change applies after a restart. The environment variables
+# ROBOTCLI_GPIO_BACKEND and ROBOTCLI_GPIO_CHIP take precedence.
+GPIO_SETTINGS = {
+    'backend': 'rpi',
+    'chip': '/dev/gpiochip0',
+}
+
+
 # ---- Physical GPIO bindings ----
 # These are the ONLY real pin numbers in the entire system.
 # Change these to match your wiring.
@@ -92,6 +104,7 @@ ALIASES = {
 # They expand into multiple user aliases.
 # Format: "group_name": ["alias", "alias", "alias"]
 # Format in terminal: group_name(duration_in_seconds)
+# Members may also be other groups, e.g. "patrol": ["forward", "lights_on"].
 
 # GROUPS map a group name to either a list of aliases (legacy) or a dict:
 # "group_name": { "aliases": ["alias1", ...], "action": "on"|"off" }
@@ -126,30 +139,154 @@ GROUPS = {
     "all_off": {"aliases": list(ALIASES.keys()), "action": "off"},
 }
 
+# ---- Interlocks ----
+# Aliases or groups that must never be on at the same time.
+# Format: "name": { "members": ["forward", "backward"], "policy": "reject" }
+# A member is on when all of its pins are. When an activation would leave
+# two members on together, the policy decides:
+#   reject  - refuse the activation
+#   queue   - wait until the conflicting member turns off
+#   preempt - turn the conflicting member's other pins off first
+# Example: "drive": {"members": ["forward", "backward"], "policy": "reject"}
+INTERLOCKS = {}
+
+# ---- Inputs and edge rules ----
+# Config spots read as inputs (limit switches, bump sensors) instead of
+# driven as outputs. Their pins are watched with edge-detection callbacks.
+# Format: "name": { "config_spot": "config_spotX", "pull": "up"|"down"|"off", "bounce_ms": 20 }
+# Example: "bumper": {"config_spot": "config_spot27", "pull": "up", "bounce_ms": 20}
+INPUTS = {}
+
+# What to run when an input changes: a command-language program, run from
+# the edge callback itself.
+# Format: "name": { "input": "bumper", "edge": "rising"|"falling"|"both", "run": "stop" }
+RULES = {}
+
 # ---- AI integration settings ----
 # The user should only need to enter an API key and a model name.
 AI_SETTINGS = {
     'enabled': False,
     'api_key': None,
     'model': None,
+    # OpenAI-compatible endpoint; None = ROBOTCLI_AI_BASE_URL or OpenAI
+    'base_url': None,
 }
 
-# ---- Persistent config storage (JSON) ----
+# ---- Live configuration: immutable snapshots ----
+# The dicts above are the defaults. The live configuration is a single
+# immutable ConfigSnapshot, replaced as a whole: writers build the next
+# one inside edit() and publish it with one reference swap, so a reader
+# that takes `config.snapshot` once sees a consistent version without
+# locking, even while a reload or another edit is in progress.
+#
+#     snap = config.snapshot
+#     spot = snap.aliases['motor_1']['config_spot']
+#     pin = snap.gpio_pins[spot]
+#
+#     with config.edit() as draft:          # writers
+#         draft.aliases['led_3'] = {'config_spot': 'config_spot27', 'auto_off': True}
+#
+# After each publish the module names GPIO_PINS, ALIASES, GROUPS,
+# INTERLOCKS, AI_SETTINGS, INPUTS, RULES and GPIO_SETTINGS point at the new
+# snapshot's (read-only) mappings; read `snapshot` when you need more than
+# one of them to agree.
 import json
 import os
 import threading
+import types
+from collections import namedtuple
+from contextlib import contextmanager
+
+# ROBOTCLI_CONFIG_FILE points a server (or a test) at another file; it
+# must be set before this module is first imported, which loads it
+CONFIG_FILE = os.environ.get('ROBOTCLI_CONFIG_FILE') or os.path.join(os.path.dirname(__file__), 'config.json')
+# Serializes writers (edit, load, save); readers never take it
+_config_lock = threading.RLock()
+
+ConfigSnapshot = namedtuple('ConfigSnapshot',
+                            'version gpio_pins aliases groups interlocks ai_settings inputs rules gpio_settings')
+
+
+class FrozenDict(dict):
+    """A dict that refuses changes. Still a dict, so it reads and serializes as one."""
+    __slots__ = ()
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError('config snapshots are read-only; change them with config.edit()')
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return FrozenDict((k, _freeze(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+# Bumped on every publish, so data derived from the config (e.g. the
+# flattened groups in pin_groups.py) is rebuilt only when it may have changed.
+version = 0
+snapshot = None
+
+
+def _publish(gpio_pins, aliases, groups, interlocks, ai_settings, inputs, rules, gpio_settings):
+    global snapshot, version, GPIO_PINS, ALIASES, GROUPS, INTERLOCKS, AI_SETTINGS, INPUTS, RULES, GPIO_SETTINGS
+    snap = ConfigSnapshot(version + 1, _freeze(gpio_pins), _freeze(aliases), _freeze(groups),
+                          _freeze(interlocks), _freeze(ai_settings), _freeze(inputs), _freeze(rules),
+                          _freeze(gpio_settings))
+    snapshot = snap
+    version = snap.version
+    GPIO_PINS, ALIASES, GROUPS = snap.gpio_pins, snap.aliases, snap.groups
+    INTERLOCKS, AI_SETTINGS = snap.interlocks, snap.ai_settings
+    INPUTS, RULES = snap.inputs, snap.rules
+    GPIO_SETTINGS = snap.gpio_settings
+    return snap
 
-CONFIG_FILE = os.path.join(os.path.dirname(__file__), 'config.json')
-_config_lock = threading.Lock()
 
+_publish(GPIO_PINS, ALIASES, GROUPS, INTERLOCKS, AI_SETTINGS, INPUTS, RULES, GPIO_SETTINGS)
 
-def _save_json():
+
+@contextmanager
+def edit(save=True):
+    """Change the configuration.
+
+    Yields a draft whose gpio_pins, aliases, groups, interlocks,
+    ai_settings, inputs, rules and gpio_settings are mutable copies of the current snapshot's mappings
+    (replace entries rather than changing them in place). When the block
+    finishes, the draft is published as the new snapshot, if anything
+    changed, and saved to config.json. If the block raises, the draft is
+    discarded. Edits are serialized, so none is lost to a concurrent one.
+    """
+    with _config_lock:
+        base = snapshot
+        draft = types.SimpleNamespace(
+            gpio_pins=dict(base.gpio_pins), aliases=dict(base.aliases), groups=dict(base.groups),
+            interlocks=dict(base.interlocks), ai_settings=dict(base.ai_settings),
+            inputs=dict(base.inputs), rules=dict(base.rules), gpio_settings=dict(base.gpio_settings))
+        yield draft
+        fields = (draft.gpio_pins, draft.aliases, draft.groups, draft.interlocks, draft.ai_settings,
+                  draft.inputs, draft.rules, draft.gpio_settings)
+        if fields != tuple(base[1:]):
+            snap = _publish(*fields)
+            if save:
+                save_config(snap)
+
+
+# ---- Persistent config storage (JSON) ----
+def _save_json(snap):
     with _config_lock:
         data = {
-            'GPIO_PINS': GPIO_PINS,
-            'ALIASES': ALIASES,
-            'GROUPS': GROUPS,
-            'AI_SETTINGS': AI_SETTINGS,
+            'GPIO_PINS': snap.gpio_pins,
+            'ALIASES': snap.aliases,
+            'GROUPS': snap.groups,
+            'INTERLOCKS': snap.interlocks,
+            'AI_SETTINGS': snap.ai_settings,
+            'INPUTS': snap.inputs,
+            'RULES': snap.rules,
+            'GPIO_SETTINGS': snap.gpio_settings,
         }
         tmp = CONFIG_FILE + '.tmp'
         try:
@@ -165,20 +302,18 @@ def _save_json():
                     pass
 
 
-def save_config():
-    """Persist current configuration to disk (config.json)"""
+def save_config(snap=None):
+    """Persist the current configuration (or the given snapshot) to disk (config.json)"""
     try:
-        _save_json()
+        _save_json(snapshot if snap is None else snap)
     except Exception as e:
         print(f"⚠️ Failed saving config to {CONFIG_FILE}: {e}")
 
 
 def reset_gpio_pins_to_defaults():
     """Reset GPIO_PINS mapping back to the original defaults and persist."""
-    with _config_lock:
-        GPIO_PINS.clear()
-        GPIO_PINS.update(DEFAULT_GPIO_PINS)
-        save_config()
+    with edit() as draft:
+        draft.gpio_pins = dict(DEFAULT_GPIO_PINS)
 
 
 def _load_json():
@@ -187,49 +322,81 @@ def _load_json():
     Also perform compatibility fixes:
     - Convert string alias values into dicts with auto_off=True
     - Convert legacy group list into dict with action='on'
+
+    The result is published as one new snapshot, so readers see either
+    the old configuration or the new one, never a half-loaded mix.
     """
     if not os.path.exists(CONFIG_FILE):
         # Persist defaults so users can edit file later
         save_config()
         return
-    try:
-        with open(CONFIG_FILE, 'r') as f:
-            data = json.load(f)
-        gp = data.get('GPIO_PINS')
-        if isinstance(gp, dict):
-            for k, v in gp.items():
-                GPIO_PINS[k] = v
-        al = data.get('ALIASES')
-        if isinstance(al, dict):
-            ALIASES.clear()
-            # normalize alias format
-            for k, v in al.items():
-                if isinstance(v, str):
-                    ALIASES[k] = {'config_spot': v, 'auto_off': True}
-                elif isinstance(v, dict):
-                    # ensure auto_off exists
-                    ALIASES[k] = {'config_spot': v.get('config_spot'), 'auto_off': bool(v.get('auto_off', True))}
-        gr = data.get('GROUPS')
-        if isinstance(gr, dict):
-            GROUPS.clear()
-            for k, v in gr.items():
-                if isinstance(v, list):
-                    GROUPS[k] = {'aliases': v, 'action': 'on'}
-                elif isinstance(v, dict):
-                    GROUPS[k] = {'aliases': v.get('aliases', []), 'action': v.get('action', 'on')}
-        # Load AI settings if present
-        ai = data.get('AI_SETTINGS')
-        if isinstance(ai, dict):
-            AI_SETTINGS['enabled'] = bool(ai.get('enabled', False))
-            AI_SETTINGS['api_key'] = ai.get('api_key')
-            AI_SETTINGS['model'] = ai.get('model')
-    except Exception as e:
-        print(f"⚠️ Failed loading config from {CONFIG_FILE}: {e}")
-    # Save normalized structure back to disk so config.json is consistent
-    try:
-        save_config()
-    except Exception:
-        pass
+    with _config_lock:
+        try:
+            with open(CONFIG_FILE, 'r') as f:
+                data = json.load(f)
+            with edit(save=False) as draft:
+                gp = data.get('GPIO_PINS')
+                if isinstance(gp, dict):
+                    for k, v in gp.items():
+                        draft.gpio_pins[k] = v
+                al = data.get('ALIASES')
+                if isinstance(al, dict):
+                    aliases = {}
+                    # normalize alias format
+                    for k, v in al.items():
+                        if isinstance(v, str):
+                            aliases[k] = {'config_spot': v, 'auto_off': True}
+                        elif isinstance(v, dict):
+                            # ensure auto_off exists
+                            aliases[k] = {'config_spot': v.get('config_spot'), 'auto_off': bool(v.get('auto_off', True))}
+                    draft.aliases = aliases
+                gr = data.get('GROUPS')
+                if isinstance(gr, dict):
+                    groups = {}
+                    for k, v in gr.items():
+                        if isinstance(v, list):
+                            groups[k] = {'aliases': v, 'action': 'on'}
+                        elif isinstance(v, dict):
+                            groups[k] = {'aliases': v.get('aliases', []), 'action': v.get('action', 'on')}
+                    draft.groups = groups
+                il = data.get('INTERLOCKS')
+                if isinstance(il, dict):
+                    interlocks = {}
+                    for k, v in il.items():
+                        if isinstance(v, list):
+                            interlocks[k] = {'members': v, 'policy': 'reject'}
+                        elif isinstance(v, dict):
+                            interlocks[k] = {'members': v.get('members', []), 'policy': v.get('policy', 'reject')}
+                    draft.interlocks = interlocks
+                inp = data.get('INPUTS')
+                if isinstance(inp, dict):
+                    draft.inputs = {k: {'config_spot': v.get('config_spot'), 'pull': v.get('pull', 'up'),
+                                        'bounce_ms': v.get('bounce_ms', 20)}
+                                    for k, v in inp.items() if isinstance(v, dict)}
+                ru = data.get('RULES')
+                if isinstance(ru, dict):
+                    draft.rules = {k: {'input': v.get('input'), 'edge': v.get('edge', 'rising'), 'run': v.get('run')}
+                                   for k, v in ru.items() if isinstance(v, dict)}
+                gs = data.get('GPIO_SETTINGS')
+                if isinstance(gs, dict):
+                    draft.gpio_settings = {'backend': gs.get('backend', 'rpi'),
+                                           'chip': gs.get('chip', '/dev/gpiochip0')}
+                # Load AI settings if present
+                ai = data.get('AI_SETTINGS')
+                if isinstance(ai, dict):
+                    draft.ai_settings = {
+                        'enabled': bool(ai.get('enabled', False)),
+                        'api_key': ai.get('api_key'),
+                        'model': ai.get('model'),
+                        'base_url': ai.get('base_url'),
+                    }
+        except Exception as e:
+            print(f"⚠️ Failed loading config from {CONFIG_FILE}: {e}")
+        # Save normalized structure back to disk so config.json is consistent
+        try:
+            save_config()
+        except Exception:
+            pass
 
 # Load config at import time
 _load_json()
@@ -245,4 +412,4 @@ def load_config():
         return True
     except Exception as e:
         print(f"⚠️ Failed reloading config: {e}")
-        return False
\ No newline at end of file
+        return False
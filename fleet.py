@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""Send commands to many RobotCLI nodes at once.
+
+    python3 fleet.py --node r1=http://10.0.0.11:8000 --node r2=http://10.0.0.12:8000 status
+    python3 fleet.py --nodes fleet.json activate motor_1 2
+    python3 fleet.py --nodes fleet.json group forward 1.5
+    python3 fleet.py --nodes fleet.json run "forward(2); left(500ms)"
+    python3 fleet.py --nodes fleet.json stop            # every output
+    python3 fleet.py --nodes fleet.json estop
+
+fleet.json maps node names to base URLs, or to {"url": ..., "timeout": s}
+for a per-node timeout. ROBOTCLI_FLEET="r1=http://...,r2=http://..."
+works as well.
+
+Every node gets its own requests.Session, so connections are kept alive
+and reused between commands. A command is sent to all nodes
+concurrently and the call returns once every node has answered or run
+out of time, with one result per node. A node's timeout bounds its whole
+request, not just each socket read: a node still sending its reply at
+the deadline is marked timed out and its connection is shut down.
+
+From Python:
+
+    with Fleet({'r1': 'http://10.0.0.11:8000', 'r2': 'http://10.0.0.12:8000'}) as fleet:
+        result = fleet.activate_group('forward', 2)
+        if not result.ok:
+            print(result.failed)
+"""
+
+import argparse
+import json
+import os
+import socket
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_TIMEOUT = 2.0
+CONNECT_TIMEOUT = 1.0
+
+NodeResult = namedtuple('NodeResult', 'node ok status data error latency_ms')
+
+
+class FleetResult:
+    """Per-node results of one fan-out, keyed by node name."""
+
+    def __init__(self, results):
+        self.results = results
+
+    @property
+    def ok(self):
+        return all(r.ok for r in self.results.values())
+
+    @property
+    def failed(self):
+        return {name: r.error or r.status for name, r in self.results.items() if not r.ok}
+
+    def summary(self):
+        latencies = sorted(r.latency_ms for r in self.results.values())
+        return {
+            'nodes': len(self.results),
+            'ok': sum(1 for r in self.results.values() if r.ok),
+            'failed': self.failed,
+            'max_ms': latencies[-1] if latencies else None,
+            'p50_ms': latencies[len(latencies) // 2] if latencies else None,
+        }
+
+    def to_dict(self):
+        return {
+            'summary': self.summary(),
+            'nodes': {name: r._asdict() for name, r in self.results.items()},
+        }
+
+
+class _Node:
+    def __init__(self, name, url, timeout, pool_size, trust_env):
+        self.name = name
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+        # Nodes are addressed directly; skipping the per-request proxy/netrc
+        # lookups roughly halves client overhead on a LAN
+        self.session.trust_env = trust_env
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+
+def _abort(response):
+    """Shut down the connection a response is being read from, waking its reader."""
+    try:
+        response.raw.connection.sock.shutdown(socket.SHUT_RDWR)
+    except (AttributeError, OSError):
+        pass
+
+
+def parse_nodes(spec):
+    """Build {name: url | {'url', 'timeout'}} from a JSON file path, a
+    "name=url,name=url" string, or a list of such entries."""
+    if isinstance(spec, dict):
+        return dict(spec)
+    if isinstance(spec, str):
+        if os.path.exists(spec):
+            with open(spec, 'r') as f:
+                return json.load(f)
+        spec = [part for part in spec.split(',') if part.strip()]
+    nodes = {}
+    for entry in spec:
+        entry = entry.strip()
+        name, sep, url = entry.partition('=')
+        if not sep:
+            # Bare URL: name the node after its host:port
+            url = entry
+            name = url.split('://', 1)[-1].rstrip('/')
+        nodes[name.strip()] = url.strip()
+    return nodes
+
+
+class Fleet:
+    """Concurrent client for a set of RobotCLI servers."""
+
+    def __init__(self, nodes, timeout=DEFAULT_TIMEOUT, pool_size=4, trust_env=False):
+        self.nodes = {}
+        for name, entry in parse_nodes(nodes).items():
+            if isinstance(entry, dict):
+                url, node_timeout = entry['url'], float(entry.get('timeout', timeout))
+            else:
+                url, node_timeout = entry, timeout
+            self.nodes[name] = _Node(name, url, node_timeout, pool_size, trust_env)
+        self._pool = ThreadPoolExecutor(max_workers=max(1, len(self.nodes)), thread_name_prefix='fleet')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._pool.shutdown(wait=False)
+        for node in self.nodes.values():
+            node.session.close()
+
+    def _send(self, node, method, path, payload, inflight):
+        t0 = time.perf_counter()
+        status = data = error = None
+        try:
+            # stream=True hands the response over before its body is read,
+            # so request() can cut off a body that arrives too slowly
+            r = node.session.request(method, node.url + path, json=payload, stream=True,
+                                     timeout=(min(CONNECT_TIMEOUT, node.timeout), node.timeout))
+            inflight.append(r)
+            status = r.status_code
+            try:
+                data = r.json()
+            except ValueError:
+                data = r.text
+            if status >= 400:
+                error = data.get('error') if isinstance(data, dict) else f'HTTP {status}'
+        except requests.Timeout:
+            error = f'timeout after {node.timeout:g}s'
+        except requests.ConnectionError:
+            error = 'unreachable'
+        except requests.RequestException as e:
+            error = str(e)
+        latency = (time.perf_counter() - t0) * 1000.0
+        return NodeResult(node.name, error is None, status, data, error, latency)
+
+    def request(self, method, path, payload=None, nodes=None):
+        """Send one request to every node (or the named `nodes`) concurrently."""
+        targets = [self.nodes[name] for name in nodes] if nodes else list(self.nodes.values())
+        t0 = time.perf_counter()
+        inflight = [[] for _ in targets]
+        futures = [self._pool.submit(self._send, node, method, path, payload, responses)
+                   for node, responses in zip(targets, inflight)]
+        results = []
+        for node, future, responses in zip(targets, futures, inflight):
+            try:
+                results.append(future.result(timeout=max(0.0, t0 + node.timeout - time.perf_counter())))
+            except FutureTimeout:
+                # The socket timeout only bounds each read; free the worker
+                # from a reply that keeps trickling in
+                for r in responses:
+                    _abort(r)
+                latency = (time.perf_counter() - t0) * 1000.0
+                results.append(NodeResult(node.name, False, None, None, f'timeout after {node.timeout:g}s', latency))
+        return FleetResult({r.node: r for r in results})
+
+    # ---- commands ----
+    def status(self, nodes=None):
+        return self.request('GET', '/api/status', nodes=nodes)
+
+    def activate(self, alias, duration=1.0, nodes=None):
+        return self.request('POST', '/api/activate', {'alias': alias, 'duration': duration}, nodes)
+
+    def activate_group(self, group, duration=1.0, nodes=None):
+        return self.request('POST', '/api/activate-group', {'group': group, 'duration': duration}, nodes)
+
+    def run(self, program, nodes=None):
+        return self.request('POST', '/api/run', {'program': program}, nodes)
+
+    def stop(self, alias=None, nodes=None):
+        return self.request('POST', '/api/stop', {'alias': alias} if alias else {}, nodes)
+
+    def estop(self, nodes=None):
+        return self.request('POST', '/api/estop', {}, nodes)
+
+    def reset_estop(self, nodes=None):
+        return self.request('POST', '/api/estop/reset', {}, nodes)
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Send a command to many RobotCLI nodes at once')
+    ap.add_argument('--nodes', default=os.environ.get('ROBOTCLI_FLEET'),
+                    help='JSON file or "name=url,name=url" (default: $ROBOTCLI_FLEET)')
+    ap.add_argument('--node', action='append', default=[], help='name=url (repeatable)')
+    ap.add_argument('--only', action='append', help='limit to these node names (repeatable)')
+    ap.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help='per-node timeout in seconds')
+    ap.add_argument('--json', action='store_true', help='print the full aggregated result as JSON')
+    sub = ap.add_subparsers(dest='command', required=True)
+    sub.add_parser('status')
+    p = sub.add_parser('activate')
+    p.add_argument('alias')
+    p.add_argument('duration', type=float, nargs='?', default=1.0)
+    p = sub.add_parser('group')
+    p.add_argument('group')
+    p.add_argument('duration', type=float, nargs='?', default=1.0)
+    p = sub.add_parser('run')
+    p.add_argument('program')
+    p = sub.add_parser('stop')
+    p.add_argument('alias', nargs='?')
+    sub.add_parser('estop')
+    sub.add_parser('reset-estop')
+    args = ap.parse_args()
+
+    nodes = parse_nodes(args.nodes) if args.nodes else {}
+    nodes.update(parse_nodes(args.node))
+    if not nodes:
+        ap.error('no nodes given (use --nodes, --node or ROBOTCLI_FLEET)')
+
+    with Fleet(nodes, timeout=args.timeout) as fleet:
+        only = args.only
+        if args.command == 'status':
+            result = fleet.status(only)
+        elif args.command == 'activate':
+            result = fleet.activate(args.alias, args.duration, only)
+        elif args.command == 'group':
+            result = fleet.activate_group(args.group, args.duration, only)
+        elif args.command == 'run':
+            result = fleet.run(args.program, only)
+        elif args.command == 'stop':
+            result = fleet.stop(args.alias, only)
+        elif args.command == 'estop':
+            result = fleet.estop(only)
+        else:
+            result = fleet.reset_estop(only)
+
+    if args.json:
+        print(json.dumps(result.to_dict(), indent=2))
+    else:
+        for name, r in sorted(result.results.items()):
+            outcome = 'ok' if r.ok else f'FAILED ({r.error})'
+            print(f'{name:<20} {outcome:<40} {r.latency_ms:8.1f} ms')
+        s = result.summary()
+        print(f"{s['ok']}/{s['nodes']} nodes ok, slowest {s['max_ms']:.1f} ms")
+    sys.exit(0 if result.ok else 1)
+
+
+if __name__ == '__main__':
+    main()
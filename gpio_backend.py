@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+"""Pluggable GPIO backends, one shared instance per process.
+
+pinrun.py (and with it the CLI) and web_server.py switch pins through
+the object get() returns. Each backend offers the subset of the RPi.GPIO
+API RobotCLI uses (setup, output, input, add_event_detect,
+remove_event_detect, cleanup and the constants), so the code driving
+the pins does not care which one is in use:
+
+    rpi       RPi.GPIO (the default)
+    gpiochip  the Linux GPIO character device (/dev/gpiochip0) through
+              its v2 ioctls, with no extra package; works on kernels
+              where RPi.GPIO does not
+    fake      in memory, for tests and benchmarks; drive() plays the
+              outside world for input pins
+
+The backend is chosen by GPIO_SETTINGS in the configuration (config.json),
+or the ROBOTCLI_GPIO_BACKEND and ROBOTCLI_GPIO_CHIP environment variables.
+
+Pins are set up as outputs on their first HIGH write, so only pins that
+are actually used are claimed. An ordinary LOW write to a pin this
+process never set up is skipped, since it is not driving anything. The
+safety sweeps (e-stop, all off) use sweep_low() instead, which claims
+and drives every pin it is given, since something outside this
+process's bookkeeping may have set one HIGH. Compare backends with:
+
+    python3 gpio_backend.py --backend fake,gpiochip --pins 17,27
+"""
+
+import argparse
+import fcntl
+import os
+import selectors
+import struct
+import threading
+import time
+
+# Note: GPIO 0 and 1 are reserved for I2C, pins 2-27 are standard GPIO
+VALID_PINS = frozenset(range(2, 28))
+
+
+def _channels(channel):
+    return channel if isinstance(channel, (list, tuple)) else (channel,)
+
+
+class Backend:
+    """RPi.GPIO-style pin access over one driver, with outputs set up on first use."""
+    name = None
+    BCM = 11
+    BOARD = 10
+    OUT = 0
+    IN = 1
+    LOW = 0
+    HIGH = 1
+    PUD_OFF = 20
+    PUD_DOWN = 21
+    PUD_UP = 22
+    RISING = 31
+    FALLING = 32
+    BOTH = 33
+
+    def __init__(self):
+        self.outputs = set()    # pins set up as outputs
+        self.inputs = set()     # pins set up as inputs
+        self.writes = 0
+        self.startup_ms = None
+
+    def setmode(self, mode):
+        pass
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, channel, direction, pull_up_down=None, initial=None):
+        for pin in _channels(channel):
+            if direction == self.OUT:
+                self._setup_output(pin, self.HIGH if initial else self.LOW)
+                self.inputs.discard(pin)
+                self.outputs.add(pin)
+            else:
+                self._setup_input(pin, self.PUD_OFF if pull_up_down is None else pull_up_down)
+                self.outputs.discard(pin)
+                self.inputs.add(pin)
+
+    def output(self, channel, value):
+        """Drive one pin or a list of pins (one bank write where the driver has one)."""
+        if isinstance(channel, (list, tuple)):
+            if not self.outputs.issuperset(channel):
+                if not value:
+                    channel = [pin for pin in channel if pin in self.outputs]
+                    if not channel:
+                        return
+                else:
+                    self.setup([pin for pin in channel if pin not in self.outputs], self.OUT)
+        elif channel not in self.outputs:
+            if not value:
+                return
+            self.setup(channel, self.OUT)
+        self.writes += 1
+        self._write(channel, value)
+
+    def sweep_low(self, channels):
+        """Drive every pin in `channels` LOW, setting up any that are not outputs yet.
+
+        Pins set up as inputs are left alone.
+        """
+        unclaimed = [pin for pin in channels if pin not in self.outputs and pin not in self.inputs]
+        if unclaimed:
+            self.setup(unclaimed, self.OUT, initial=self.LOW)
+        pins = [pin for pin in channels if pin in self.outputs]
+        if pins:
+            self.writes += 1
+            self._write(pins, self.LOW)
+
+    def cleanup(self):
+        self.outputs.clear()
+        self.inputs.clear()
+
+    def to_dict(self):
+        return {'backend': self.name, 'outputs': sorted(self.outputs), 'inputs': sorted(self.inputs),
+                'writes': self.writes, 'startup_ms': self.startup_ms}
+
+    # Implemented by each backend, along with input(), add_event_detect()
+    # and remove_event_detect()
+    def _setup_output(self, pin, level):
+        raise NotImplementedError
+
+    def _setup_input(self, pin, pull):
+        raise NotImplementedError
+
+    def _write(self, channel, value):
+        raise NotImplementedError
+
+
+class RPiBackend(Backend):
+    """RPi.GPIO, or any module with its API (such as gpio_sim.SimGPIO)."""
+    name = 'rpi'
+
+    def __init__(self, module=None):
+        super().__init__()
+        if module is None:
+            import RPi.GPIO as module
+        self.gpio = module
+        module.setmode(module.BCM)
+
+    def _setup_output(self, pin, level):
+        self.gpio.setup(pin, self.gpio.OUT, initial=level)
+
+    def _setup_input(self, pin, pull):
+        self.gpio.setup(pin, self.gpio.IN, pull_up_down=pull)
+
+    def _write(self, channel, value):
+        # RPi.GPIO takes a list of channels in one call
+        self.gpio.output(channel, value)
+
+    def input(self, pin):
+        return self.gpio.input(pin)
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        # RPi.GPIO rejects bouncetime=None, so only pass it when set
+        options = {} if bouncetime is None else {'bouncetime': bouncetime}
+        self.gpio.add_event_detect(pin, edge, callback=callback, **options)
+
+    def remove_event_detect(self, pin):
+        self.gpio.remove_event_detect(pin)
+
+    def cleanup(self):
+        self.gpio.cleanup()
+        super().cleanup()
+
+
+# ---- Linux GPIO character device, uAPI v2 (linux/gpio.h) ----
+def _iowr(nr, size):
+    return (3 << 30) | (size << 16) | (0xB4 << 8) | nr
+
+
+_REQUEST_SIZE = 592         # struct gpio_v2_line_request
+_CONFIG_SIZE = 272          # struct gpio_v2_line_config
+_EVENT_SIZE = 48            # struct gpio_v2_line_event
+_GET_LINE = _iowr(0x07, _REQUEST_SIZE)
+_SET_CONFIG = _iowr(0x0D, _CONFIG_SIZE)
+_GET_VALUES = _iowr(0x0E, 16)
+_SET_VALUES = _iowr(0x0F, 16)
+
+_FLAG_INPUT = 1 << 2
+_FLAG_OUTPUT = 1 << 3
+_FLAG_EDGE_RISING = 1 << 4
+_FLAG_EDGE_FALLING = 1 << 5
+_FLAG_PULL_UP = 1 << 8
+_FLAG_PULL_DOWN = 1 << 9
+_FLAG_BIAS_DISABLED = 1 << 10
+_ATTR_OUTPUT_VALUES = 2
+_ATTR_DEBOUNCE = 3
+
+# struct gpio_v2_line_values {bits, mask} for the single line of a request
+_VALUES = (struct.pack('<QQ', 0, 1), struct.pack('<QQ', 1, 1))
+
+
+def _line_config(flags, attrs=()):
+    """struct gpio_v2_line_config; attrs are (id, value) pairs for line 0."""
+    buf = bytearray(_CONFIG_SIZE)
+    struct.pack_into('<QI', buf, 0, flags, len(attrs))
+    for i, (attr_id, value) in enumerate(attrs):
+        # gpio_v2_line_config_attribute: {id, padding, value union, mask}
+        struct.pack_into('<IIQQ', buf, 32 + 24 * i, attr_id, 0, value, 1)
+    return buf
+
+
+class GpioChipBackend(Backend):
+    """One line request per pin on a gpiochip device.
+
+    A write is one ioctl per pin. Edge events are read from the line
+    file descriptors by one thread waiting in epoll, which calls the
+    pin's callback once per batch of queued events (the callback reads
+    the current level, like it would with RPi.GPIO).
+    """
+    name = 'gpiochip'
+
+    def __init__(self, path='/dev/gpiochip0'):
+        super().__init__()
+        self.path = path
+        self._chip = os.open(path, os.O_RDWR | os.O_CLOEXEC)
+        self._lines = {}        # pin -> line request fd
+        self._pulls = {}        # input pin -> bias flags
+        self._selector = None
+        self._wake = None
+        self._lock = threading.Lock()
+
+    def _request(self, pin, flags, attrs=()):
+        self._release(pin)
+        buf = bytearray(_REQUEST_SIZE)
+        struct.pack_into('<I', buf, 0, pin)
+        buf[256:256 + 8] = b'robotcli'
+        buf[288:288 + _CONFIG_SIZE] = _line_config(flags, attrs)
+        struct.pack_into('<I', buf, 560, 1)     # num_lines
+        fcntl.ioctl(self._chip, _GET_LINE, buf, True)
+        fd = self._lines[pin] = struct.unpack_from('<i', buf, 588)[0]
+        return fd
+
+    def _release(self, pin):
+        fd = self._lines.pop(pin, None)
+        if fd is None:
+            return
+        with self._lock:
+            if self._selector is not None and fd in self._selector.get_map():
+                self._selector.unregister(fd)
+        os.close(fd)
+
+    def _setup_output(self, pin, level):
+        self._request(pin, _FLAG_OUTPUT, [(_ATTR_OUTPUT_VALUES, level)])
+
+    def _setup_input(self, pin, pull):
+        self._pulls[pin] = {self.PUD_UP: _FLAG_PULL_UP, self.PUD_DOWN: _FLAG_PULL_DOWN}.get(pull, _FLAG_BIAS_DISABLED)
+        self._request(pin, _FLAG_INPUT | self._pulls[pin])
+
+    def _write(self, channel, value):
+        values = _VALUES[1 if value else 0]
+        if isinstance(channel, (list, tuple)):
+            lines = self._lines
+            for pin in channel:
+                fcntl.ioctl(lines[pin], _SET_VALUES, values)
+        else:
+            fcntl.ioctl(self._lines[channel], _SET_VALUES, values)
+
+    def input(self, pin):
+        fd = self._lines.get(pin)
+        if fd is None:
+            self.setup(pin, self.IN)
+            fd = self._lines[pin]
+        return struct.unpack_from('<Q', fcntl.ioctl(fd, _GET_VALUES, _VALUES[0]))[0] & 1
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        flags = _FLAG_INPUT | self._pulls.get(pin, _FLAG_BIAS_DISABLED)
+        if edge in (self.RISING, self.BOTH):
+            flags |= _FLAG_EDGE_RISING
+        if edge in (self.FALLING, self.BOTH):
+            flags |= _FLAG_EDGE_FALLING
+        attrs = [(_ATTR_DEBOUNCE, int(bouncetime) * 1000)] if bouncetime else []
+        fd = self._request(pin, flags, attrs)
+        self.outputs.discard(pin)
+        self.inputs.add(pin)
+        with self._lock:
+            if self._selector is None:
+                self._selector = selectors.DefaultSelector()
+                self._wake = os.pipe()
+                self._selector.register(self._wake[0], selectors.EVENT_READ)
+                threading.Thread(target=self._watch, name='gpiochip-events', daemon=True).start()
+            self._selector.register(fd, selectors.EVENT_READ, (pin, callback))
+        os.write(self._wake[1], b'\0')
+
+    def remove_event_detect(self, pin):
+        # Back to a plain input, without edge detection
+        if pin in self._lines:
+            self._request(pin, _FLAG_INPUT | self._pulls.get(pin, _FLAG_BIAS_DISABLED))
+
+    def _watch(self):
+        while True:
+            for key, _ in self._selector.select():
+                if key.data is None:
+                    os.read(key.fd, 64)
+                    continue
+                try:
+                    data = os.read(key.fd, _EVENT_SIZE * 16)
+                except OSError:
+                    continue    # line released meanwhile
+                pin, callback = key.data
+                if data and callback is not None:
+                    callback(pin)
+
+    def cleanup(self):
+        # Like RPi.GPIO.cleanup(), leave every line as an input
+        for pin in list(self._lines):
+            try:
+                fcntl.ioctl(self._lines[pin], _SET_CONFIG, _line_config(_FLAG_INPUT))
+            except OSError:
+                pass
+            self._release(pin)
+        super().cleanup()
+
+
+class FakeBackend(Backend):
+    """In-memory pins: `levels` holds each pin's level, `write_delay` simulates slow hardware."""
+    name = 'fake'
+    FAKE = True
+
+    def __init__(self):
+        super().__init__()
+        self.levels = {}
+        self.callbacks = {}     # pin -> (edge, callback) from add_event_detect
+        self.write_delay = 0.0
+
+    def _setup_output(self, pin, level):
+        self.levels[pin] = level
+
+    def _setup_input(self, pin, pull):
+        self.levels[pin] = self.HIGH if pull == self.PUD_UP else self.LOW
+
+    def _write(self, channel, value):
+        if self.write_delay:
+            time.sleep(self.write_delay)
+        if isinstance(channel, (list, tuple)):
+            for pin in channel:
+                self.levels[pin] = value
+        else:
+            self.levels[channel] = value
+
+    def input(self, pin):
+        return self.levels.get(pin, self.LOW)
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        if pin in self.callbacks:
+            raise RuntimeError('Conflicting edge detection already enabled for this GPIO channel')
+        self.callbacks[pin] = (edge, callback)
+
+    def remove_event_detect(self, pin):
+        self.callbacks.pop(pin, None)
+
+    def drive(self, pin, level):
+        """Change an input pin from outside; its edge callback runs on the caller's thread."""
+        before = self.levels.get(pin, self.LOW)
+        self.levels[pin] = level
+        edge, callback = self.callbacks.get(pin, (None, None))
+        if callback is not None and level != before and edge in (self.BOTH, self.RISING if level else self.FALLING):
+            callback(pin)
+
+    def cleanup(self):
+        self.levels.clear()
+        self.callbacks.clear()
+        super().cleanup()
+
+
+BACKENDS = {'rpi': RPiBackend, 'gpiochip': GpioChipBackend, 'fake': FakeBackend}
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def create(name, **options):
+    """A new backend by name, with its construction time in startup_ms."""
+    cls = BACKENDS.get(name)
+    if cls is None:
+        raise ValueError(f'Unknown GPIO backend {name!r}; use one of: {", ".join(BACKENDS)}')
+    t0 = time.perf_counter()
+    backend = cls(**options)
+    backend.startup_ms = (time.perf_counter() - t0) * 1000.0
+    return backend
+
+
+def configured():
+    """(name, options) of the backend selected by the environment or the configuration."""
+    import config
+    settings = config.GPIO_SETTINGS
+    name = os.environ.get('ROBOTCLI_GPIO_BACKEND') or settings['backend']
+    options = {}
+    if name == 'gpiochip':
+        options['path'] = os.environ.get('ROBOTCLI_GPIO_CHIP') or settings['chip']
+    return name, options
+
+
+def get():
+    """The backend every module shares, created on first use."""
+    global _shared
+    backend = _shared
+    if backend is None:
+        with _shared_lock:
+            if _shared is None:
+                name, options = configured()
+                _shared = create(name, **options)
+            backend = _shared
+    return backend
+
+
+def use(backend):
+    """Share `backend` (an instance, or a backend name) from now on; returns it.
+
+    Call it before importing pinrun or web_server, which take the shared
+    backend at import time. Naming the backend already in use returns it.
+    """
+    global _shared
+    with _shared_lock:
+        if isinstance(backend, str):
+            if _shared is not None and _shared.name == backend:
+                return _shared
+            backend = create(backend)
+        _shared = backend
+    return backend
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Compare setup and write overhead of GPIO backends.')
+    ap.add_argument('--backend', default='fake', help='comma-separated backends to measure (default: fake)')
+    ap.add_argument('--pins', help='comma-separated BCM pins to toggle (required except for fake; they WILL switch)')
+    ap.add_argument('--chip', default='/dev/gpiochip0', help='device for the gpiochip backend')
+    ap.add_argument('--writes', type=int, default=10000, help='writes per measurement')
+    args = ap.parse_args()
+
+    for name in args.backend.split(','):
+        if name != 'fake' and not args.pins:
+            ap.error('--pins is required for real backends')
+        pins = [int(p) for p in args.pins.split(',')] if args.pins else sorted(VALID_PINS)
+        backend = create(name, **({'path': args.chip} if name == 'gpiochip' else {}))
+        t0 = time.perf_counter()
+        backend.output(pins, backend.LOW)   # skipped: nothing set up yet (sweep_low() would claim them)
+        backend.output(pins, backend.HIGH)  # sets every pin up
+        setup_ms = (time.perf_counter() - t0) * 1000.0
+        timings = {}
+        for label, channel in (('single', pins[0]), (f'bank of {len(pins)}', pins)):
+            t0 = time.perf_counter()
+            for i in range(args.writes):
+                backend.output(channel, i & 1)
+            timings[label] = (time.perf_counter() - t0) / args.writes * 1e6
+        t0 = time.perf_counter()
+        for _ in range(args.writes):
+            backend.input(pins[0])
+        read_us = (time.perf_counter() - t0) / args.writes * 1e6
+        backend.output(pins, backend.LOW)
+        backend.cleanup()
+        print(f'{name:<9} startup {backend.startup_ms:7.3f} ms   setup of {len(pins)} pins {setup_ms:7.3f} ms   '
+              + '   '.join(f'{label} {us:6.2f} us/write' for label, us in timings.items())
+              + f'   read {read_us:6.2f} us')
+
+
+if __name__ == '__main__':
+    main()
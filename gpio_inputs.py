@@ -0,0 +1,216 @@
+"""GPIO inputs watched by edge callbacks, and the rules that react to them.
+
+Config INPUTS turns config spots into inputs (limit switches, bump
+sensors) and RULES says what to run when one changes:
+
+    "INPUTS": {"bumper": {"config_spot": "config_spot27", "pull": "up", "bounce_ms": 20}}
+    "RULES":  {"bump_stop": {"input": "bumper", "edge": "falling", "run": "stop"}}
+
+InputIndex resolves both to pins once per config version: every rule's
+program is compiled up front and the rules are filed by pin and edge,
+so an edge costs one dict lookup and the run of programs that are
+already compiled. InputWatcher registers each input pin for edge
+detection (no polling) and evaluates the rules in the GPIO library's
+callback thread, recording how long each took.
+
+Every callback records the level it reads, but an edge within
+`bounce_ms` of the last accepted edge on the same pin runs no rules
+(contact bounce), and neither does a callback that finds the pin still
+at the level it last recorded. Since the level is always kept, a real
+change that follows a short press is still seen as an edge.
+"""
+
+import threading
+import time
+from collections import namedtuple
+
+from command_lang import compile_program, CommandSyntaxError
+
+PULLS = ('up', 'down', 'off')
+EDGES = ('rising', 'falling', 'both')
+DEFAULT_BOUNCE_MS = 20
+MAX_BOUNCE_MS = 1000
+
+InputPin = namedtuple('InputPin', 'name pin pull bounce')
+Rule = namedtuple('Rule', 'name input edge program plan')
+
+
+def check_input(entry):
+    """Problem with an INPUTS entry's options (not its config spot), or None."""
+    if entry.get('pull', 'up') not in PULLS:
+        return 'pull must be "up", "down" or "off"'
+    bounce = entry.get('bounce_ms', DEFAULT_BOUNCE_MS)
+    if isinstance(bounce, bool) or not isinstance(bounce, (int, float)) or not 0 <= bounce <= MAX_BOUNCE_MS:
+        return f'bounce_ms must be between 0 and {MAX_BOUNCE_MS}'
+    return None
+
+
+def input_pins(gpio_pins, inputs, valid_pins):
+    """{pin: input name} for the inputs mapped to one of valid_pins."""
+    pins = {}
+    for name, entry in inputs.items():
+        pin_num = gpio_pins.get(entry.get('config_spot'))
+        if pin_num in valid_pins and pin_num not in pins:
+            pins[pin_num] = name
+    return pins
+
+
+class InputIndex:
+    """Inputs and rules resolved to pins for one config version."""
+
+    def __init__(self, version, inputs, rules, gpio_pins, valid_pins):
+        self.version = version
+        # name -> InputPin; pin is None while its config spot is unmapped
+        self.inputs = {}
+        # pin -> InputPin of the inputs that are mapped
+        self.pins = {}
+        mapped = {name: pin_num for pin_num, name in input_pins(gpio_pins, inputs, valid_pins).items()}
+        for name, entry in inputs.items():
+            pull = entry.get('pull', 'up')
+            bounce = entry.get('bounce_ms', DEFAULT_BOUNCE_MS)
+            if check_input(entry) is not None:
+                pull, bounce = 'up', DEFAULT_BOUNCE_MS
+            inp = self.inputs[name] = InputPin(name, mapped.get(name), pull, bounce / 1000.0)
+            if inp.pin is not None:
+                self.pins[inp.pin] = inp
+
+        # pin -> (rules for a falling edge, rules for a rising edge), so
+        # the new level read in the callback indexes the tuple directly
+        self.rules = {}
+        self.errors = {}        # name -> the rule's entry plus 'error', for rules that cannot run
+        by_pin = {}
+        for name, entry in rules.items():
+            edge = entry.get('edge', 'rising')
+            try:
+                plan = compile_program(entry.get('run') or '')
+            except CommandSyntaxError as e:
+                self.errors[name] = dict(entry, error=str(e))
+                continue
+            if edge not in EDGES:
+                self.errors[name] = dict(entry, error=f'Unknown edge {edge!r}')
+                continue
+            rule = self.rules[name] = Rule(name, entry.get('input'), edge, entry.get('run'), plan)
+            inp = self.inputs.get(rule.input)
+            if inp is None or inp.pin is None:
+                continue
+            falling, rising = by_pin.setdefault(inp.pin, ([], []))
+            if edge != 'rising':
+                falling.append(rule)
+            if edge != 'falling':
+                rising.append(rule)
+        self.by_pin = {pin_num: (tuple(falling), tuple(rising)) for pin_num, (falling, rising) in by_pin.items()}
+
+
+class _PinState:
+    __slots__ = ('level', 'accepted', 'edges', 'bounced')
+
+    def __init__(self, level, now):
+        self.level = level
+        self.accepted = now     # when rules last ran for this pin
+        self.edges = 0
+        self.bounced = 0
+
+
+class InputWatcher:
+    """Keeps the GPIO library's edge detection in step with an InputIndex.
+
+    `run(rule)` is called from the edge callback for every rule the edge
+    matches and returns a result dict ('error' in it counts as a
+    failure). Pins that stop being inputs are set up as outputs, LOW.
+    """
+
+    def __init__(self, gpio, run):
+        self.gpio = gpio
+        self.run = run
+        self.index = None
+        self._state = {}        # pin -> _PinState, for pins set up as inputs
+        self._stats = {}        # rule name -> counters
+        self._lock = threading.Lock()
+        self._pulls = {'up': gpio.PUD_UP, 'down': gpio.PUD_DOWN, 'off': gpio.PUD_OFF}
+
+    def apply(self, index):
+        """Set up the pins of `index` as inputs and release pins no longer in it."""
+        with self._lock:
+            if self.index is not None and self.index.version >= index.version:
+                return
+            old = self.index.pins if self.index is not None else {}
+            for pin_num, inp in old.items():
+                if index.pins.get(pin_num) != inp:
+                    self.gpio.remove_event_detect(pin_num)
+                    del self._state[pin_num]
+                    if pin_num not in index.pins:
+                        self.gpio.setup(pin_num, self.gpio.OUT, initial=self.gpio.LOW)
+            # Rules are swapped in before the new pins fire their first edge
+            self.index = index
+            now = time.perf_counter()
+            for pin_num, inp in index.pins.items():
+                if pin_num in self._state:
+                    continue
+                self.gpio.setup(pin_num, self.gpio.IN, pull_up_down=self._pulls[inp.pull])
+                self._state[pin_num] = _PinState(1 if self.gpio.input(pin_num) else 0, now)
+                self.gpio.add_event_detect(pin_num, self.gpio.BOTH, callback=self._on_edge)
+            for name in list(self._stats):
+                if name not in index.rules:
+                    del self._stats[name]
+
+    def _on_edge(self, channel):
+        t0 = time.perf_counter()
+        index = self.index
+        inp = index.pins.get(channel)
+        state = self._state.get(channel)
+        if inp is None or state is None:
+            return
+        level = 1 if self.gpio.input(channel) else 0
+        if level == state.level:
+            state.bounced += 1
+            return
+        state.level = level
+        if t0 - state.accepted < inp.bounce:
+            state.bounced += 1
+            return
+        state.accepted = t0
+        state.edges += 1
+        for rule in index.by_pin.get(channel, ((), ()))[level]:
+            self._fire(rule, t0)
+
+    def _fire(self, rule, t0):
+        try:
+            result = self.run(rule)
+        except Exception as e:
+            result = {'error': str(e)}
+        ms = (time.perf_counter() - t0) * 1000.0
+        stats = self._stats.get(rule.name)
+        if stats is None:
+            stats = self._stats[rule.name] = {'fired': 0, 'failed': 0, 'last_ms': None, 'max_ms': None,
+                                              'last_at': None, 'last_error': None}
+        stats['fired'] += 1
+        stats['last_ms'] = ms
+        stats['max_ms'] = max(ms, stats['max_ms'] or 0.0)
+        stats['last_at'] = time.time()
+        if 'error' in result:
+            stats['failed'] += 1
+            stats['last_error'] = result['error']
+
+    def close(self):
+        """Stop watching every input pin."""
+        with self._lock:
+            for pin_num in list(self._state):
+                self.gpio.remove_event_detect(pin_num)
+            self._state.clear()
+
+    def to_dict(self):
+        index = self.index
+        if index is None:
+            return {'inputs': {}, 'rules': {}}
+        inputs = {}
+        for name, inp in index.inputs.items():
+            state = self._state.get(inp.pin)
+            inputs[name] = {'pin': inp.pin, 'pull': inp.pull, 'bounce_ms': inp.bounce * 1000.0,
+                            'level': None if state is None else state.level,
+                            'edges': 0 if state is None else state.edges,
+                            'bounced': 0 if state is None else state.bounced}
+        rules = {name: dict({'input': rule.input, 'edge': rule.edge, 'run': rule.program},
+                            **self._stats.get(name, {'fired': 0}))
+                 for name, rule in index.rules.items()}
+        rules.update(index.errors)
+        return {'inputs': inputs, 'rules': rules}
@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+"""Simulated GPIO on a virtual clock, for faster-than-real-time testing.
+
+A Simulator stands in for `RPi.GPIO` and for the `time` and `threading`
+modules seen by parser.py, pinrun.py, web_server.py and command_lang.py.
+Every pin change is recorded against a virtual clock, and sleeping
+advances that clock instead of waiting, so a 30-second choreography runs
+in milliseconds:
+
+    sim = Simulator().install()        # before importing pinrun/parser/web_server
+    import parser, command_lang
+    sim.patch(parser, command_lang)
+    parser.run_program('forward(30); left(500ms)')
+    assert sim.gpio.pulses(2) == [(0.0, 30.0)]
+    sim.gpio.to_vcd('run.vcd', labels={2: 'motor_1'})
+
+Or from the command line (the CLI parser runs the program, nothing is
+driven and no time passes):
+
+    python3 gpio_sim.py "forward(1m30s); left(500ms)" --vcd run.vcd
+
+Time only moves when every participating thread is asleep: the thread
+that created the Simulator (the driver), plus every thread started
+through the patched `threading` module, such as auto-off timers and
+parallel branches. The earliest sleeper is then woken at exactly its
+deadline, so timers fire in order and at the times they asked for. A
+participant that blocks on something other than sleep or join (a lock,
+an Event) holds the clock still; after stall_timeout real seconds the
+clock moves on anyway rather than hanging the test.
+
+Drive a web_server under simulation from the driver thread, e.g. with
+`web_server.app.test_client()`, and call sim.advance(seconds) to let
+time pass.
+"""
+
+import argparse
+import heapq
+import itertools
+import sys
+import threading
+import time
+import types
+
+import gpio_backend
+
+
+class VirtualClock:
+    """Clock whose sleep() advances time instead of waiting for it."""
+
+    def __init__(self, start=0.0, stall_timeout=1.0):
+        self.now = float(start)
+        self.stall_timeout = stall_timeout
+        self._cond = threading.Condition()
+        self._sleepers = []  # heap of [wake, seq, thread, released]
+        self._seq = itertools.count()
+        # Participants currently running (not sleeping); time stands still
+        # while this is non-empty
+        self._busy = {threading.current_thread()}
+        self.Thread = type('Thread', (_ClockThread,), {'_clock': self})
+        self.time_module = _module_proxy('time', time, {
+            'time': self.time, 'monotonic': self.time, 'perf_counter': self.time,
+            'sleep': self.sleep,
+        })
+        self.threading_module = _module_proxy('threading', threading, {'Thread': self.Thread})
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        """Block the calling thread for `seconds` of virtual time."""
+        me = threading.current_thread()
+        with self._cond:
+            entry = [self.now + max(0.0, seconds), next(self._seq), me, False]
+            heapq.heappush(self._sleepers, entry)
+            self._busy.discard(me)
+            self._advance()
+            while not entry[3]:
+                if not self._cond.wait(self.stall_timeout) and not entry[3]:
+                    self._advance(force=True)
+
+    advance = sleep
+
+    def _advance(self, force=False):
+        """Wake the earliest sleeper once nobody else is running. Caller holds _cond."""
+        if self._sleepers and (force or not self._busy):
+            entry = heapq.heappop(self._sleepers)
+            self.now = max(self.now, entry[0])
+            entry[3] = True
+            self._busy.add(entry[2])
+            self._cond.notify_all()
+
+    def _running(self, thread):
+        with self._cond:
+            self._busy.add(thread)
+
+
+class _ClockThread(threading.Thread):
+    """Thread that takes part in its clock's idle detection."""
+    _clock = None
+
+    def start(self):
+        self._joiners = set()
+        self._clock_done = False
+        # Counted as running from now on, so time cannot pass before the
+        # new thread gets to its first sleep
+        self._clock._running(self)
+        super().start()
+
+    def run(self):
+        try:
+            super().run()
+        finally:
+            clock = self._clock
+            with clock._cond:
+                self._clock_done = True
+                # Whoever joins this thread resumes at the current time
+                clock._busy.update(self._joiners)
+                clock._busy.discard(self)
+                clock._advance()
+
+    def join(self, timeout=None):
+        clock = self._clock
+        me = threading.current_thread()
+        with clock._cond:
+            waiting = not self._clock_done
+            if waiting:
+                self._joiners.add(me)
+                clock._busy.discard(me)
+                clock._advance()
+        try:
+            super().join(timeout)
+        finally:
+            if waiting:
+                with clock._cond:
+                    self._joiners.discard(me)
+                    clock._busy.add(me)
+
+
+def _module_proxy(name, module, overrides):
+    proxy = types.ModuleType(name)
+    proxy.__dict__.update({k: v for k, v in vars(module).items() if not k.startswith('__')})
+    proxy.__dict__.update(overrides)
+    return proxy
+
+
+class SimGPIO:
+    """In-memory `RPi.GPIO` that records every level change with its virtual time."""
+    FAKE = True
+    BCM = 11
+    BOARD = 10
+    OUT = 0
+    IN = 1
+    LOW = 0
+    HIGH = 1
+    PUD_OFF = 20
+    PUD_DOWN = 21
+    PUD_UP = 22
+    RISING = 31
+    FALLING = 32
+    BOTH = 33
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.mode = None
+        self.levels = {}
+        self.writes = 0
+        self.events = []    # (t, pin, level) in order, changes only
+        self._waves = {}    # pin -> [(t, level)], starting at setup
+        self._callbacks = {}    # pin -> (edge, callback) from add_event_detect
+
+    # ---- RPi.GPIO API ----
+    def setmode(self, mode):
+        self.mode = mode
+
+    def getmode(self):
+        return self.mode
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, channel, direction, pull_up_down=None, initial=None):
+        for pin in _channels(channel):
+            if direction == self.IN:
+                level = self.HIGH if pull_up_down == self.PUD_UP else self.LOW
+            else:
+                level = self.LOW if initial is None else initial
+            if pin not in self._waves:
+                self._waves[pin] = [(self.clock.now, level)]
+                self.levels[pin] = level
+            else:
+                self._set(pin, level)
+
+    def output(self, channel, value):
+        self.writes += 1
+        pins = _channels(channel)
+        values = value if isinstance(value, (list, tuple)) else [value] * len(pins)
+        for pin, level in zip(pins, values):
+            self._set(pin, self.HIGH if level else self.LOW)
+
+    def sweep_low(self, channels):
+        """Backend e-stop sweep; every pin here takes writes, so a plain LOW write."""
+        self.output(channels, self.LOW)
+
+    def input(self, channel):
+        return self.levels.get(channel, self.LOW)
+
+    def add_event_detect(self, channel, edge, callback=None, bouncetime=None):
+        self._callbacks[channel] = (edge, callback)
+
+    def remove_event_detect(self, channel):
+        self._callbacks.pop(channel, None)
+
+    def drive(self, pin, level):
+        """Change an input pin from outside, running its edge callback (on this thread)."""
+        level = self.HIGH if level else self.LOW
+        before = self.levels.get(pin, self.LOW)
+        self._set(pin, level)
+        edge, callback = self._callbacks.get(pin, (None, None))
+        if callback is not None and level != before and edge in (self.BOTH, self.RISING if level else self.FALLING):
+            callback(pin)
+
+    def cleanup(self, channel=None):
+        for pin in (_channels(channel) if channel is not None else list(self.levels)):
+            self._set(pin, self.LOW)
+
+    def _set(self, pin, level):
+        if self.levels.get(pin) == level:
+            return
+        t = self.clock.now
+        self.levels[pin] = level
+        self._waves.setdefault(pin, []).append((t, level))
+        self.events.append((t, pin, level))
+
+    # ---- Waveforms ----
+    def waveform(self, pin):
+        """[(t, level)] for pin: its level at setup, then every change."""
+        return list(self._waves.get(pin, ()))
+
+    def level_at(self, pin, t):
+        level = self.LOW
+        for when, value in self._waves.get(pin, ()):
+            if when > t:
+                break
+            level = value
+        return level
+
+    def pulses(self, pin):
+        """HIGH intervals of pin as [(start, end)], end None while still HIGH."""
+        out = []
+        start = None
+        for t, level in self._waves.get(pin, ()):
+            if level and start is None:
+                start = t
+            elif not level and start is not None:
+                out.append((start, t))
+                start = None
+        if start is not None:
+            out.append((start, None))
+        return out
+
+    def to_vcd(self, path=None, pins=None, labels=None, timescale='1 us'):
+        """Write the recorded waveforms as a Value Change Dump.
+
+        pins defaults to every pin that went HIGH; labels maps pin -> signal
+        name (default pinN). Returns the VCD text when path is None.
+        """
+        if pins is None:
+            pins = sorted({pin for _, pin, level in self.events if level})
+        labels = labels or {}
+        number, unit = timescale.split()
+        ticks = float(number) * {'s': 1.0, 'ms': 1e-3, 'us': 1e-6, 'ns': 1e-9}[unit]
+        ids = {pin: _vcd_id(i) for i, pin in enumerate(pins)}
+        lines = ['$version RobotCLI gpio_sim $end', f'$timescale {timescale} $end',
+                 '$scope module gpio $end']
+        for pin in pins:
+            name = str(labels.get(pin, f'pin{pin}')).replace(' ', '_')
+            lines.append(f'$var wire 1 {ids[pin]} {name} $end')
+        lines += ['$upscope $end', '$enddefinitions $end']
+
+        changes = sorted((t, n, pin, level) for pin in pins
+                         for n, (t, level) in enumerate(self._waves.get(pin, ())))
+        origin = min((t for t, _, _, _ in changes), default=0.0)
+        current = None
+        for t, _, pin, level in changes:
+            tick = int(round((t - origin) / ticks))
+            if tick != current:
+                lines.append(f'#{tick}')
+                current = tick
+            lines.append(f'{1 if level else 0}{ids[pin]}')
+        text = '\n'.join(lines) + '\n'
+        if path is None:
+            return text
+        with open(path, 'w') as f:
+            f.write(text)
+        return None
+
+
+def _channels(channel):
+    return list(channel) if isinstance(channel, (list, tuple, set, frozenset)) else [channel]
+
+
+def _vcd_id(n):
+    # Printable ASCII identifiers: '!'..'~', then two characters, ...
+    out = ''
+    n += 1
+    while n:
+        n, r = divmod(n - 1, 94)
+        out = chr(33 + r) + out
+    return out
+
+
+class Simulator:
+    """A VirtualClock plus a SimGPIO, installable in place of the real ones."""
+
+    def __init__(self, start=0.0, stall_timeout=1.0):
+        self.clock = VirtualClock(start, stall_timeout)
+        self.gpio = SimGPIO(self.clock)
+        self._saved = []
+
+    def install(self):
+        """Register the simulated GPIO as `RPi.GPIO`, and as the shared GPIO
+        backend, for modules imported from now on."""
+        rpi = types.ModuleType('RPi')
+        rpi.GPIO = self.gpio
+        sys.modules['RPi'] = rpi
+        sys.modules['RPi.GPIO'] = self.gpio
+        gpio_backend.use(gpio_backend.RPiBackend(self.gpio))
+        return self
+
+    def patch(self, *modules):
+        """Point each module's `time`, `threading` and `GPIO` globals at the simulation."""
+        replacements = {'time': self.clock.time_module, 'threading': self.clock.threading_module,
+                        'GPIO': self.gpio}
+        for module in modules:
+            for name, value in replacements.items():
+                if name in vars(module):
+                    self._saved.append((module, name, getattr(module, name)))
+                    setattr(module, name, value)
+        return self
+
+    def unpatch(self):
+        while self._saved:
+            module, name, value = self._saved.pop()
+            setattr(module, name, value)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.unpatch()
+
+    @property
+    def now(self):
+        return self.clock.now
+
+    def advance(self, seconds):
+        """Let `seconds` of virtual time pass, firing any timers due meanwhile."""
+        self.clock.sleep(seconds)
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Run a command-language program on simulated GPIO')
+    ap.add_argument('program', help='e.g. "forward(1m30s); left(500ms)"')
+    ap.add_argument('--vcd', help='write the waveforms to this VCD file')
+    args = ap.parse_args()
+
+    sim = Simulator().install()
+    import config
+    import pinrun
+    import command_lang
+    import parser
+    sim.patch(pinrun, command_lang, parser)
+
+    t0 = time.perf_counter()
+    parser.run_program(args.program)
+    elapsed = time.perf_counter() - t0
+
+    labels = {}
+    for alias, entry in config.ALIASES.items():
+        spot = entry if isinstance(entry, str) else entry.get('config_spot')
+        pin_num = config.GPIO_PINS.get(spot)
+        if pin_num is not None:
+            labels.setdefault(pin_num, alias)
+    print(f'\n{sim.now:.3f}s simulated in {elapsed * 1000:.1f} ms')
+    for pin_num in sorted({pin for _, pin, level in sim.gpio.events if level}):
+        spans = ', '.join(f'{start:g}-{"" if end is None else f"{end:g}"}'
+                          for start, end in sim.gpio.pulses(pin_num))
+        print(f'  pin {pin_num:>2} {labels.get(pin_num, ""):<16} {spans}')
+    if args.vcd:
+        sim.gpio.to_vcd(args.vcd, labels=labels)
+        print(f'Waveforms written to {args.vcd}')
+
+
+if __name__ == '__main__':
+    main()
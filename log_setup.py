@@ -0,0 +1,213 @@
+"""Asynchronous, structured, sampled logging.
+
+Request threads only build a LogRecord and put it on a queue; a single
+listener thread formats it and writes it out. Messages keep their
+%-style args until the listener formats them, so a record that is
+sampled out or rate limited costs almost nothing.
+
+Categories are the last component of the logger name, e.g. the
+`web_server.command` logger is category `command`. Each category can be
+sampled (keep a fraction of records) and rate limited (token bucket,
+records per second). WARNING and above are never dropped. When records
+have been dropped, the next record that passes carries a `suppressed`
+count.
+
+Environment:
+    ROBOTCLI_LOG_LEVEL   root level (default INFO)
+    ROBOTCLI_LOG_FORMAT  json (default) or text
+    ROBOTCLI_LOG_FILE    write here instead of stderr
+    ROBOTCLI_LOG_SAMPLE  per-category sample rates, e.g. "command=0.1,ai=1"
+    ROBOTCLI_LOG_RATE    per-category records/second, e.g. "command=20"
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+
+# Defaults applied when the environment does not override them
+DEFAULT_SAMPLE_RATES = {}
+DEFAULT_RATE_LIMITS = {'command': 50.0, 'ai': 10.0}
+
+_STD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+def category_of(record):
+    return getattr(record, 'category', None) or record.name.rsplit('.', 1)[-1]
+
+
+class Truncated:
+    """Log argument that is only truncated (and stringified) when formatted."""
+
+    __slots__ = ('value', 'limit')
+
+    def __init__(self, value, limit):
+        self.value = value
+        self.limit = limit
+
+    def __str__(self):
+        text = str(self.value)
+        return text if len(text) <= self.limit else text[:self.limit] + '...'
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; `extra=` fields are included as keys."""
+
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 6),
+            'level': record.levelname,
+            'logger': record.name,
+            'category': category_of(record),
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STD_ATTRS and key not in entry:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, separators=(',', ':'))
+
+
+class SamplingFilter(logging.Filter):
+    """Per-category probabilistic sampling and token-bucket rate limiting."""
+
+    def __init__(self, sample_rates=None, rate_limits=None):
+        super().__init__()
+        self.sample_rates = dict(sample_rates or {})
+        self.rate_limits = dict(rate_limits or {})
+        self._buckets = {}
+        self._suppressed = {}
+        self._lock = threading.Lock()
+
+    def _take_token(self, category, rate):
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(category, (rate, now))
+            tokens = min(rate, tokens + (now - last) * rate)
+            if tokens < 1.0:
+                self._buckets[category] = (tokens, now)
+                return False
+            self._buckets[category] = (tokens - 1.0, now)
+            return True
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        category = category_of(record)
+        rate = self.sample_rates.get(category)
+        keep = rate is None or rate >= 1.0 or random.random() < rate
+        if keep:
+            limit = self.rate_limits.get(category)
+            keep = limit is None or self._take_token(category, limit)
+        with self._lock:
+            if not keep:
+                self._suppressed[category] = self._suppressed.get(category, 0) + 1
+                return False
+            dropped = self._suppressed.pop(category, 0)
+        if dropped:
+            record.suppressed = dropped
+        return True
+
+    def suppressed(self):
+        with self._lock:
+            return dict(self._suppressed)
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread.
+
+    The stock QueueHandler.prepare() formats the message on the calling
+    thread; here the record is enqueued untouched.
+    """
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+
+def _parse_map(value):
+    result = {}
+    for part in (value or '').split(','):
+        if '=' not in part:
+            continue
+        key, _, num = part.partition('=')
+        try:
+            result[key.strip()] = float(num)
+        except ValueError:
+            continue
+    return result
+
+
+_listener = None
+sampling_filter = None
+
+
+def setup_logging(level=None, fmt=None, stream=None, sample_rates=None, rate_limits=None):
+    """Route the root logger through a queue to a background writer thread.
+
+    Arguments default to the ROBOTCLI_LOG_* environment variables.
+    Calling it again replaces the previous setup.
+    """
+    global _listener, sampling_filter
+    level = level or os.environ.get('ROBOTCLI_LOG_LEVEL', 'INFO').upper()
+    fmt = fmt or os.environ.get('ROBOTCLI_LOG_FORMAT', 'json')
+    path = os.environ.get('ROBOTCLI_LOG_FILE') if stream is None else None
+    if sample_rates is None:
+        sample_rates = dict(DEFAULT_SAMPLE_RATES, **_parse_map(os.environ.get('ROBOTCLI_LOG_SAMPLE')))
+    if rate_limits is None:
+        rate_limits = dict(DEFAULT_RATE_LIMITS, **_parse_map(os.environ.get('ROBOTCLI_LOG_RATE')))
+
+    _stop_listener()
+
+    # A FileHandler owns its file, so closing it (on the next setup or at
+    # exit) closes the file; a StreamHandler leaves stderr open
+    output = logging.FileHandler(path, 'a') if path else logging.StreamHandler(stream or sys.stderr)
+    if fmt == 'json':
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+
+    q = queue.Queue(maxsize=10000)
+    handler = LazyQueueHandler(q)
+    sampling_filter = SamplingFilter(sample_rates, rate_limits)
+    handler.addFilter(sampling_filter)
+
+    root = logging.getLogger()
+    for h in list(root.handlers):
+        root.removeHandler(h)
+        h.close()
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(q, output, respect_handler_level=False)
+    _listener.start()
+    return _listener
+
+
+def _stop_listener():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for h in _listener.handlers:
+            h.close()
+        _listener = None
+
+
+def shutdown_logging():
+    """Flush queued records, stop the listener thread and close the log file."""
+    _stop_listener()
+
+
+atexit.register(shutdown_logging)
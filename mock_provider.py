@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""Local OpenAI-compatible chat completion server for offline testing.
+
+Answers POST /v1/chat/completions with a RobotCLI-style JSON reply after
+a configurable delay, and can be told to fail or hang a fraction of
+requests, so retries, hedging and the circuit breaker in ai_provider.py
+can be exercised and benchmarked without a network:
+
+    python3 mock_provider.py --port 8100 --latency 0.2 --fail-rate 0.1
+    # then set the AI base URL to http://127.0.0.1:8100/v1
+
+Requests with `"stream": true` get server-sent events like OpenAI's:
+the reply in chunk_size-character deltas, chunk_delay seconds apart.
+
+The reply echoes any JSON object found in the last user message (so a
+test can choose the commands), and otherwise asks for the status:
+
+    {"response": "ok", "commands": [{"action": "status"}]}
+
+In-process:
+
+    mock = MockProvider(latency=0.05).start()
+    ... ChatProvider(mock.url, 'key') ...
+    mock.stop()
+"""
+
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_REPLY = {'response': 'ok', 'commands': [{'action': 'status'}]}
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients may drop a stream once they have what they need
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class MockProvider:
+    """Mock provider; latency, jitter, the rates and chunk settings may be changed while running."""
+
+    def __init__(self, port=0, host='127.0.0.1', latency=0.0, jitter=0.0, fail_rate=0.0,
+                 hang_rate=0.0, hang_seconds=30.0, seed=None, chunk_size=8, chunk_delay=0.0):
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.jitter = jitter
+        self.fail_rate = fail_rate
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.requests = 0
+        self.failed = 0
+        self.hung = 0
+        self.last_body = None       # most recent request body, for tests
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.server = _Server((host, port), self._handler())
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}/v1'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _decide(self):
+        with self._lock:
+            self.requests += 1
+            r = self._random.random()
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            if r < self.hang_rate:
+                self.hung += 1
+                return 'hang', self.hang_seconds
+            if r < self.hang_rate + self.fail_rate:
+                self.failed += 1
+                return 'fail', delay
+            return 'ok', delay
+
+    def reply_for(self, body):
+        """Reply content for a request body (echoes a JSON object in the last user message)."""
+        messages = body.get('messages') or []
+        text = next((m.get('content') or '' for m in reversed(messages) if m.get('role') == 'user'), '')
+        start, end = text.find('{'), text.rfind('}')
+        if start != -1 and end > start:
+            try:
+                return json.dumps(json.loads(text[start:end + 1]))
+            except ValueError:
+                pass
+        return json.dumps(DEFAULT_REPLY)
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+                if not self.path.rstrip('/').endswith('/chat/completions'):
+                    return self._send(404, {'error': {'message': 'not found'}})
+                mock.last_body = body
+                outcome, delay = mock._decide()
+                time.sleep(delay)
+                if outcome == 'fail':
+                    return self._send(503, {'error': {'message': 'mock failure'}})
+                content = mock.reply_for(body)
+                if body.get('stream'):
+                    return self._stream(body, content)
+                self._send(200, {
+                    'id': f'mock-{mock.requests}', 'object': 'chat.completion', 'model': body.get('model'),
+                    'choices': [{'index': 0, 'finish_reason': 'stop',
+                                 'message': {'role': 'assistant', 'content': content}}],
+                })
+
+            def _stream(self, body, content):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                size = max(1, mock.chunk_size)
+                for i in range(0, len(content), size):
+                    if i:
+                        time.sleep(mock.chunk_delay)
+                    self._event({'id': f'mock-{mock.requests}', 'object': 'chat.completion.chunk',
+                                 'model': body.get('model'),
+                                 'choices': [{'index': 0, 'delta': {'content': content[i:i + size]}}]})
+                self._event('[DONE]')
+                self.wfile.write(b'0\r\n\r\n')
+
+            def _event(self, payload):
+                data = payload if isinstance(payload, str) else json.dumps(payload)
+                line = f'data: {data}\n\n'.encode()
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(line), line))
+                self.wfile.flush()
+
+        return Handler
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Mock OpenAI-compatible chat provider for RobotCLI')
+    ap.add_argument('--host', default='127.0.0.1')
+    ap.add_argument('--port', type=int, default=8100)
+    ap.add_argument('--latency', type=float, default=0.1, help='seconds before each reply')
+    ap.add_argument('--jitter', type=float, default=0.0, help='extra random delay, up to this many seconds')
+    ap.add_argument('--fail-rate', type=float, default=0.0, help='fraction of requests answered 503')
+    ap.add_argument('--hang-rate', type=float, default=0.0, help='fraction of requests that stall')
+    ap.add_argument('--hang-seconds', type=float, default=30.0)
+    ap.add_argument('--chunk-size', type=int, default=8, help='characters per streamed delta')
+    ap.add_argument('--chunk-delay', type=float, default=0.02, help='seconds between streamed deltas')
+    args = ap.parse_args()
+    mock = MockProvider(args.port, args.host, args.latency, args.jitter, args.fail_rate,
+                        args.hang_rate, args.hang_seconds, chunk_size=args.chunk_size,
+                        chunk_delay=args.chunk_delay)
+    print(f'Mock provider at {mock.url} (set it as the AI base URL)')
+    try:
+        mock.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -1,25 +1,99 @@
-import re
+import signal
+import threading
 import time
-from config import ALIASES, GROUPS, GPIO_PINS
+import config
+from pin_history import TransitionHistory
+from pin_groups import GroupIndex, conflicting, expand_group, group_action
+import command_lang
+from command_lang import compile_program, CommandSyntaxError
 import pinrun
 
+# Transitions made from this CLI session (`history` prints the latest)
+history = TransitionHistory(1024)
+
+
+ESTOP_KEYWORDS = ('estop', 'e-stop', '!')
+
+
+class EmergencyStop(Exception):
+    """Raised to abort the running command after an emergency stop."""
+
+
+# Pins this session currently holds on (bit N = pin N), for interlock checks.
+# The CLI has nobody to queue behind or preempt, so it refuses any
+# command that conflicts with an interlock, whatever the policy.
+on_mask = 0
+_mask_lock = threading.Lock()
+_index = None
+
+
+def _conflicts(target):
+    global _index
+    cfg = config.snapshot
+    if _index is None or _index.version != cfg.version:
+        _index = GroupIndex(cfg.version, cfg.aliases, cfg.groups, cfg.gpio_pins,
+                            pinrun.VALID_PINS, cfg.interlocks)
+    if target in _index.groups:
+        return _index.groups[target].conflicts
+    return _index.alias_conflicts.get(target)
+
+
+def _claim(target, pins):
+    """Mark pins on unless an interlock forbids it; returns False if refused."""
+    global on_mask
+    conflicts = _conflicts(target)
+    with _mask_lock:
+        if conflicts is not None and (conflicts.self_conflict or
+                                      conflicting(conflicts.reject + conflicts.queue + conflicts.preempt, on_mask)):
+            print(f"Error: '{target}' is interlocked with outputs that are on")
+            return False
+        for pin in pins:
+            on_mask |= 1 << pin
+    return True
+
+
+def _release(pins):
+    global on_mask
+    with _mask_lock:
+        for pin in pins:
+            on_mask &= ~(1 << pin)
+
+
+def emergency_stop():
+    """Turn every output off at once, regardless of what turned it on."""
+    global on_mask
+    pinrun.all_off()
+    on_mask = 0
+    print("EMERGENCY STOP: all outputs LOW")
+
+
+def _handle_estop_signal(signum, frame):
+    # `kill -USR1 <pid>` from another terminal interrupts a running command
+    emergency_stop()
+    raise EmergencyStop()
+
 
 def parse_command(command_string):
     """
-    Parse a command in the format: alias_name(duration)
+    Parse a single command in the format: alias_name(duration)
     Returns: (alias_name, duration_in_seconds) or (None, None) if invalid
-    """
-    match = re.match(r'(\w+)\(([0-9.]+)\)', command_string.strip())
-    if not match:
-        return None, None
     
-    alias_name = match.group(1)
+    Durations may use units (1m30s, 250ms). Sequences and parallel blocks
+    are compiled with command_lang.compile_program() instead.
+    """
     try:
-        duration = float(match.group(2))
-    except ValueError:
+        plan = compile_program(command_string.strip())
+    except CommandSyntaxError:
         return None, None
-    
-    return alias_name, duration
+    if type(plan) is not command_lang.Activate or plan.duration is None:
+        return None, None
+    return plan.target, plan.duration
+
+
+def _config_spot(alias_name, cfg=None):
+    """Config spot for an alias; accepts both dict and legacy string entries."""
+    a = (cfg or config.snapshot).aliases[alias_name]
+    return a.get('config_spot') if isinstance(a, dict) else a
 
 
 def execute_command(alias_name, duration):
@@ -32,41 +106,68 @@ def execute_command(alias_name, duration):
     
     Also handles GROUPS by activating all pins in the group simultaneously.
     """
+    # One snapshot for the whole command, so a concurrent edit cannot mix
+    # old and new mappings
+    cfg = config.snapshot
     # Check if it's a group command
-    if alias_name in GROUPS:
-        print(f"Activating group '{alias_name}' for {duration} seconds...")
-        group_aliases = GROUPS[alias_name]
+    if alias_name in cfg.groups:
+        # Nested groups are expanded to their (deduplicated) aliases
+        group_aliases = expand_group(alias_name, cfg.groups, cfg.aliases)
+        action = group_action(cfg.groups[alias_name])
+        if action == 'off':
+            print(f"Deactivating group '{alias_name}'...")
+        else:
+            print(f"Activating group '{alias_name}' for {duration} seconds...")
         pin_functions = []
         
         # Collect all pin functions for this group
         try:
             for sub_alias in group_aliases:
-                if sub_alias not in ALIASES:
+                if sub_alias not in cfg.aliases:
                     print(f"Error: Unknown alias '{sub_alias}' in group '{alias_name}'")
                     return False
                 
-                config_spot = ALIASES[sub_alias]
-                if config_spot not in GPIO_PINS:
+                config_spot = _config_spot(sub_alias, cfg)
+                if config_spot not in cfg.gpio_pins:
                     print(f"Error: Unknown config spot '{config_spot}'")
                     return False
                 
-                pin_number = GPIO_PINS[config_spot]
+                pin_number = cfg.gpio_pins[config_spot]
+                if pin_number in pinrun.INPUT_PINS:
+                    print(f"Error: '{sub_alias}' is mapped to input pin {pin_number}")
+                    return False
                 pin_on_func = getattr(pinrun, f'pin{pin_number}_on')
                 pin_off_func = getattr(pinrun, f'pin{pin_number}_off')
                 pin_functions.append((sub_alias, pin_number, pin_on_func, pin_off_func))
             
-            # Activate all pins in the group
-            for sub_alias, pin_number, pin_on_func, _ in pin_functions:
-                print(f"  Activating {sub_alias} (pin {pin_number})...")
-                pin_on_func()
-            
-            # Wait for the specified duration
-            time.sleep(duration)
+            pins = [pin_number for _, pin_number, _, _ in pin_functions]
+            if action == 'off':
+                for sub_alias, pin_number, _, pin_off_func in pin_functions:
+                    pin_off_func()
+                    history.record(pin_number, 0, 'cli', sub_alias)
+                _release(pins)
+                print(f"Group '{alias_name}' deactivated")
+                return True
             
-            # Deactivate all pins in the group
-            for sub_alias, pin_number, _, pin_off_func in pin_functions:
-                print(f"  Deactivating {sub_alias} (pin {pin_number})...")
-                pin_off_func()
+            if not _claim(alias_name, pins):
+                return False
+            try:
+                # Activate all pins in the group
+                for sub_alias, pin_number, pin_on_func, _ in pin_functions:
+                    print(f"  Activating {sub_alias} (pin {pin_number})...")
+                    pin_on_func()
+                    history.record(pin_number, 1, 'cli', sub_alias)
+                
+                # Wait for the specified duration
+                time.sleep(duration)
+                
+                # Deactivate all pins in the group
+                for sub_alias, pin_number, _, pin_off_func in pin_functions:
+                    print(f"  Deactivating {sub_alias} (pin {pin_number})...")
+                    pin_off_func()
+                    history.record(pin_number, 0, 'cli', sub_alias)
+            finally:
+                _release(pins)
             
             print(f"Group '{alias_name}' deactivated")
             return True
@@ -74,79 +175,169 @@ def execute_command(alias_name, duration):
         except AttributeError as e:
             print(f"Error: Pin functions not found in pinrun: {e}")
             return False
+        except EmergencyStop:
+            raise
         except Exception as e:
             print(f"Error executing group command: {e}")
             return False
     
     # Check if alias exists (single pin)
-    if alias_name not in ALIASES:
+    if alias_name not in cfg.aliases:
         print(f"Error: Unknown alias '{alias_name}' (not in ALIASES or GROUPS)")
         return False
     
     # Get the config_spotX name
-    config_spot = ALIASES[alias_name]
+    config_spot = _config_spot(alias_name, cfg)
     
     # Get the pin number
-    if config_spot not in GPIO_PINS:
+    if config_spot not in cfg.gpio_pins:
         print(f"Error: Unknown config spot '{config_spot}'")
         return False
     
-    pin_number = GPIO_PINS[config_spot]
+    pin_number = cfg.gpio_pins[config_spot]
+    if pin_number in pinrun.INPUT_PINS:
+        print(f"Error: '{alias_name}' is mapped to input pin {pin_number}")
+        return False
     
     try:
         # Get the on/off functions for this pin
         pin_on_func = getattr(pinrun, f'pin{pin_number}_on')
         pin_off_func = getattr(pinrun, f'pin{pin_number}_off')
         
-        # Activate the pin
-        print(f"Activating {alias_name} (pin {pin_number}) for {duration} seconds...")
-        pin_on_func()
-        
-        # Wait for the specified duration
-        time.sleep(duration)
-        
-        # Deactivate the pin
-        pin_off_func()
+        if not _claim(alias_name, [pin_number]):
+            return False
+        try:
+            # Activate the pin
+            print(f"Activating {alias_name} (pin {pin_number}) for {duration} seconds...")
+            pin_on_func()
+            history.record(pin_number, 1, 'cli', alias_name)
+            
+            # Wait for the specified duration
+            time.sleep(duration)
+            
+            # Deactivate the pin
+            pin_off_func()
+            history.record(pin_number, 0, 'cli', alias_name)
+        finally:
+            _release([pin_number])
         print(f"Deactivated {alias_name} (pin {pin_number})")
         return True
     
     except AttributeError:
         print(f"Error: Pin {pin_number} functions not found in pinrun")
         return False
+    except EmergencyStop:
+        raise
     except Exception as e:
         print(f"Error executing command: {e}")
         return False
 
 
+def stop_target(name=None):
+    """Turn off one alias or group now, or every output when name is None."""
+    if name is None:
+        pinrun.all_off()
+        _release(pinrun.OUTPUT_PINS)
+        print("All outputs off")
+        return True
+    cfg = config.snapshot
+    if name in cfg.groups:
+        aliases = expand_group(name, cfg.groups, cfg.aliases)
+    elif name in cfg.aliases:
+        aliases = [name]
+    else:
+        print(f"Error: Unknown alias '{name}' (not in ALIASES or GROUPS)")
+        return False
+    for alias in aliases:
+        pin_number = cfg.gpio_pins.get(_config_spot(alias, cfg)) if alias in cfg.aliases else None
+        off = getattr(pinrun, f'pin{pin_number}_off', None)
+        if off is not None and pin_number not in pinrun.INPUT_PINS:
+            off()
+            history.record(pin_number, 0, 'cli', alias)
+            _release([pin_number])
+    print(f"Stopped {name}")
+    return True
+
+
+class CLIPlanHandler(command_lang.PlanHandler):
+    """Runs compiled programs in the terminal; each step blocks for its duration."""
+    blocking = True
+
+    def activate(self, target, duration):
+        return execute_command(target, duration)
+
+    def stop(self, target):
+        return stop_target(target)
+
+
+def run_program(text):
+    """Compile and run a line of the command language, e.g. forward(2); left(500ms)"""
+    plan = compile_program(text)
+    if any(type(node) in (command_lang.Activate, command_lang.Wait) and node.duration is not None
+           and node.duration <= 0 for node in command_lang.iter_nodes(plan)):
+        print("Error: Duration must be positive")
+        return []
+    return command_lang.execute(plan, CLIPlanHandler())
+
+
+def print_history(limit=20):
+    """Print the most recent pin transitions from this session."""
+    events = history.query(limit=limit)
+    if not events:
+        print("No pin transitions yet")
+        return
+    for e in events:
+        stamp = time.strftime('%H:%M:%S', time.localtime(e['ts']))
+        print(f"{stamp}  pin {e['pin']:>2} {e['state']:<3}  {e['alias'] or '-'}")
+
+
+def print_gpio():
+    """Print the GPIO backend in use and the pins it has set up."""
+    info = pinrun.GPIO.to_dict()
+    print(f"Backend: {info['backend']} (started in {info['startup_ms']:.3f} ms), {info['writes']} writes")
+    print(f"Outputs: {', '.join(map(str, info['outputs'])) or '-'}")
+    print(f"Inputs:  {', '.join(map(str, info['inputs'])) or '-'}")
+
+
 def main():
     """Main loop to accept terminal commands"""
     print("RobotCLI Parser Started")
     print("Format: alias_name(duration_in_seconds)")
     print("Example: motor_1(2.5)")
-    print("Type 'quit' to exit\n")
+    print("Sequences: forward(1m30s); left(500ms); stop   Parallel: forward(2) & alarm(2)")
+    print("Type 'estop' for an emergency stop, 'history' or 'gpio' for details, 'quit' to exit\n")
+    signal.signal(signal.SIGUSR1, _handle_estop_signal)
     
     try:
         while True:
-            user_input = input(">>> ").strip()
-            
-            if user_input.lower() in ['quit', 'exit']:
-                print("Exiting...")
-                break
-            
-            if not user_input:
-                continue
-            
-            alias_name, duration = parse_command(user_input)
-            
-            if alias_name is None:
-                print("Invalid format. Use: alias_name(duration)")
-                continue
-            
-            if duration <= 0:
-                print("Error: Duration must be positive")
-                continue
-            
-            execute_command(alias_name, duration)
+            try:
+                user_input = input(">>> ").strip()
+                
+                if user_input.lower() in ['quit', 'exit']:
+                    print("Exiting...")
+                    break
+                
+                if not user_input:
+                    continue
+                
+                if user_input.lower() in ESTOP_KEYWORDS:
+                    emergency_stop()
+                    continue
+                
+                if user_input.lower() == 'history':
+                    print_history()
+                    continue
+                
+                if user_input.lower() == 'gpio':
+                    print_gpio()
+                    continue
+                
+                try:
+                    run_program(user_input)
+                except CommandSyntaxError as e:
+                    print(f"Invalid format ({e}). Use: alias_name(duration)")
+            except EmergencyStop:
+                print("Command aborted by emergency stop")
     
     except KeyboardInterrupt:
         print("\nInterrupted by user")
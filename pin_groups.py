@@ -0,0 +1,196 @@
+"""Nested groups, flattened to pin sets.
+
+A group's `aliases` list may name aliases or other groups (a name that is
+both is treated as the alias). Cycles are rejected when a group is
+written (find_cycle) and skipped if a hand-edited config.json contains
+one. GroupIndex flattens every group once per config version into a
+deduplicated {pin: alias} map plus a pin bitmask, so activating a deep
+macro costs the same as activating a single alias.
+
+The outer group's action ('on' or 'off') applies to every pin it reaches.
+
+Interlocks (config INTERLOCKS) name aliases or groups that must never be
+on together. A member counts as on only when all of its pins are on, so
+members that share pins (left and forward both drive motor_1) do not
+conflict by sharing them. They are compiled into the same index: every
+alias and group gets a Conflicts record listing, per policy, the pins
+that would complete a forbidden pair of members if they were on already,
+so an activation is checked against the current on-mask with a few
+integer operations.
+"""
+
+from collections import namedtuple
+
+INTERLOCK_POLICIES = ('reject', 'queue', 'preempt')
+
+FlatGroup = namedtuple('FlatGroup', 'action labels hold mask conflicts')
+# reject/queue/preempt: per policy, (rest, drop) mask pairs: the
+# activation turns on two interlocked members if every pin in rest is on
+# already, and preempting turns the pins in drop off. pins: every pin in
+# those masks (locked together with the activation); self_conflict: the
+# activation alone turns on two interlocked members.
+Conflicts = namedtuple('Conflicts', 'reject queue preempt pins self_conflict')
+
+
+def group_members(grp):
+    """Member names of a group entry (dict or legacy list)."""
+    return grp.get('aliases', []) if isinstance(grp, dict) else grp
+
+
+def group_action(grp):
+    return grp.get('action', 'on') if isinstance(grp, dict) else 'on'
+
+
+def find_cycle(groups, name, members):
+    """Return the cycle (e.g. ['a', 'b', 'a']) that defining group `name`
+    with `members` would create, or None.
+
+    Existing groups are assumed acyclic, so any new cycle passes through
+    `name`.
+    """
+    seen = set()
+
+    def visit(members, path):
+        for m in members:
+            if m == name:
+                return path + [m]
+            if m in groups and m not in seen:
+                seen.add(m)
+                found = visit(group_members(groups[m]), path + [m])
+                if found:
+                    return found
+        return None
+
+    return visit(members, [name])
+
+
+def expand_group(name, groups, aliases):
+    """Aliases reached from group `name`, in order, without duplicates."""
+    out = []
+    seen = set()
+    visiting = set()
+
+    def walk(g):
+        visiting.add(g)
+        for m in group_members(groups[g]):
+            if m in aliases:
+                if m not in seen:
+                    seen.add(m)
+                    out.append(m)
+            elif m in groups and m not in visiting:
+                walk(m)
+        visiting.discard(g)
+
+    walk(name)
+    return out
+
+
+def bits(mask):
+    """Pin numbers set in mask, ascending."""
+    pins = []
+    while mask:
+        low = mask & -mask
+        pins.append(low.bit_length() - 1)
+        mask ^= low
+    return pins
+
+
+class GroupIndex:
+    """Aliases, flattened groups and interlocks resolved to pins for one config version."""
+
+    def __init__(self, version, aliases, groups, gpio_pins, valid_pins, interlocks=None):
+        self.version = version
+        aliases = dict(aliases)
+        groups = dict(groups)
+        # alias -> (pin or None, auto_off)
+        self.alias_pins = {}
+        for name, a in aliases.items():
+            if isinstance(a, str):
+                config_spot, auto_off = a, True
+            else:
+                config_spot, auto_off = a.get('config_spot'), bool(a.get('auto_off', True))
+            pin_num = gpio_pins.get(config_spot)
+            self.alias_pins[name] = (pin_num if pin_num in valid_pins else None), auto_off
+
+        flat = {}
+        for name, grp in groups.items():
+            labels = {}
+            hold = set()
+            mask = 0
+            for alias in expand_group(name, groups, aliases):
+                pin_num, auto_off = self.alias_pins[alias]
+                if pin_num is None or pin_num in labels:
+                    continue
+                labels[pin_num] = alias
+                mask |= 1 << pin_num
+                if not auto_off:
+                    hold.add(pin_num)
+            flat[name] = (group_action(grp), labels, frozenset(hold), mask)
+
+        # Forbidden pairs of member masks as (policy, a, b), and pin ->
+        # indexes of the pairs that use it. A member whose pins include the
+        # other's cannot be on without it, so such pairs are left out.
+        self.interlock_pairs = []
+        self.pin_pairs = {}
+        for il in (interlocks or {}).values():
+            policy = il.get('policy', 'reject')
+            policy = INTERLOCK_POLICIES.index(policy if policy in INTERLOCK_POLICIES else 'reject')
+            masks = []
+            for member in il.get('members', []):
+                if member in self.alias_pins:
+                    pin_num = self.alias_pins[member][0]
+                    masks.append(0 if pin_num is None else 1 << pin_num)
+                elif member in flat:
+                    masks.append(flat[member][3])
+            masks = [m for m in masks if m]
+            for i, a in enumerate(masks):
+                for b in masks[i + 1:]:
+                    if not a & ~b or not b & ~a:
+                        continue
+                    for pin_num in bits(a | b):
+                        self.pin_pairs.setdefault(pin_num, []).append(len(self.interlock_pairs))
+                    self.interlock_pairs.append((policy, a, b))
+
+        self.alias_conflicts = {name: self.conflicts_for(() if pin_num is None else (pin_num,))
+                                for name, (pin_num, _) in self.alias_pins.items()}
+        self.groups = {name: FlatGroup(action, labels, hold, mask, self.conflicts_for(labels))
+                       for name, (action, labels, hold, mask) in flat.items()}
+
+    def conflicts_for(self, pins):
+        """Conflicts for turning on `pins`, or None if no interlock applies."""
+        if not self.pin_pairs:
+            return None
+        own = 0
+        touched = set()
+        for pin_num in pins:
+            own |= 1 << pin_num
+            touched.update(self.pin_pairs.get(pin_num, ()))
+        if not touched:
+            return None
+        clauses = ([], [], [])
+        every = 0
+        self_conflict = False
+        for i in sorted(touched):
+            policy, a, b = self.interlock_pairs[i]
+            rest = (a | b) & ~own
+            if not rest:
+                self_conflict = True
+                continue
+            # Preempt the member this activation does not touch, else one
+            # it does not turn on by itself
+            if a & own and b & ~own:
+                drop = b & ~own
+            else:
+                drop = a & ~own
+            clauses[policy].append((rest, drop))
+            every |= rest
+        return Conflicts(tuple(clauses[0]), tuple(clauses[1]), tuple(clauses[2]), tuple(bits(every)), self_conflict)
+
+
+def conflicting(clauses, on_mask):
+    """Pins of the clauses (see Conflicts) that `on_mask` completes, as a mask."""
+    hit = 0
+    for rest, _ in clauses:
+        if on_mask & rest == rest:
+            hit |= rest
+    return hit
@@ -0,0 +1,100 @@
+"""Fixed-size ring buffer of pin transitions.
+
+Events live in preallocated `array` columns (timestamp, pin, state,
+source, alias id), so memory use is fixed at construction and recording
+an event only stores numbers into existing slots: no per-event tuple,
+dict or list is created. Alias names are interned to small integer ids.
+
+Writers reserve a slot with an atomic counter and write the slot's
+sequence number last; readers skip any slot whose sequence number does
+not match what they expect (being overwritten), so neither side locks.
+"""
+
+import itertools
+import time
+from array import array
+
+SOURCES = ('ui', 'cli', 'ai', 'timer', 'estop', 'system', 'interlock', 'teleop', 'schedule', 'input')
+_SOURCE_IDS = {name: i for i, name in enumerate(SOURCES)}
+
+
+class TransitionHistory:
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+        self._t = array('d', bytes(8 * capacity))
+        self._seq = array('q', [-1]) * capacity
+        self._pin = array('b', bytes(capacity))
+        self._state = array('b', bytes(capacity))
+        self._source = array('b', bytes(capacity))
+        self._alias = array('i', [-1]) * capacity
+        self._counter = itertools.count()
+        self._written = 0
+        self._alias_ids = {}
+        self._alias_names = []
+        # Offset for reporting monotonic timestamps as wall-clock time
+        self.wall_offset = time.time() - time.monotonic()
+
+    def _alias_id(self, alias):
+        if alias is None:
+            return -1
+        aid = self._alias_ids.get(alias)
+        if aid is None:
+            # First sighting only; setdefault keeps concurrent interning consistent
+            aid = self._alias_ids.setdefault(alias, len(self._alias_names))
+            if aid == len(self._alias_names):
+                self._alias_names.append(alias)
+        return aid
+
+    def record(self, pin, state, source='system', alias=None, t=None):
+        """Store one transition (state: 1 = HIGH, 0 = LOW)."""
+        seq = next(self._counter)
+        i = seq % self.capacity
+        self._seq[i] = -1
+        self._t[i] = time.monotonic() if t is None else t
+        self._pin[i] = pin
+        self._state[i] = state
+        self._source[i] = _SOURCE_IDS.get(source, 5)
+        self._alias[i] = self._alias_id(alias)
+        self._seq[i] = seq
+        self._written = seq + 1
+
+    def __len__(self):
+        return min(self._written, self.capacity)
+
+    def query(self, since=None, until=None, pins=None, limit=None):
+        """Return matching events, oldest first.
+
+        since/until are monotonic timestamps (inclusive); pins is an
+        optional collection of pin numbers; limit keeps the newest N.
+        """
+        end = self._written
+        start = max(0, end - self.capacity)
+        out = []
+        for seq in range(end - 1, start - 1, -1):
+            i = seq % self.capacity
+            t = self._t[i]
+            pin = self._pin[i]
+            state = self._state[i]
+            source = self._source[i]
+            aid = self._alias[i]
+            if self._seq[i] != seq:
+                continue  # overwritten or still being written
+            if until is not None and t > until:
+                continue
+            if since is not None and t < since:
+                break  # events are recorded in time order
+            if pins is not None and pin not in pins:
+                continue
+            out.append({
+                'seq': seq,
+                't': t,
+                'ts': t + self.wall_offset,
+                'pin': pin,
+                'state': 'on' if state else 'off',
+                'source': SOURCES[source],
+                'alias': self._alias_names[aid] if aid >= 0 else None,
+            })
+            if limit is not None and len(out) >= limit:
+                break
+        out.reverse()
+        return out
@@ -0,0 +1,123 @@
+"""Incremental per-pin duty/usage accounting.
+
+Counters are updated on each on/off transition (no history scan):
+  - cycles:     number of off -> on transitions
+  - on_seconds: accumulated on-time, closed out at each on -> off
+
+Totals are persisted to a small JSON file at intervals by a background
+thread (only when something changed) and once more at exit.
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from array import array
+
+MAX_PIN = 64
+
+
+class UsageCounters:
+    def __init__(self, path=None):
+        self.path = path
+        self.on_seconds = array('d', bytes(8 * MAX_PIN))
+        self.cycles = array('q', bytes(8 * MAX_PIN))
+        # Monotonic time the pin turned on; 0.0 while off
+        self.on_since = array('d', bytes(8 * MAX_PIN))
+        self.saved_at = None
+        self._dirty = False
+        self._save_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    # ---- hot path (called under the server's state lock) ----
+    def on(self, pin, t):
+        if not self.on_since[pin]:
+            self.on_since[pin] = t
+            self.cycles[pin] += 1
+            self._dirty = True
+
+    def off(self, pin, t):
+        since = self.on_since[pin]
+        if since:
+            self.on_seconds[pin] += t - since
+            self.on_since[pin] = 0.0
+            self._dirty = True
+
+    # ---- queries ----
+    def pin_stats(self, pin, now=None):
+        now = time.monotonic() if now is None else now
+        since = self.on_since[pin]
+        return {
+            'on_seconds': self.on_seconds[pin] + (now - since if since else 0.0),
+            'cycles': self.cycles[pin],
+            'on': bool(since),
+        }
+
+    def snapshot(self, pins=None):
+        """Return {pin: stats} for the given pins (default: every pin with usage)."""
+        now = time.monotonic()
+        if pins is None:
+            pins = [p for p in range(MAX_PIN) if self.cycles[p]]
+        return {pin: self.pin_stats(pin, now) for pin in pins}
+
+    def reset(self, pin=None):
+        """Zero the counters of one pin, or all pins (e.g. after replacing a part)."""
+        now = time.monotonic()
+        for p in ([pin] if pin is not None else range(MAX_PIN)):
+            self.on_seconds[p] = 0.0
+            self.cycles[p] = 0
+            if self.on_since[p]:
+                self.on_since[p] = now
+        self._dirty = True
+
+    # ---- persistence ----
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            for key, v in data.get('pins', {}).items():
+                pin = int(key)
+                if 0 <= pin < MAX_PIN:
+                    self.on_seconds[pin] = float(v.get('on_seconds', 0.0))
+                    self.cycles[pin] = int(v.get('cycles', 0))
+            self.saved_at = data.get('saved_at')
+        except Exception as e:
+            print(f"⚠️ Failed loading usage from {self.path}: {e}")
+
+    def save(self, force=False):
+        """Write totals (including running on-time) if anything changed."""
+        if not self.path or not (self._dirty or force):
+            return
+        with self._save_lock:
+            pins = self.snapshot()
+            # Pins that are still on keep accruing time, so save again next round
+            self._dirty = any(s['on'] for s in pins.values())
+            data = {
+                'saved_at': time.time(),
+                'pins': {str(p): {'on_seconds': round(s['on_seconds'], 3), 'cycles': s['cycles']}
+                         for p, s in pins.items()},
+            }
+            tmp = self.path + '.tmp'
+            try:
+                with open(tmp, 'w') as f:
+                    json.dump(data, f, indent=2, sort_keys=True)
+                os.replace(tmp, self.path)
+                self.saved_at = data['saved_at']
+            except Exception as e:
+                self._dirty = True
+                print(f"⚠️ Failed saving usage to {self.path}: {e}")
+
+    def start_autosave(self, interval=60.0):
+        """Persist every `interval` seconds while running, and at exit."""
+        def run():
+            while not self._stop.wait(interval):
+                self.save()
+        threading.Thread(target=run, name='usage-autosave', daemon=True).start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        self._stop.set()
+        self.save()
@@ -1,16 +1,19 @@
-import RPi.GPIO as GPIO
+import config
+import gpio_backend
+from gpio_inputs import input_pins
 
-GPIO.setmode(GPIO.BCM)
+# The process-wide GPIO backend (config GPIO_SETTINGS), shared with web_server
+GPIO = gpio_backend.get()
 
-# ---- Setup all GPIO 2–27 as outputs ----
-# Note: GPIO 0 and 1 are reserved for I2C, pins 2-27 are standard GPIO
-for pin in range(2, 28):
-    GPIO.setup(pin, GPIO.OUT)
-    GPIO.output(pin, GPIO.LOW)
+# ---- Setup the mapped output pins ----
+# Only pins a config spot maps are set up (LOW); others are claimed on
+# their first write. Pins of config INPUTS (switches, sensors) are never driven.
+INPUT_PINS = frozenset(input_pins(config.GPIO_PINS, config.INPUTS, gpio_backend.VALID_PINS))
+VALID_PINS = set(gpio_backend.VALID_PINS - INPUT_PINS)
+GPIO.setup(sorted(VALID_PINS.intersection(config.GPIO_PINS.values())), GPIO.OUT, initial=GPIO.LOW)
 
 
 # ---- PIN 1 ----
-VALID_PINS = set(range(2, 28))
 
 def pin1_on():
     # PIN 1 is reserved for I2C and is not configured as an OUTPUT by default.
@@ -233,6 +236,15 @@ def pin27_off():
     GPIO.output(27, GPIO.LOW)
 
 
+# ---- EMERGENCY STOP ----
+OUTPUT_PINS = sorted(VALID_PINS)
+
+def all_off():
+    # Drive every output LOW in a single bank write, whatever set it HIGH;
+    # pins never set up are claimed first, since a plain LOW write skips them
+    GPIO.sweep_low(OUTPUT_PINS)
+
+
 # ---- CLEANUP ----
 def cleanup():
     GPIO.cleanup()
\ No newline at end of file
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""Replay a captured request trace against a RobotCLI server.
+
+Capture a trace by starting the server with request capture enabled:
+
+    ROBOTCLI_CAPTURE_LOG=logs/requests.jsonl sudo -E python3 web_server.py
+
+Then re-drive it (rotated files can be listed oldest first):
+
+    python3 replay.py logs/requests.jsonl.1 logs/requests.jsonl --speed 1
+    python3 replay.py logs/requests.jsonl --speed 10 --url http://127.0.0.1:8000
+    python3 replay.py logs/requests.jsonl --speed max --workers 16
+
+Requests are issued at their original relative times divided by --speed
+(`max` sends them back-to-back), from a worker pool so slow responses do
+not delay the schedule. p50/p95/p99 latency and error rates are reported
+overall and per route.
+"""
+
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from request_log import read_trace
+
+
+def percentile(ordered, p):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+
+def summarize(samples):
+    """samples: list of (latency_ms, ok)"""
+    latencies = sorted(s[0] for s in samples)
+    errors = sum(1 for s in samples if not s[1])
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'error_rate': (errors / len(samples)) if samples else 0.0,
+        'p50_ms': percentile(latencies, 0.50),
+        'p95_ms': percentile(latencies, 0.95),
+        'p99_ms': percentile(latencies, 0.99),
+        'max_ms': latencies[-1] if latencies else None,
+    }
+
+
+def replay(records, base_url, speed=1.0, workers=8, api_key=None, timeout=10.0):
+    """Replay records against base_url. speed=None means as fast as possible.
+
+    Returns a dict of overall and per-route summaries.
+    """
+    local = threading.local()
+    results = []
+    results_lock = threading.Lock()
+
+    def session():
+        s = getattr(local, 'session', None)
+        if s is None:
+            s = local.session = requests.Session()
+        return s
+
+    def send(rec):
+        body = rec.get('body')
+        if api_key and isinstance(body, dict) and body.get('api_key') == '****':
+            body = dict(body, api_key=api_key)
+        method = rec.get('method', 'GET')
+        kwargs = {'timeout': timeout}
+        if body is not None and method != 'GET':
+            kwargs['json'] = body
+        t0 = time.perf_counter()
+        try:
+            r = session().request(method, base_url + rec['route'], **kwargs)
+            ok = r.status_code < 400
+        except requests.RequestException:
+            ok = False
+        latency = (time.perf_counter() - t0) * 1000.0
+        with results_lock:
+            results.append((rec['route'], latency, ok))
+
+    start_wall = time.perf_counter()
+    t_first = records[0].get('ts', 0) if records else 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for rec in records:
+            if speed:
+                due = (rec.get('ts', t_first) - t_first) / speed
+                delay = due - (time.perf_counter() - start_wall)
+                if delay > 0:
+                    time.sleep(delay)
+            pool.submit(send, rec)
+    elapsed = time.perf_counter() - start_wall
+
+    by_route = {}
+    for route, latency, ok in results:
+        by_route.setdefault(route, []).append((latency, ok))
+    return {
+        'elapsed_s': elapsed,
+        'overall': summarize([(lat, ok) for _, lat, ok in results]),
+        'routes': {route: summarize(samples) for route, samples in sorted(by_route.items())},
+    }
+
+
+def _fmt(v):
+    return f'{v:8.2f}' if isinstance(v, (int, float)) else '       -'
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Replay a RobotCLI request capture')
+    ap.add_argument('traces', nargs='+', help='captured JSONL file(s)')
+    ap.add_argument('--url', default='http://127.0.0.1:8000', help='server base URL')
+    ap.add_argument('--speed', default='1',
+                    help="time scale: 1 = original pace, N = N times faster, 'max' = no delays")
+    ap.add_argument('--workers', type=int, default=8, help='concurrent requests in flight')
+    ap.add_argument('--api-key', help='substitute for redacted api_key fields in captured bodies')
+    ap.add_argument('--route', action='append', help='only replay these routes (repeatable)')
+    ap.add_argument('--json', help='also write the report to this file')
+    args = ap.parse_args()
+
+    speed = None if args.speed == 'max' else float(args.speed)
+    if speed is not None and speed <= 0:
+        ap.error('--speed must be positive or "max"')
+
+    records = read_trace(args.traces)
+    if args.route:
+        records = [r for r in records if r.get('route') in args.route]
+    if not records:
+        print('No requests to replay')
+        return
+    span = records[-1].get('ts', 0) - records[0].get('ts', 0)
+    pace = 'max speed' if speed is None else f'{speed:g}x'
+    print(f'Replaying {len(records)} requests (captured over {span:.1f}s) '
+          f'at {pace} against {args.url}...')
+
+    report = replay(records, args.url.rstrip('/'), speed=speed, workers=args.workers, api_key=args.api_key)
+
+    print(f'\nFinished in {report["elapsed_s"]:.2f}s')
+    print(f'{"route":<28}{"reqs":>7}{"err%":>8}{"p50":>9}{"p95":>9}{"p99":>9}')
+    rows = list(report['routes'].items()) + [('TOTAL', report['overall'])]
+    for route, s in rows:
+        print(f'{route:<28}{s["requests"]:>7}{s["error_rate"] * 100:>7.1f}%'
+              f'{_fmt(s["p50_ms"])} {_fmt(s["p95_ms"])} {_fmt(s["p99_ms"])}')
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""Buffered, rotating JSONL capture of API requests.
+
+Each captured request is one JSON line:
+
+    {"ts": 1700000000.123, "method": "POST", "route": "/api/activate",
+     "body": {"alias": "motor_1", "duration": 2}, "status": 200, "latency_ms": 1.42}
+
+Request handlers only enqueue a dict; a background thread serializes and
+writes lines in batches, so capture does not add file I/O to the request
+path. Files rotate like logging.handlers.RotatingFileHandler
+(requests.jsonl -> requests.jsonl.1 -> ... -> requests.jsonl.N).
+
+`replay.py` re-drives a captured trace against a server.
+"""
+
+import atexit
+import json
+import os
+import queue
+import threading
+
+# Body fields that must never be written to disk
+REDACTED_FIELDS = ('api_key',)
+
+
+def redact(body):
+    """Return a shallow copy of a request body with secrets masked."""
+    if not isinstance(body, dict):
+        return body
+    if not any(k in body for k in REDACTED_FIELDS):
+        return body
+    clean = dict(body)
+    for k in REDACTED_FIELDS:
+        if k in clean and clean[k]:
+            clean[k] = '****'
+    return clean
+
+
+class RequestCapture:
+    """Background writer for request records."""
+
+    def __init__(self, path, max_bytes=10 * 1024 * 1024, backup_count=5, queue_size=10000):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._file = None
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-capture', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def record(self, ts, method, route, body, status, latency_ms):
+        """Queue a request record. Never blocks; drops the record if the queue is full."""
+        try:
+            self._queue.put_nowait({
+                'ts': ts,
+                'method': method,
+                'route': route,
+                'body': redact(body),
+                'status': status,
+                'latency_ms': latency_ms,
+            })
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        """Flush queued records and stop the writer thread."""
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self._thread.join(timeout=5)
+
+    # ---- writer thread ----
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def _rotate(self):
+        self._file.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            src = f'{self.path}.{i}'
+            if os.path.exists(src):
+                os.replace(src, f'{self.path}.{i + 1}')
+        if self.backup_count > 0:
+            os.replace(self.path, f'{self.path}.1')
+        else:
+            os.remove(self.path)
+        self._open()
+
+    def _drain(self, first):
+        lines = [json.dumps(first, separators=(',', ':'), default=str)]
+        while len(lines) < 512:
+            try:
+                rec = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            lines.append(json.dumps(rec, separators=(',', ':'), default=str))
+        self._file.write('\n'.join(lines) + '\n')
+        self._file.flush()
+        if self.max_bytes and self._file.tell() >= self.max_bytes:
+            self._rotate()
+
+    def _run(self):
+        try:
+            self._open()
+        except OSError as e:
+            print(f"⚠️ Request capture disabled, cannot open {self.path}: {e}")
+            return
+        while True:
+            try:
+                rec = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                if self._stopped.is_set():
+                    break
+                continue
+            try:
+                self._drain(rec)
+            except Exception as e:
+                print(f"⚠️ Request capture write failed: {e}")
+        self._file.close()
+
+
+def read_trace(paths):
+    """Return captured records from one or more JSONL files, ordered by timestamp."""
+    records = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+    records.sort(key=lambda r: r.get('ts', 0))
+    return records
@@ -0,0 +1,390 @@
+"""Persistent recurring and one-shot jobs, driven by a timing wheel.
+
+A job runs a command-language program (see command_lang.py) on a
+schedule, given by exactly one of:
+
+    {"program": "relay_1(5)", "every": "10m"}          every 10 minutes
+    {"program": "lights_on", "daily": "19:00"}         each day at 19:00 local time
+    {"program": "pump(30s)", "at": "2026-10-20T07:30"}  once, at that local time
+    {"program": "stop", "in": "90s"}                   once, 90 s from now
+
+Interval jobs keep their phase (`start` + k * every, `start` defaulting to
+one interval after creation). Jobs are kept in `path` (schedule.json next
+to config.json) and timed on a TimingWheel, so thousands of them cost one
+O(1) insert per run and a driver thread that sleeps until the next one
+is due.
+
+Catch-up: a checkpoint file records the time up to which every due run
+has been dispatched. After a restart (or a jump of the wall clock) each
+job whose schedule passed a run it missed runs once, straight away, if
+that run is no older than the job's `grace` (default one hour) and its
+`catch_up` is "once"; with "skip", or when older, the run is only
+counted as missed. Several missed runs of one job are coalesced into
+one. The checkpoint is written right after runs are dispatched, so a
+crash in between repeats those runs rather than losing them.
+
+`run(job)` is called on a small worker pool and returns a result dict.
+"""
+
+import json
+import math
+import os
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from command_lang import parse_duration
+from timing_wheel import TimingWheel
+
+KINDS = ('every', 'daily', 'at', 'in')
+CATCH_UP = ('once', 'skip')
+DEFAULT_GRACE = 3600.0
+MIN_INTERVAL = 1.0
+
+
+def _parse_clock(text):
+    """'19:00' or '19:00:30' -> (hour, minute, second)."""
+    parts = str(text).strip().split(':')
+    if len(parts) not in (2, 3) or not all(p.isdigit() for p in parts):
+        raise ValueError(f'daily must be HH:MM or HH:MM:SS, got {text!r}')
+    hour, minute, second = (int(p) for p in parts + ['0'] * (3 - len(parts)))
+    if hour > 23 or minute > 59 or second > 59:
+        raise ValueError(f'daily must be HH:MM or HH:MM:SS, got {text!r}')
+    return hour, minute, second
+
+
+def _parse_time(value):
+    """Epoch seconds or an ISO date-time (local time unless it has an offset)."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    try:
+        return datetime.fromisoformat(str(value).strip()).timestamp()
+    except ValueError:
+        raise ValueError(f'at must be epoch seconds or an ISO date-time, got {value!r}') from None
+
+
+class Job:
+    """One scheduled program. `next_run` is None once a one-shot has run."""
+
+    def __init__(self, program, kind, spec, job_id=None, name=None, catch_up='once',
+                 grace=DEFAULT_GRACE, start=None, created=None):
+        self.id = job_id or secrets.token_urlsafe(6)
+        self.program = program
+        self.kind = kind
+        self.spec = spec            # seconds (every), (h, m, s) (daily) or epoch (at)
+        self.name = name
+        self.catch_up = catch_up
+        self.grace = grace
+        self.created = time.time() if created is None else created
+        self.start = start if start is not None or kind != 'every' else self.created + spec
+        self.next_run = None
+        self.timer = None
+        self.runs = 0
+        self.missed = 0
+        self.last_run = None
+        self.last_result = None
+
+    @property
+    def recurring(self):
+        return self.kind != 'at'
+
+    def next_after(self, t):
+        """First run strictly after wall time t, or None."""
+        if self.kind == 'at':
+            return self.spec if self.spec > t else None
+        if self.kind == 'every':
+            if t < self.start:
+                return self.start
+            return self.start + (math.floor((t - self.start) / self.spec) + 1) * self.spec
+        day = datetime.fromtimestamp(t).date()
+        for _ in range(3):      # today, or tomorrow (the day after if DST skips the time)
+            when = self._daily(day)
+            if when > t:
+                return when
+            day += timedelta(days=1)
+        return None
+
+    def _daily(self, day):
+        return datetime(day.year, day.month, day.day, *self.spec).timestamp()
+
+    def previous(self, t):
+        """Latest run at or before wall time t, or None."""
+        if self.kind == 'at':
+            return self.spec if self.spec <= t else None
+        if self.kind == 'every':
+            if t < self.start:
+                return None
+            return self.start + math.floor((t - self.start) / self.spec) * self.spec
+        day = datetime.fromtimestamp(t).date()
+        for _ in range(3):
+            when = self._daily(day)
+            if when <= t:
+                return when
+            day -= timedelta(days=1)
+        return None
+
+    def to_dict(self, stats=True):
+        out = {'id': self.id, 'program': self.program, 'catch_up': self.catch_up, 'grace': self.grace,
+               'created': self.created}
+        if self.name:
+            out['name'] = self.name
+        if self.kind == 'every':
+            out['every'] = self.spec
+            out['start'] = self.start
+        elif self.kind == 'daily':
+            out['daily'] = '%02d:%02d:%02d' % self.spec
+        else:
+            out['at'] = self.spec
+        if stats:
+            out.update(next_run=self.next_run, runs=self.runs, missed=self.missed,
+                       last_run=self.last_run, last_result=self.last_result)
+        return out
+
+    @classmethod
+    def from_dict(cls, data, now=None):
+        """Build a job from an API request or schedule.json; raises ValueError."""
+        if not isinstance(data, dict):
+            raise ValueError('job must be an object')
+        now = time.time() if now is None else now
+        program = data.get('program')
+        if not isinstance(program, str) or not program.strip():
+            raise ValueError('Missing program')
+        given = [kind for kind in KINDS if data.get(kind) is not None]
+        if len(given) != 1:
+            raise ValueError('Give exactly one of every, daily, at or in')
+        kind, value = given[0], data[given[0]]
+        if kind == 'every':
+            spec = parse_duration(value)
+            if spec < MIN_INTERVAL:
+                raise ValueError(f'every must be at least {MIN_INTERVAL:g} seconds')
+        elif kind == 'daily':
+            spec = _parse_clock(value)
+        elif kind == 'at':
+            spec = _parse_time(value)
+        else:
+            kind, spec = 'at', now + parse_duration(value)
+        catch_up = data.get('catch_up', 'once')
+        if catch_up not in CATCH_UP:
+            raise ValueError(f'catch_up must be one of {", ".join(CATCH_UP)}')
+        grace = parse_duration(data.get('grace'), DEFAULT_GRACE)
+        if grace < 0:
+            raise ValueError('grace must not be negative')
+        start = data.get('start')
+        return cls(program.strip(), kind, spec, job_id=data.get('id'), name=data.get('name') or None,
+                   catch_up=catch_up, grace=grace, created=data.get('created', now),
+                   start=None if start is None else _parse_time(start))
+
+
+class Scheduler:
+    def __init__(self, path, run, tick=1.0, workers=4, clock=time.time):
+        self.path = path
+        self.checkpoint_path = path + '.checkpoint' if path else None
+        self.run = run
+        self.clock = clock
+        self.jobs = {}
+        self.checkpoint = None
+        self.stats = {'runs': 0, 'missed': 0, 'caught_up': 0, 'resyncs': 0}
+        self.wheel = TimingWheel(tick, now=clock())
+        self._last = clock()         # wall time of the last run_pending
+        self._cond = threading.Condition()
+        # Serializes writes of schedule.json and the checkpoint, which share
+        # their tmp files; taken before _cond, never while holding it
+        self._save_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='schedule')
+        self._thread = None
+        self._stop = False
+
+    # ---- jobs ----
+    def add(self, job):
+        """Store and arm a job; raises ValueError for a duplicate id or a time in the past."""
+        with self._cond:
+            if job.id in self.jobs:
+                raise ValueError(f'Job {job.id} already exists')
+            self._arm(job, self.clock())
+            if job.next_run is None:
+                raise ValueError('at is in the past')
+            self.jobs[job.id] = job
+            self._cond.notify()
+        self.save()
+        return job
+
+    def remove(self, job_id):
+        with self._cond:
+            job = self.jobs.pop(job_id, None)
+            if job is not None and job.timer is not None:
+                self.wheel.cancel(job.timer)
+        if job is not None:
+            self.save()
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def list(self):
+        with self._cond:
+            return sorted(self.jobs.values(), key=lambda job: (job.next_run is None, job.next_run or 0))
+
+    def _arm(self, job, after):
+        # Caller holds _cond
+        if job.timer is not None:
+            self.wheel.cancel(job.timer)
+        job.next_run = job.next_after(after)
+        job.timer = self.wheel.schedule(job.next_run, job) if job.next_run is not None else None
+
+    # ---- persistence ----
+    def load(self):
+        """Read schedule.json and the checkpoint, catch up on missed runs and arm every job."""
+        data = {}
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    data = json.load(f)
+            except Exception as e:
+                print(f"⚠️ Failed loading schedule from {self.path}: {e}")
+        try:
+            with open(self.checkpoint_path, 'r') as f:
+                self.checkpoint = float(f.read().strip())
+        except (TypeError, OSError, ValueError):
+            self.checkpoint = None
+        jobs = []
+        for entry in data.get('jobs', []):
+            try:
+                jobs.append(Job.from_dict(entry))
+            except ValueError as e:
+                print(f"⚠️ Skipping invalid scheduled job {entry!r}: {e}")
+        now = self.clock()
+        with self._cond:
+            self._last = now
+            self.jobs = {job.id: job for job in jobs}
+            due = self._catch_up(self.checkpoint if self.checkpoint is not None else now, now)
+        self._dispatch(due, now, now)
+        if len(self.jobs) != len(jobs):
+            self.save()
+
+    def _catch_up(self, since, now):
+        """Jobs with a run in (since, now] to run once now; re-arms every job. Caller holds _cond."""
+        self.wheel = TimingWheel(self.wheel.tick, self.wheel.slots, self.wheel.levels, now)
+        due = []
+        for job in list(self.jobs.values()):
+            job.timer = None
+            missed = job.previous(now)
+            if missed is not None and missed > since:
+                if job.catch_up == 'once' and now - missed <= job.grace:
+                    due.append(job)
+                    self.stats['caught_up'] += 1
+                else:
+                    job.missed += 1
+                    self.stats['missed'] += 1
+            if job.recurring:
+                self._arm(job, now)
+            elif job in due or job.next_after(now) is None:
+                del self.jobs[job.id]       # a one-shot that runs now or has passed
+            else:
+                self._arm(job, now)
+        return due
+
+    def save(self):
+        if not self.path:
+            return
+        # The jobs are read under the save lock too, so a slower writer
+        # cannot replace a newer file with an older list
+        with self._save_lock:
+            with self._cond:
+                data = {'jobs': [job.to_dict(stats=False) for job in self.jobs.values()]}
+            tmp = self.path + '.tmp'
+            try:
+                with open(tmp, 'w') as f:
+                    json.dump(data, f, indent=2, sort_keys=True)
+                os.replace(tmp, self.path)
+            except Exception as e:
+                print(f"⚠️ Failed saving schedule to {self.path}: {e}")
+
+    def _save_checkpoint(self, t):
+        with self._save_lock:
+            self.checkpoint = t
+            if not self.checkpoint_path:
+                return
+            tmp = self.checkpoint_path + '.tmp'
+            try:
+                with open(tmp, 'w') as f:
+                    f.write(repr(t))
+                os.replace(tmp, self.checkpoint_path)
+            except Exception as e:
+                print(f"⚠️ Failed saving schedule checkpoint: {e}")
+
+    # ---- running ----
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name='scheduler', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        with self._cond:
+            self._stop = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._pool.shutdown(wait=True)
+
+    def run_pending(self):
+        """Start every run due by now; returns those jobs. The driver thread calls this."""
+        with self._cond:
+            now = self.clock()
+            wheel = self.wheel
+            if now < self._last - wheel.tick or now - self._last > wheel.slots * wheel.tick:
+                # The wall clock jumped (or we slept through a suspend):
+                # treat it like a restart rather than replaying every tick
+                self.stats['resyncs'] += 1
+                due = self._catch_up(self._last, now)
+                done_until = resynced = now
+            else:
+                due = wheel.advance(now)
+                for job in due:
+                    job.timer = None
+                    if job.recurring:
+                        self._arm(job, now)
+                    else:
+                        self.jobs.pop(job.id, None)
+                # Runs up to the last tick processed are dispatched; later ones are not
+                done_until = wheel.current * wheel.tick
+                resynced = None
+            self._last = now
+        if due or resynced:
+            self._dispatch(due, now, done_until)
+        return due
+
+    def _loop(self):
+        while True:
+            self.run_pending()
+            with self._cond:
+                if self._stop:
+                    return
+                # Wake at least twice per level-0 turn, so a clock jump is noticed
+                limit = self.wheel.slots * self.wheel.tick / 2
+                wake = self.wheel.next_due()
+                self._cond.wait(limit if wake is None else min(limit, max(0.0, wake - self.clock())))
+
+    def _dispatch(self, due, now, done_until):
+        """Start the due jobs, then record that every run up to done_until is dispatched."""
+        for job in due:
+            job.runs += 1
+            job.last_run = now
+            self.stats['runs'] += 1
+            self._pool.submit(self._run_job, job)
+        self._save_checkpoint(done_until)
+        if any(not job.recurring for job in due):
+            self.save()
+
+    def _run_job(self, job):
+        try:
+            job.last_result = self.run(job)
+        except Exception as e:
+            job.last_result = {'error': 'Execution exception', 'details': str(e)}
+
+    def to_dict(self):
+        return {'jobs': len(self.jobs), 'tick': self.wheel.tick, 'checkpoint': self.checkpoint,
+                **self.stats}
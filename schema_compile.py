@@ -0,0 +1,234 @@
+"""Compile a JSON Schema into a plain Python validator function.
+
+    validate = compile_schema(schema)
+    validate({'action': 'status'})      # -> None when valid
+    validate({'action': 'fly'})         # -> "action: 'fly' is not one of ..."
+
+The schema is walked once, up front, and turned into nested closures
+that each check one keyword, so validating a value does no schema
+lookups and stops at the first problem. A oneOf whose branches all pin
+the same required property to a `const` (like the `action` of an AI
+command) compiles to a dict lookup on that property instead of trying
+every branch.
+
+Only the keywords RobotCLI's generated schemas use are supported: type,
+enum, const, properties, required, additionalProperties (false),
+items, minItems, minimum, maximum and oneOf. Any other keyword raises
+SchemaError when compiling, rather than being silently ignored.
+"""
+
+# Keywords that only describe the schema and never affect validation
+ANNOTATIONS = {'title', 'description', 'examples', '$schema', '$id'}
+KEYWORDS = {'type', 'enum', 'const', 'properties', 'required', 'additionalProperties',
+            'items', 'minItems', 'minimum', 'maximum', 'oneOf'}
+
+
+class SchemaError(ValueError):
+    """The schema uses a keyword or value this compiler does not support."""
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+TYPE_CHECKS = {
+    'object': lambda v: isinstance(v, dict),
+    'array': lambda v: isinstance(v, list),
+    'string': lambda v: isinstance(v, str),
+    'number': _is_number,
+    'integer': lambda v: _is_number(v) and float(v).is_integer(),
+    'boolean': lambda v: isinstance(v, bool),
+    'null': lambda v: v is None,
+}
+
+
+def _where(path):
+    return path or 'value'
+
+
+def _choices(values):
+    values = list(values)
+    if len(values) > 8:
+        return f'one of {len(values)} allowed values'
+    return 'one of ' + ', '.join(repr(v) for v in values)
+
+
+def compile_schema(schema):
+    """Return validate(value) -> None if valid, else a message naming the first problem."""
+    check = _compile(schema)
+    return lambda value: check(value, '')
+
+
+def _compile(schema):
+    unknown = set(schema) - KEYWORDS - ANNOTATIONS
+    if unknown:
+        raise SchemaError(f'Unsupported schema keyword(s): {", ".join(sorted(unknown))}')
+    checks = []
+
+    if 'type' in schema:
+        kind = schema['type']
+        if kind not in TYPE_CHECKS:
+            raise SchemaError(f'Unsupported type: {kind!r}')
+        is_kind = TYPE_CHECKS[kind]
+
+        def check_type(value, path):
+            if not is_kind(value):
+                return f'{_where(path)}: expected {kind}, got {type(value).__name__}'
+        checks.append(check_type)
+
+    if 'const' in schema:
+        const = schema['const']
+
+        def check_const(value, path):
+            if value != const:
+                return f'{_where(path)}: must be {const!r}'
+        checks.append(check_const)
+
+    if 'enum' in schema:
+        allowed = schema['enum']
+        try:
+            members = frozenset(allowed)
+        except TypeError:
+            raise SchemaError('enum values must be hashable') from None
+
+        def check_enum(value, path):
+            try:
+                ok = value in members
+            except TypeError:
+                ok = False
+            if not ok:
+                return f'{_where(path)}: {value!r} is not {_choices(allowed)}'
+        checks.append(check_enum)
+
+    for keyword, fails in (('minimum', lambda v, n: v < n), ('maximum', lambda v, n: v > n)):
+        if keyword in schema:
+            checks.append(_bound(keyword, schema[keyword], fails))
+
+    if 'required' in schema or 'properties' in schema or 'additionalProperties' in schema:
+        checks.append(_object(schema))
+
+    if 'items' in schema or 'minItems' in schema:
+        checks.append(_array(schema))
+
+    if 'oneOf' in schema:
+        checks.append(_one_of(schema['oneOf']))
+
+    if len(checks) == 1:
+        return checks[0]
+
+    def check_all(value, path):
+        for check in checks:
+            error = check(value, path)
+            if error is not None:
+                return error
+    return check_all
+
+
+def _bound(keyword, limit, fails):
+    word = 'at least' if keyword == 'minimum' else 'at most'
+
+    def check_bound(value, path):
+        if _is_number(value) and fails(value, limit):
+            return f'{_where(path)}: must be {word} {limit}'
+    return check_bound
+
+
+def _object(schema):
+    required = tuple(schema.get('required', ()))
+    props = tuple((name, _compile(sub)) for name, sub in schema.get('properties', {}).items())
+    additional = schema.get('additionalProperties', True)
+    if additional not in (True, False):
+        raise SchemaError('additionalProperties must be true or false')
+    known = frozenset(name for name, _ in props)
+
+    def check_object(value, path):
+        if not isinstance(value, dict):
+            return None     # only `type` constrains non-objects
+        for name in required:
+            if name not in value:
+                return f'{_where(path)}: {name!r} is required'
+        prefix = path + '.' if path else ''
+        for name, check in props:
+            if name in value:
+                error = check(value[name], prefix + name)
+                if error is not None:
+                    return error
+        if not additional:
+            extra = [name for name in value if name not in known]
+            if extra:
+                return f'{_where(path)}: unexpected {extra[0]!r}'
+    return check_object
+
+
+def _array(schema):
+    check_item = _compile(schema['items']) if 'items' in schema else None
+    min_items = schema.get('minItems', 0)
+
+    def check_array(value, path):
+        if not isinstance(value, list):
+            return None
+        if len(value) < min_items:
+            return f'{_where(path)}: needs at least {min_items} item(s)'
+        if check_item is not None:
+            for i, item in enumerate(value):
+                error = check_item(item, f'{path}[{i}]')
+                if error is not None:
+                    return error
+    return check_array
+
+
+def _discriminator(branches):
+    """The property every branch requires and pins to a distinct const, if any."""
+    first = branches[0].get('properties', {})
+    for name, sub in first.items():
+        if 'const' not in sub:
+            continue
+        consts = []
+        for branch in branches:
+            prop = branch.get('properties', {}).get(name, {})
+            if 'const' not in prop or name not in branch.get('required', ()):
+                break
+            consts.append(prop['const'])
+        else:
+            if len(set(map(repr, consts))) == len(consts):
+                return name, consts
+    return None
+
+
+def _one_of(branches):
+    if not branches:
+        raise SchemaError('oneOf needs at least one branch')
+    found = _discriminator(branches)
+    if found is not None:
+        name, consts = found
+        table = {const: _compile(branch) for const, branch in zip(consts, branches)}
+
+        def check_tagged(value, path):
+            if not isinstance(value, dict):
+                return None
+            if name not in value:
+                return f'{_where(path)}: {name!r} is required'
+            try:
+                check = table.get(value[name])
+            except TypeError:
+                check = None
+            if check is None:
+                return f'{path + "." if path else ""}{name}: {value[name]!r} is not {_choices(consts)}'
+            return check(value, path)
+        return check_tagged
+
+    compiled = [(branch.get('type'), _compile(branch)) for branch in branches]
+
+    def check_one_of(value, path):
+        errors = [check(value, path) for _, check in compiled]
+        matched = errors.count(None)
+        if matched == 1:
+            return None
+        if matched > 1:
+            return f'{_where(path)}: matches more than one alternative'
+        # Report the alternative of the value's own type, if there is one
+        for (kind, _), error in zip(compiled, errors):
+            if kind in TYPE_CHECKS and TYPE_CHECKS[kind](value):
+                return error
+        return errors[0]
+    return check_one_of
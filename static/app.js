@@ -0,0 +1,990 @@
+let duration = 1;
+let config = {};
+let status = {}; // active pins: pin -> remaining seconds, or null while held
+// Server-side AI conversation (history is kept and trimmed by the server)
+let aiConversationId = null;
+
+// Status is polled as binary deltas (layout in status_codec.py): statusSeq
+// is the last frame's sequence number, so a poll with nothing new is 12 bytes
+let statusSeq = null;
+const STATUS_POLL_MS = 500;
+
+// Control buttons by pin, so a status change only touches its own badges
+let buttonsByPin = new Map();
+
+// Load configuration from server
+async function loadConfig() {
+    try {
+        const cfgResp = await fetch('/api/config');
+        config = await cfgResp.json();
+        renderControls();
+        loadConfigDisplay();
+        if (typeof loadVisuals === 'function') loadVisuals();
+        // Load AI config & schema which auto-update based on hardware config
+        loadAIConfig();
+        loadAISchema();
+    } catch (error) {
+        console.error('Error loading config:', error);
+        updateStatus('Error loading configuration', false);
+    }
+}
+
+// Poll status deltas; reload the config when its version moves on
+async function pollStatus() {
+    try {
+        if (!document.hidden) {
+            const since = (statusSeq === null) ? '' : '&since=' + statusSeq;
+            const r = await fetch('/api/status?format=bin' + since);
+            const cfgVersion = Number(r.headers.get('X-Config-Version'));
+            applyStatusFrame(await r.arrayBuffer());
+            if (cfgVersion !== config.version) await loadConfig();
+        }
+    } catch (error) {
+        console.error('Status poll failed:', error);
+    }
+    setTimeout(pollStatus, STATUS_POLL_MS);
+}
+
+// Decode a status frame into `status` and refresh the badges of changed pins
+function applyStatusFrame(buf) {
+    const view = new DataView(buf);
+    if (view.getUint8(0) !== 1) throw new Error('Unsupported status format');
+    const delta = view.getUint8(1) & 1, count = view.getUint8(2), mask = view.getUint32(8, true);
+    const next = {};
+    if (delta) {
+        for (const [pin, s] of Object.entries(status)) if ((mask >>> pin) & 1) next[pin] = s;
+    }
+    for (let i = 0, off = 12; i < count; i++, off += 5) {
+        const ms = view.getUint32(off + 1, true);
+        next[view.getUint8(off)] = (ms === 0xFFFFFFFF) ? null : ms / 1000;
+    }
+    statusSeq = view.getUint32(4, true);
+    const changed = new Set(Object.keys(status).concat(Object.keys(next))
+        .filter(pin => statusClass(status[pin]) !== statusClass(next[pin])));
+    status = next;
+    if (changed.size) updateStatusBadges(changed);
+}
+
+function updateStatusBadges(pins) {
+    for (const pin of pins) {
+        for (const button of buttonsByPin.get(String(pin)) || []) setDot(button, statusClass(status[pin]));
+    }
+    // Keyed, so only the alias rows whose badge changed are rebuilt
+    displayAliases();
+}
+
+// 'indef' (held), 'timed' or '' (off) for a status value
+function statusClass(s) {
+    if (s === null) return 'indef';
+    return (typeof s === 'number' && s > 0) ? 'timed' : '';
+}
+
+// Pin number of an alias, or null when unmapped
+function aliasPin(alias) {
+    const val = config.aliases && config.aliases[alias];
+    const spot = val && val.config_spot ? val.config_spot : val;
+    const pin = config.gpio_pins && config.gpio_pins[spot];
+    return (pin === null || typeof pin === 'undefined') ? null : pin;
+}
+
+function pinStatus(pin) {
+    return (pin === null) ? undefined : status[pin];
+}
+
+// Keyed rendering: make the children of `container` after the first `skip`
+// match `items` ({key, sig, create}) in order. An element is kept while its
+// key and signature are unchanged, rebuilt with create() when the signature
+// changes and removed when its key goes away. Returns the elements in order.
+function reconcile(container, items, skip = 0) {
+    const old = new Map();
+    for (const el of Array.from(container.children).slice(skip)) old.set(el.dataset.key, el);
+    let next = container.children[skip] || null;
+    const out = [];
+    for (const item of items) {
+        let el = old.get(item.key);
+        old.delete(item.key);
+        if (el && el.dataset.sig !== item.sig) {
+            if (el === next) next = el.nextElementSibling;
+            el.remove();
+            el = null;
+        }
+        if (!el) {
+            el = item.create();
+            el.dataset.key = item.key;
+            el.dataset.sig = item.sig;
+        }
+        if (el === next) next = el.nextElementSibling;
+        else container.insertBefore(el, next);
+        out.push(el);
+    }
+    for (const el of old.values()) el.remove();
+    return out;
+}
+
+// Render control buttons organized by type
+function renderControls() {
+    const controls = document.getElementById('controls');
+
+    // Helper to categorize buttons
+    const categories = {
+        motors: { title: '🚗 Motors', items: [] },
+        leds: { title: '💡 LEDs', items: [] },
+        relays: { title: '🔌 Relays', items: [] },
+        servos: { title: '⚙️ Servos', items: [] },
+        buzzer: { title: '📢 Sound', items: [] },
+        aux: { title: '📌 Auxiliary', items: [] },
+        groups: { title: '🎯 Groups', items: [] }
+    };
+
+    // Sort aliases into categories
+    for (const alias of Object.keys(config.aliases || {})) {
+        const btn = { key: 'alias:' + alias, name: alias, onclick: () => activateAlias(alias), pin: aliasPin(alias) };
+        if (alias.includes('motor')) categories.motors.items.push(btn);
+        else if (alias.includes('led')) categories.leds.items.push(btn);
+        else if (alias.includes('relay')) categories.relays.items.push(btn);
+        else if (alias.includes('servo')) categories.servos.items.push(btn);
+        else if (alias.includes('buzzer')) categories.buzzer.items.push(btn);
+        else categories.aux.items.push(btn);
+    }
+
+    // Sort groups
+    for (const groupName of Object.keys(config.groups || {})) {
+        categories.groups.items.push({
+            key: 'group:' + groupName,
+            name: groupName,
+            onclick: () => activateGroup(groupName),
+            pin: null
+        });
+    }
+
+    // Sections, then the buttons in each; untouched ones stay in place
+    const used = Object.entries(categories).filter(([, category]) => category.items.length);
+    const sections = reconcile(controls, used.map(([key, category]) => ({
+        key,
+        sig: category.title,
+        create: () => {
+            const section = document.createElement('div');
+            section.className = 'section';
+            const title = document.createElement('div');
+            title.className = 'section-title';
+            title.textContent = category.title;
+            section.appendChild(title);
+            const grid = document.createElement('div');
+            grid.className = 'control-grid';
+            section.appendChild(grid);
+            return section;
+        }
+    })));
+
+    buttonsByPin = new Map();
+    used.forEach(([key, category], i) => {
+        const buttons = reconcile(sections[i].lastChild, category.items.map(btn => ({
+            key: btn.key,
+            sig: btn.name,
+            create: () => {
+                const button = document.createElement('button');
+                button.className = `control-btn ${key}-btn`;
+                button.append(btn.name.toUpperCase() + ' ', document.createElement('span'));
+                button.onclick = btn.onclick;
+                return button;
+            }
+        })));
+        category.items.forEach((btn, j) => {
+            if (btn.pin === null) return setDot(buttons[j], '');
+            const pin = String(btn.pin);
+            if (!buttonsByPin.has(pin)) buttonsByPin.set(pin, []);
+            buttonsByPin.get(pin).push(buttons[j]);
+            setDot(buttons[j], statusClass(pinStatus(btn.pin)));
+        });
+    });
+}
+
+// Set a control button's status dot ('indef', 'timed' or '' for none)
+function setDot(button, state) {
+    const dot = button.lastChild;
+    if (dot.dataset.state === state) return;
+    dot.dataset.state = state;
+    dot.className = state ? 'status-dot ' + state : '';
+    dot.title = { indef: 'Active (indefinite)', timed: 'Active (timed)' }[state] || '';
+}
+
+// Load configuration display
+async function loadConfigDisplay() {
+    displayAliases();
+    displayGPIOPins();
+    displayGroups();
+}
+
+// Display aliases
+function displayAliases() {
+    const list = document.getElementById('aliases-list');
+    if (!list.firstElementChild) list.innerHTML = '<h4>Current Aliases:</h4>';
+    reconcile(list, Object.entries(config.aliases || {}).map(([name, val]) => {
+        // val may be a string (legacy) or an object {config_spot, auto_off}
+        let spot = val && val.config_spot ? val.config_spot : val;
+        let autoOff = val && (typeof val.auto_off !== 'undefined') ? val.auto_off : true;
+        const pin = aliasPin(name);
+        const state = statusClass(pinStatus(pin));
+        return {
+            key: name,
+            sig: JSON.stringify([spot, pin, autoOff, state]),
+            create: () => {
+                let statusBadge = '';
+                if (state === 'indef') statusBadge = '<span class="badge indef">Active (indef)</span>';
+                else if (state === 'timed') statusBadge = '<span class="badge active">Active</span>';
+                let autoBadge = autoOff ? '<span class="badge auto-yes">Auto-off</span>' : '<span class="badge auto-no">Hold</span>';
+
+                const item = document.createElement('div');
+                item.className = 'config-item';
+                const pinText = (pin === null) ? '<em>Unmapped</em>' : 'Pin ' + pin;
+                item.innerHTML = `
+                    <div>
+                        <div class="config-item-key">${name} ${statusBadge} ${autoBadge}</div>
+                        <div class="config-item-value">${spot} &nbsp; ${pinText}</div>
+                    </div>
+                    <div>
+                        <button class="form-btn" onclick="toggleAutoOff('${name}', ${autoOff})">Toggle Auto-off</button>
+                        <button class="form-btn" onclick="deleteAlias('${name}')">Delete</button>
+                    </div>
+                `;
+                return item;
+            }
+        };
+    }), 1);
+}
+
+// Display GPIO pins
+function displayGPIOPins() {
+    const tbody = document.getElementById('gpio-table-body');
+
+    // If server didn't provide a mapping list, fall back to config_spot1..27
+    let spots = Object.keys(config.gpio_pins || {});
+    if (!spots || spots.length === 0) {
+        spots = [];
+        for (let i = 1; i <= 27; i++) spots.push('config_spot' + i);
+    }
+
+    // Aliases that reference each spot
+    const assignedBySpot = {};
+    for (const [name, val] of Object.entries(config.aliases || {})) {
+        const sp = (val && val.config_spot) ? val.config_spot : val;
+        (assignedBySpot[sp] = assignedBySpot[sp] || []).push(name);
+    }
+
+    reconcile(tbody, spots.map(spot => {
+        const pin = (config.gpio_pins && (spot in config.gpio_pins)) ? config.gpio_pins[spot] : null;
+        const assigned = assignedBySpot[spot] || [];
+        return {
+            key: spot,
+            sig: JSON.stringify([pin, assigned]),
+            create: () => {
+                const pinText = (pin === null || typeof pin === 'undefined') ? 'Unmapped' : 'Pin ' + pin;
+                const tr = document.createElement('tr');
+                tr.innerHTML = `
+                    <td style="padding:8px;border-bottom:1px solid #f1f1f1">${spot}</td>
+                    <td style="padding:8px;border-bottom:1px solid #f1f1f1">${pinText}</td>
+                    <td style="padding:8px;border-bottom:1px solid #f1f1f1">${assigned.length ? assigned.join(', ') : '<em>None</em>'}</td>
+                    <td style="padding:8px;border-bottom:1px solid #f1f1f1">
+                        <button class="form-btn" onclick="useConfigSpotForAlias('${spot}')" style="padding:6px 10px">Use</button>
+                        ${ (pin !== null && typeof pin !== 'undefined') ? `<span style="margin-left:8px;font-size:0.9em;color:#666">(mapped)</span>` : '' }
+                    </td>
+                `;
+                return tr;
+            }
+        };
+    }));
+}
+
+// Inline set pin helper
+async function setPinInline(spot) {
+    const el = document.getElementById('pin-in-' + spot);
+    const val = el && el.value ? parseInt(el.value) : null;
+    if (!val || val < 1 || val > 27) {
+        updateStatus('Please enter a valid pin number (1-27)', false);
+        return;
+    }
+    if (val === 1) {
+        updateStatus('Pin 1 is reserved on many platforms; please choose 2-27', false);
+        return;
+    }
+    try {
+        const r = await fetch('/api/config/gpio-pins', {
+            method: 'POST', headers: {'Content-Type':'application/json'}, body: JSON.stringify({config_spot: spot, pin_num: val})
+        });
+        const res = await r.json();
+        if (res.success) {
+            updateStatus(`Mapped ${spot} to pin ${val}`, true);
+            loadConfig();
+        } else {
+            updateStatus('Error: ' + (res.error||JSON.stringify(res)), false);
+        }
+    } catch (err) {
+        console.error('Set pin failed', err);
+        updateStatus('Error setting pin', false);
+    }
+}
+
+// Inline assign alias helper (deprecated for UI - preserved for backward compatibility)
+async function assignAliasInline(spot) {
+    const alias = prompt(`Assign an existing alias to ${spot}. Enter alias name:`);
+    if (!alias) return;
+    // If alias exists, keep its auto_off setting, otherwise create with auto_off=true
+    const existing = config.aliases && config.aliases[alias];
+    const auto_off = existing && typeof existing.auto_off !== 'undefined' ? existing.auto_off : true;
+    try {
+        const r = await fetch('/api/config/aliases', {
+            method: 'POST', headers: {'Content-Type':'application/json'}, body: JSON.stringify({name: alias, config_spot: spot, auto_off: auto_off})
+        });
+        const res = await r.json();
+        if (res.success) {
+            updateStatus(`Alias ${alias} assigned to ${spot}`, true);
+            loadConfig();
+        } else {
+            updateStatus('Error: ' + (res.error||JSON.stringify(res)), false);
+        }
+    } catch (err) {
+        console.error('Assign alias failed', err);
+        updateStatus('Error assigning alias', false);
+    }
+}
+
+// Helper: copy config spot into Add Alias form
+function useConfigSpotForAlias(spot) {
+    const el = document.getElementById('newAliasSpot');
+    if (el) {
+        el.value = spot;
+        updateStatus(`${spot} copied into Add Alias form`, true);
+        // Switch to the Config -> Aliases tab so the user can finish adding
+        switchTab('config');
+        switchConfigTab('aliases');
+    }
+}
+
+// Display groups
+function displayGroups() {
+    const list = document.getElementById('groups-list');
+    if (!list.firstElementChild) list.innerHTML = '<h4>Current Groups:</h4>';
+    reconcile(list, Object.entries(config.groups || {}).map(([name, v]) => {
+        let aliases = v && v.aliases ? v.aliases : v;
+        let action = v && v.action ? v.action : 'on';
+        return {
+            key: name,
+            sig: JSON.stringify([aliases, action]),
+            create: () => {
+                const item = document.createElement('div');
+                item.className = 'config-item';
+                item.innerHTML = `
+                    <div>
+                        <div class="config-item-key">${name}</div>
+                        <div class="config-item-value">${aliases.join(', ')}</div>
+                        <div class="config-item-value">Action: ${action.toUpperCase()}</div>
+                    </div>
+                    <div>
+                        <button class="form-btn" onclick="toggleGroupAction('${name}', '${action}')">Toggle Action</button>
+                        <button class="form-btn" onclick="deleteGroup('${name}')">Delete</button>
+                    </div>
+                `;
+                return item;
+            }
+        };
+    }), 1);
+}
+
+// Add new alias
+async function addAlias() {
+    const name = document.getElementById('newAliasName').value;
+    const spot = document.getElementById('newAliasSpot').value;
+    const autoOff = document.getElementById('newAliasAutoOff').checked;
+
+    if (!name || !spot) {
+        updateStatus('Please fill in all fields', false);
+        return;
+    }
+
+    try {
+        const response = await fetch('/api/config/aliases', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ name, config_spot: spot, auto_off: autoOff })
+        });
+
+        const result = await response.json();
+        if (result.success) {
+            updateStatus(`Alias "${name}" added successfully`, true);
+            document.getElementById('newAliasName').value = '';
+            document.getElementById('newAliasSpot').value = '';
+            document.getElementById('newAliasAutoOff').checked = true;
+            loadConfig();
+        } else {
+            updateStatus('Error: ' + result.error, false);
+        }
+    } catch (error) {
+        updateStatus('Error adding alias', false);
+        console.error(error);
+    }
+}
+
+// Update GPIO pin
+async function updateGPIOPin() {
+    const spot = document.getElementById('gpioPinSpot').value;
+    const pin = document.getElementById('gpioPinNum').value;
+
+    if (!spot || !pin) {
+        updateStatus('Please fill in all fields', false);
+        return;
+    }
+    if (parseInt(pin) < 1 || parseInt(pin) > 27) {
+        updateStatus('Please enter a valid pin number (1-27)', false);
+        return;
+    }
+    if (parseInt(pin) === 1) {
+        updateStatus('Pin 1 is reserved on many platforms; please choose 2-27', false);
+        return;
+    }
+
+    try {
+        const response = await fetch('/api/config/gpio-pins', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ config_spot: spot, pin_num: parseInt(pin) })
+        });
+
+        const result = await response.json();
+        if (result.success) {
+            updateStatus(`GPIO mapping updated`, true);
+            document.getElementById('gpioPinSpot').value = '';
+            document.getElementById('gpioPinNum').value = '';
+            loadConfig();
+        } else {
+            updateStatus('Error: ' + result.error, false);
+        }
+    } catch (error) {
+        updateStatus('Error updating GPIO pin', false);
+        console.error(error);
+    }
+}
+
+// Add group
+async function addGroup() {
+    const name = document.getElementById('newGroupName').value;
+    const aliases = document.getElementById('newGroupAliases').value
+        .split(',')
+        .map(a => a.trim())
+        .filter(a => a);
+    const action = document.getElementById('newGroupAction').value || 'on';
+
+    if (!name || aliases.length === 0) {
+        updateStatus('Please fill in all fields', false);
+        return;
+    }
+
+    try {
+        const response = await fetch('/api/config/groups', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ name, aliases, action })
+        });
+
+        const result = await response.json();
+        if (result.success) {
+            updateStatus(`Group "${name}" created successfully`, true);
+            document.getElementById('newGroupName').value = '';
+            document.getElementById('newGroupAliases').value = '';
+            loadConfig();
+        } else {
+            updateStatus('Error: ' + result.error, false);
+        }
+    } catch (error) {
+        updateStatus('Error creating group', false);
+        console.error(error);
+    }
+}
+
+// Switch main tabs
+function switchTab(tab) {
+    document.querySelectorAll('.tab-content').forEach(el => el.classList.remove('active'));
+    document.getElementById(tab + '-tab').classList.add('active');
+
+    document.querySelectorAll('.tabs .tab-btn').forEach(el => el.classList.remove('active'));
+    event.target.classList.add('active');
+}
+
+// Switch config tabs
+function switchConfigTab(tab) {
+    document.querySelectorAll('#config-tab .tab-content').forEach(el => el.style.display = 'none');
+    document.getElementById(tab + '-config').style.display = 'block';
+
+    document.querySelectorAll('.config-tabs .tab-btn').forEach(el => el.classList.remove('active'));
+    event.target.classList.add('active');
+    if (tab === 'usage') loadUsage();
+}
+
+// Format seconds as e.g. "2h 05m 13s"
+function formatDuration(sec) {
+    sec = Math.floor(sec || 0);
+    const h = Math.floor(sec / 3600), m = Math.floor((sec % 3600) / 60), s = sec % 60;
+    if (h) return `${h}h ${String(m).padStart(2, '0')}m ${String(s).padStart(2, '0')}s`;
+    if (m) return `${m}m ${String(s).padStart(2, '0')}s`;
+    return `${s}s`;
+}
+
+// Load per-alias usage counters
+async function loadUsage() {
+    try {
+        const r = await fetch('/api/usage');
+        const data = await r.json();
+        const tbody = document.getElementById('usage-table-body');
+        tbody.innerHTML = '';
+        for (const [alias, u] of Object.entries(data.aliases || {})) {
+            const tr = document.createElement('tr');
+            tr.style.borderBottom = '1px solid #f0f0f0';
+            const badge = u.on ? ' <span class="badge active">On</span>' : '';
+            tr.innerHTML = `
+                <td style="padding:8px">${alias}${badge}</td>
+                <td style="padding:8px">${u.pin}</td>
+                <td style="padding:8px">${formatDuration(u.on_seconds)}</td>
+                <td style="padding:8px">${u.cycles}</td>
+                <td style="padding:8px"><button class="form-btn" onclick="resetUsage(${u.pin})">Reset</button></td>
+            `;
+            tbody.appendChild(tr);
+        }
+    } catch (error) {
+        console.error('Error:', error);
+        updateStatus('Error loading usage', false);
+    }
+}
+
+// Reset usage counters for one pin (or all when pin is omitted)
+async function resetUsage(pin) {
+    const what = (pin === undefined) ? 'all components' : `pin ${pin}`;
+    if (!confirm(`Reset usage counters for ${what}?`)) return;
+    try {
+        const r = await fetch('/api/usage/reset', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(pin === undefined ? {} : { pin })
+        });
+        const result = await r.json();
+        if (result.success) {
+            updateStatus(`Usage reset for ${what}`, true);
+            loadUsage();
+        } else {
+            updateStatus(result.error || 'Reset failed', false);
+        }
+    } catch (error) {
+        console.error('Error:', error);
+        updateStatus('Error: Reset failed', false);
+    }
+}
+
+// Delete an alias
+async function deleteAlias(name) {
+    if (!confirm(`Delete alias "${name}"? This cannot be undone.`)) return;
+    try {
+        const response = await fetch('/api/config/aliases', {
+            method: 'DELETE',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ name })
+        });
+        const result = await response.json();
+        if (result.success) {
+            updateStatus(`Alias "${name}" deleted`, true);
+            loadConfig();
+        } else {
+            updateStatus('Error: ' + result.error, false);
+        }
+    } catch (err) {
+        console.error(err);
+        updateStatus('Error deleting alias', false);
+    }
+}
+
+// Toggle auto-off for an alias
+async function toggleAutoOff(name, current) {
+    const newVal = !current;
+    try {
+        // We need the current config spot to update the alias
+        const alias = config.aliases[name];
+        const spot = (alias && alias.config_spot) ? alias.config_spot : alias;
+        const response = await fetch('/api/config/aliases', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ name, config_spot: spot, auto_off: newVal })
+        });
+        const result = await response.json();
+        if (result.success) {
+            updateStatus(`Alias "${name}" auto-off set to ${newVal}`, true);
+            loadConfig();
+        } else {
+            updateStatus('Error: ' + result.error, false);
+        }
+    } catch (err) {
+        console.error(err);
+        updateStatus('Error toggling auto-off', false);
+    }
+}
+
+// Delete a gpio pin mapping
+async function deleteGPIOPin(spot) {
+    if (!confirm(`Delete mapping for "${spot}"? This will set it to Unmapped.`)) return;
+    try {
+        const response = await fetch('/api/config/gpio-pins', {
+            method: 'DELETE',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ config_spot: spot })
+        });
+        const result = await response.json();
+        if (result.success) {
+            updateStatus(`Mapping for "${spot}" removed`, true);
+            loadConfig();
+        } else {
+            updateStatus('Error: ' + result.error, false);
+        }
+    } catch (err) {
+        console.error(err);
+        updateStatus('Error deleting mapping', false);
+    }
+}
+
+// Delete a group
+async function deleteGroup(name) {
+    if (!confirm(`Delete group "${name}"?`)) return;
+    try {
+        const response = await fetch('/api/config/groups', {
+            method: 'DELETE',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ name })
+        });
+        const result = await response.json();
+        if (result.success) {
+            updateStatus(`Group "${name}" deleted`, true);
+            loadConfig();
+        } else {
+            updateStatus('Error: ' + result.error, false);
+        }
+    } catch (err) {
+        console.error(err);
+        updateStatus('Error deleting group', false);
+    }
+}
+
+// Reset GPIO mapping to default
+async function resetGPIODefaults() {
+    if (!confirm('Reset all GPIO mappings to defaults? This will overwrite current mappings.')) return;
+    try {
+        const r = await fetch('/api/config/gpio-pins/reset', { method: 'POST' });
+        const res = await r.json();
+        if (res.success) {
+            updateStatus(res.message || 'GPIO mappings reset', true);
+            loadConfig();
+        } else {
+            updateStatus('Error resetting GPIO mappings: ' + (res.error || JSON.stringify(res)), false);
+        }
+    } catch (err) {
+        console.error('Reset failed', err);
+        updateStatus('Error resetting GPIO mappings', false);
+    }
+}
+
+// Toggle group action between on/off
+async function toggleGroupAction(name, currentAction) {
+    const newAction = (currentAction === 'on') ? 'off' : 'on';
+    try {
+        const grp = config.groups[name];
+        const aliases = grp && grp.aliases ? grp.aliases : grp;
+        const response = await fetch('/api/config/groups', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ name, aliases, action: newAction })
+        });
+        const result = await response.json();
+        if (result.success) {
+            updateStatus(`Group "${name}" action set to ${newAction}`, true);
+            loadConfig();
+        } else {
+            updateStatus('Error: ' + result.error, false);
+        }
+    } catch (err) {
+        console.error(err);
+        updateStatus('Error toggling group action', false);
+    }
+}
+
+// Activate a single alias
+async function activateAlias(alias) {
+    try {
+        const response = await fetch('/api/activate', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ alias, duration })
+        });
+
+        const result = await response.json();
+        if (result.success) {
+            updateStatus(`Activated ${alias} for ${duration}s`, true);
+        } else {
+            updateStatus('Error: ' + result.error, false);
+        }
+    } catch (error) {
+        console.error('Error:', error);
+        updateStatus('Error: Request failed', false);
+    }
+}
+
+// Activate a group
+async function activateGroup(group) {
+    try {
+        const response = await fetch('/api/activate-group', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ group, duration })
+        });
+
+        const result = await response.json();
+        if (result.success) {
+            const count = result.activated.length;
+            updateStatus(`Activated group "${group}" (${count} components) for ${duration}s`, true);
+        } else {
+            updateStatus('Error: ' + result.error, false);
+        }
+    } catch (error) {
+        console.error('Error:', error);
+        updateStatus('Error: Request failed', false);
+    }
+}
+
+// Stop all
+async function stopAll() {
+    try {
+        const response = await fetch('/api/stop', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({})
+        });
+
+        const result = await response.json();
+        updateStatus('All components stopped', true);
+    } catch (error) {
+        console.error('Error:', error);
+        updateStatus('Error: Stop failed', false);
+    }
+}
+
+// Update duration display
+document.getElementById('durationInput').addEventListener('input', (e) => {
+    duration = parseFloat(e.target.value) || 0.1;
+    document.getElementById('durationDisplay').textContent = duration.toFixed(1) + 's';
+});
+
+// Update status message
+function updateStatus(message, success) {
+    const bar = document.getElementById('statusBar');
+    bar.textContent = message;
+    bar.className = success ? 'status-bar active' : 'status-bar';
+    setTimeout(() => bar.classList.remove('active'), 3000);
+}
+
+// ---- AI management functions ----
+async function loadAIConfig() {
+    try {
+        const r = await fetch('/api/ai/config');
+        const ai = await r.json();
+        // API key is masked by server; if configured show placeholder
+        document.getElementById('aiApiKey').value = '';
+        document.getElementById('aiApiKey').placeholder = ai.api_key ? '**** (configured)' : '';
+        document.getElementById('aiModel').value = ai.model || '';
+        document.getElementById('aiBaseUrl').value = ai.base_url || '';
+        document.getElementById('aiEnabled').checked = !!ai.enabled;
+    } catch (err) {
+        console.error('Failed to load AI config', err);
+    }
+}
+
+function appendAIConversation(role, text) {
+    const conv = document.getElementById('aiConversation');
+    const el = document.createElement('div');
+    el.style.marginBottom = '8px';
+    el.innerHTML = `<strong>${role}:</strong> ${text}`;
+    conv.appendChild(el);
+    conv.scrollTop = conv.scrollHeight;
+}
+
+async function sendAIMessage() {
+    const msg = document.getElementById('aiMessage').value.trim();
+    if (!msg) return;
+
+    // Fetch latest AI config to avoid unnecessary provider requests
+    try {
+        const cfgResp = await fetch('/api/ai/config');
+        const cfg = await cfgResp.json();
+        if (!cfg.enabled) {
+            appendAIConversation('AI (error)', 'AI integration is disabled on the server');
+            updateStatus('AI disabled', false);
+            return;
+        }
+        if (!cfg.api_key_configured) {
+            appendAIConversation('AI (error)', 'AI API key not configured on server');
+            updateStatus('AI API key not configured', false);
+            return;
+        }
+    } catch (err) {
+        // If config fetch fails, show a helpful message and avoid provider call
+        appendAIConversation('AI (error)', 'Failed to verify AI configuration');
+        updateStatus('Failed to verify AI configuration', false);
+        return;
+    }
+
+    appendAIConversation('You', msg);
+    document.getElementById('aiMessage').value = '';
+    try {
+        // Only the new message goes up; the server holds the conversation
+        const shareHistory = document.getElementById('aiShareHistory').checked;
+        const r = await fetch('/api/ai/chat', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ message: msg, conversation: shareHistory ? aiConversationId : null, stream: true })
+        });
+        // Progress streams in as one JSON event per line; commands run on the
+        // server while the model is still replying
+        if ((r.headers.get('Content-Type') || '').startsWith('application/x-ndjson')) {
+            await readAIEvents(r);
+            return;
+        }
+        // Errors before the reply started come back as a plain JSON body
+        const text = await r.text();
+        let res;
+        try {
+            res = JSON.parse(text);
+        } catch (err) {
+            const snippet = text ? text.substring(0, 800) : '<empty response>';
+            appendAIConversation('AI (error)', `Chat failed: server returned non-JSON response (status ${r.status}) — ${snippet}`);
+            updateStatus('AI chat failed', false);
+            return;
+        }
+        showAIError(res);
+    } catch (err) {
+        console.error('Chat failed', err);
+        appendAIConversation('AI (error)', 'Chat failed: ' + String(err));
+        updateStatus('AI chat failed', false);
+    }
+}
+
+async function readAIEvents(r) {
+    const reader = r.body.getReader();
+    const decoder = new TextDecoder();
+    let buf = '';
+    for (;;) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buf += decoder.decode(value, { stream: true });
+        let nl;
+        while ((nl = buf.indexOf('\n')) !== -1) {
+            const line = buf.slice(0, nl);
+            buf = buf.slice(nl + 1);
+            if (line) handleAIEvent(JSON.parse(line));
+        }
+    }
+}
+
+function handleAIEvent(ev) {
+    if (ev.event === 'reply') {
+        appendAIConversation('AI', ev.reply);
+        updateStatus('AI: ' + ev.reply, true);
+    } else if (ev.event === 'executed') {
+        // Display execution results in the conversation for transparency
+        showAIExecution(ev.result);
+    } else if (ev.event === 'done') {
+        if (ev.conversation) aiConversationId = ev.conversation;
+    } else if (ev.event === 'error') {
+        showAIError(ev);
+    }
+}
+
+function showAIExecution(ex) {
+    if (ex && ex.success) {
+        // Friendly messages for typical actions
+        if (ex.action === 'activate_alias') {
+            appendAIConversation('System', `Executed: turned ON ${ex.alias} (pin ${ex.pin}) for ${ex.duration}s`);
+        } else if (ex.action === 'activate_group') {
+            appendAIConversation('System', `Executed: activated group ${ex.group} (${(ex.activated||[]).length} items)`);
+        } else if (ex.stopped) {
+            appendAIConversation('System', `Executed: stopped ${Array.isArray(ex.stopped) ? ex.stopped.join(', ') : ex.stopped}`);
+        } else if (ex.status) {
+            appendAIConversation('System', `Status: ${JSON.stringify(ex.status)}`);
+        } else {
+            appendAIConversation('System', `Executed: ${JSON.stringify(ex)}`);
+        }
+    } else {
+        appendAIConversation('System (error)', `Execution error: ${ex.error || JSON.stringify(ex)}${ex.details ? ' — ' + ex.details : ''}`);
+    }
+}
+
+function showAIError(res) {
+    if (!res.error) return;
+    // If provider returned a detailed error (e.g., status/text), display a helpful message
+    const errText = res.error + (res.status ? ` (status ${res.status})` : '') + (res.details ? ` — ${res.details}` : '');
+    appendAIConversation('AI (error)', errText);
+    updateStatus('AI error', false);
+    // If provider returned raw content in an error (for debugging), show it lightly
+    if (res.raw) {
+        appendAIConversation('System (debug)', res.raw);
+    }
+}
+
+function clearAIConversation() {
+    document.getElementById('aiConversation').innerHTML = '';
+    if (aiConversationId) fetch('/api/ai/conversation/' + aiConversationId, { method: 'DELETE' });
+    aiConversationId = null;
+}
+async function saveAIConfig() {
+    try {
+        const apiKeyEl = document.getElementById('aiApiKey');
+        const apiKey = apiKeyEl.value || null;
+        const model = document.getElementById('aiModel').value || null;
+        const baseUrl = document.getElementById('aiBaseUrl').value.trim() || null;
+        const enabled = document.getElementById('aiEnabled').checked;
+
+        // If enabling AI, ensure an API key is provided (or already configured)
+        if (enabled && !apiKey) {
+            // Check placeholder to see if a key is already configured on server
+            if (!apiKeyEl.placeholder || apiKeyEl.placeholder.indexOf('configured') === -1) {
+                updateStatus('Please enter an API key before enabling AI', false);
+                return;
+            }
+        }
+
+        const r = await fetch('/api/ai/register', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ api_key: apiKey, model: model, base_url: baseUrl, enabled: enabled })
+        });
+        const result = await r.json();
+        if (result.success) {
+            updateStatus('AI settings updated', true);
+            loadAIConfig();
+            loadAISchema();
+        } else {
+            updateStatus('Error updating AI settings', false);
+        }
+    } catch (err) {
+        console.error('Failed to save AI config', err);
+        updateStatus('Error saving AI settings', false);
+    }
+}
+
+async function loadAISchema() {
+    try {
+        const r = await fetch('/api/ai/schema');
+        const schema = await r.json();
+        document.getElementById('aiSchema').textContent = JSON.stringify(schema, null, 2);
+    } catch (err) {
+        console.error('Failed to load AI schema', err);
+        document.getElementById('aiSchema').textContent = 'Failed to load schema';
+    }
+}
+
+function refreshAISchema() { loadAISchema(); updateStatus('AI schema refreshed', true); }
+
+// Initialize
+if (typeof startVisualBoard === 'function') startVisualBoard();
+loadConfig().then(pollStatus);
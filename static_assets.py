@@ -0,0 +1,140 @@
+"""Precompressed, content-hashed static assets for the web UI.
+
+At startup every .css and .js file in static/ is minified, named after a
+hash of its content (app.css -> app.3f2a9c1be07d.css) and compressed once
+with gzip, and with brotli when the optional `brotli` package is
+installed. Requests are then served straight from memory in the best
+encoding the client accepts.
+
+Hashed names change whenever the content does, so they are served with
+`Cache-Control: public, max-age=31536000, immutable` and browsers never
+revalidate them. The HTML shell is rendered once with the hashed URLs and
+served with an ETag and `Cache-Control: no-cache`, so a reload costs one
+304 until the UI changes. Edits to static/ or templates/ take effect on
+the next server start.
+"""
+
+import gzip
+import hashlib
+import os
+import re
+from collections import namedtuple
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+MIMETYPES = {
+    '.css': 'text/css; charset=utf-8',
+    '.js': 'text/javascript; charset=utf-8',
+    '.html': 'text/html; charset=utf-8',
+}
+
+# encodings maps content-coding ('identity', 'gzip', 'br') -> bytes
+Asset = namedtuple('Asset', 'name url mimetype etag cache_control encodings')
+
+
+def minify_css(text):
+    """Drop comments and the whitespace around punctuation."""
+    text = re.sub(r'/\*.*?\*/', '', text, flags=re.S)
+    text = re.sub(r'\s+', ' ', text)
+    # Not around ':' -- 'a :hover' and 'a:hover' are different selectors
+    text = re.sub(r' ?([{};,>]) ?', r'\1', text)
+    return text.replace(';}', '}').strip()
+
+
+def minify_js(text):
+    """Drop indentation, blank lines and whole-line // comments.
+
+    Line breaks are kept, so automatic semicolon insertion behaves as in
+    the source, and lines inside multi-line template literals are left
+    exactly as written.
+    """
+    out = []
+    in_template = False
+    for line in text.splitlines():
+        if in_template:
+            out.append(line)
+        else:
+            stripped = line.strip()
+            if stripped and not stripped.startswith('//'):
+                out.append(stripped)
+        if line.count('`') % 2:
+            in_template = not in_template
+    return '\n'.join(out) + '\n'
+
+
+def minify_html(text):
+    """Drop indentation and blank lines, except inside <pre> and <textarea>."""
+    out = []
+    verbatim = 0
+    for line in text.splitlines():
+        if verbatim:
+            out.append(line)
+        elif line.strip():
+            out.append(line.strip())
+        verbatim += len(re.findall(r'<(?:pre|textarea)\b', line)) - len(re.findall(r'</(?:pre|textarea)>', line))
+    return '\n'.join(out) + '\n'
+
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+
+def compress(data):
+    """{content-coding: bytes} for data, smallest first; identity always present."""
+    encodings = {'identity': data, 'gzip': gzip.compress(data, 9, mtime=0)}
+    if brotli is not None:
+        encodings['br'] = brotli.compress(data, quality=11)
+    return dict(sorted(encodings.items(), key=lambda item: len(item[1])))
+
+
+def make_asset(name, url, data, cache_control):
+    etag = hashlib.sha256(data).hexdigest()[:16]
+    mimetype = MIMETYPES.get(os.path.splitext(name)[1], 'application/octet-stream')
+    return Asset(name, url, mimetype, etag, cache_control, compress(data))
+
+
+class AssetBundle:
+    """The built assets of one static/ directory, keyed by hashed name."""
+
+    def __init__(self, directory, prefix='/static/'):
+        self.directory = directory
+        self.prefix = prefix
+        self.assets = {}    # hashed name -> Asset
+        self.urls = {}      # source name -> hashed URL
+
+    def build(self):
+        assets, urls = {}, {}
+        for name in sorted(os.listdir(self.directory)):
+            base, ext = os.path.splitext(name)
+            if ext not in MINIFIERS:
+                continue
+            with open(os.path.join(self.directory, name), encoding='utf-8') as f:
+                data = MINIFIERS[ext](f.read()).encode('utf-8')
+            hashed = f'{base}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+            assets[hashed] = make_asset(name, self.prefix + hashed, data, IMMUTABLE)
+            urls[name] = self.prefix + hashed
+        self.assets, self.urls = assets, urls
+        return self
+
+    def url(self, name):
+        """Hashed URL for a source file name, for use in templates."""
+        return self.urls[name]
+
+    def get(self, hashed_name):
+        return self.assets.get(hashed_name)
+
+
+def choose_encoding(asset, accept_encodings):
+    """Smallest encoding of asset the client accepts.
+
+    accept_encodings is a werkzeug Accept (request.accept_encodings);
+    identity is used when nothing else is acceptable.
+    """
+    for coding in asset.encodings:
+        if coding == 'identity' or accept_encodings[coding]:
+            return coding
+    return 'identity'
@@ -0,0 +1,86 @@
+"""Compact binary encoding of pin status, for clients polling at high rate.
+
+GET /api/status?format=bin (or with `Accept: application/x-robotcli-status`)
+returns a little-endian frame instead of JSON:
+
+    header  12 bytes  B format version (1)
+                      B flags (bit 0: delta)
+                      B entry count
+                      x padding
+                      I state sequence number (mod 2**32)
+                      I on-mask (bit N set while pin N is on)
+    entry    5 bytes  B pin
+                      I remaining milliseconds, 0xFFFFFFFF = held until stopped
+
+A full frame has one entry per active pin. With `since=<seq>` the server
+sends a delta instead: the mask is always complete, but entries are only
+sent for pins turned on or given a new deadline after that sequence
+number. Pins missing from the mask are off. If the server no longer
+remembers that sequence number it answers with a full frame (delta bit
+clear), so a client can always send the last seq it saw.
+"""
+
+import struct
+import time
+from collections import namedtuple
+
+MIMETYPE = 'application/x-robotcli-status'
+FORMAT_VERSION = 1
+FLAG_DELTA = 0x01
+HELD = 0xFFFFFFFF
+
+_HEADER = struct.Struct('<BBBxII')
+_ENTRY = struct.Struct('<BI')
+_MISSING = object()
+
+# pins maps pin -> deadline on the client's clock (None = held)
+StatusFrame = namedtuple('StatusFrame', 'seq mask delta pins')
+
+
+def encode(seq, mask, pins, now, since_pins=None):
+    """Encode {pin: end_time | None} (server clock `now`) as a frame.
+
+    since_pins is the pin map the client last saw; when given, only pins
+    whose deadline differs from it are included and the delta flag is set.
+    """
+    if since_pins is None:
+        entries = list(pins.items())
+        flags = 0
+    else:
+        entries = [(pin, end) for pin, end in pins.items() if since_pins.get(pin, _MISSING) != end]
+        flags = FLAG_DELTA
+    out = bytearray(_HEADER.size + _ENTRY.size * len(entries))
+    _HEADER.pack_into(out, 0, FORMAT_VERSION, flags, len(entries), seq & 0xFFFFFFFF, mask & 0xFFFFFFFF)
+    offset = _HEADER.size
+    for pin, end in entries:
+        if end is None:
+            ms = HELD
+        else:
+            ms = min(HELD - 1, max(0, int((end - now) * 1000.0 + 0.5)))
+        _ENTRY.pack_into(out, offset, pin, ms)
+        offset += _ENTRY.size
+    return bytes(out)
+
+
+def decode(data, previous=None, now=None):
+    """Decode a frame into a StatusFrame.
+
+    Remaining times become deadlines on the caller's clock (`now`, default
+    time.monotonic()). Pass the previous StatusFrame to apply a delta to it.
+    """
+    if now is None:
+        now = time.monotonic()
+    version, flags, count, seq, mask = _HEADER.unpack_from(data, 0)
+    if version != FORMAT_VERSION:
+        raise ValueError(f'Unsupported status format version {version}')
+    delta = bool(flags & FLAG_DELTA)
+    if delta and previous is not None:
+        pins = {pin: end for pin, end in previous.pins.items() if mask >> pin & 1}
+    else:
+        pins = {}
+    offset = _HEADER.size
+    for _ in range(count):
+        pin, ms = _ENTRY.unpack_from(data, offset)
+        offset += _ENTRY.size
+        pins[pin] = None if ms == HELD else now + ms / 1000.0
+    return StatusFrame(seq, mask, delta, pins)
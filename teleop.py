@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""UDP teleoperation channel: packet format and client.
+
+The web server listens for teleop datagrams when ROBOTCLI_TELEOP_PORT and
+ROBOTCLI_TELEOP_KEY are set. Each datagram says "these pins (or targets)
+should be on for the next hold_ms"; a joystick client resends it at
+50-200 Hz while the stick is held. Pins this session had on that are not
+in the latest packet turn off at once, and everything it holds turns off
+on its own when packets stop arriving, so a lost link stops the robot.
+
+Datagram, little-endian:
+
+    header  24 bytes  B  version (2)
+                      B  flags (bit 0: payload is target ids, else a pin mask)
+                      H  hold_ms
+                      I  server epoch (from GET /api/teleop/targets)
+                      I  session id (random per client run)
+                      I  sequence number
+                      I  sender clock, milliseconds (mod 2**32)
+                      H  target table version (ids only, see below)
+                      H  number of target ids
+    payload           I  pin mask (bit N = BCM pin N)   or   H * count target ids
+    tag      8 bytes  HMAC-SHA256(key, header + payload), truncated
+
+Target ids index the table served by GET /api/teleop/targets, which
+changes with the configuration; packets carrying an old table version are
+dropped. The same response carries the server epoch, a random number
+drawn each time the listener starts, so packets captured before a
+restart are refused after it; a client fetches it again after a restart.
+The server drops packets with a bad tag or another epoch, a sequence
+number not newer than the last one from that session, or a one-way delay more than
+ROBOTCLI_TELEOP_MAX_AGE_MS (default 250) above the lowest seen from that
+session (queued on a congested link, so already stale). Accepted packets
+are acknowledged with an 8-byte ack (sequence number, on-mask) plus tag.
+
+Drive from a terminal (holds `forward` for 2 s at 100 Hz):
+
+    ROBOTCLI_TELEOP_KEY=secret python3 teleop.py 192.168.1.20 forward --seconds 2
+"""
+
+import argparse
+import hashlib
+import hmac
+import os
+import random
+import socket
+import struct
+import time
+from collections import namedtuple
+
+import requests
+
+VERSION = 2
+FLAG_IDS = 0x01
+TAG_SIZE = 8
+MAX_HOLD_MS = 0xFFFF
+DEFAULT_PORT = 8001
+
+_HEADER = struct.Struct('<BBHIIIIHH')
+_MASK = struct.Struct('<I')
+_ACK = struct.Struct('<BxxxII')
+
+# Decoded datagram; targets is a pin mask (int) or a tuple of target ids
+Packet = namedtuple('Packet', 'hold_ms epoch session seq sent_ms table targets')
+
+
+class BadPacket(ValueError):
+    """Raised for datagrams that are malformed or fail authentication."""
+
+
+def _tag(key, body):
+    return hmac.new(key, body, hashlib.sha256).digest()[:TAG_SIZE]
+
+
+def encode(key, epoch, session, seq, hold_ms, mask=None, ids=None, table=0, sent_ms=None):
+    """Build an authenticated datagram for a pin mask or a list of target ids."""
+    if sent_ms is None:
+        sent_ms = int(time.monotonic() * 1000)
+    hold_ms = max(0, min(MAX_HOLD_MS, int(hold_ms)))
+    if ids is not None:
+        body = _HEADER.pack(VERSION, FLAG_IDS, hold_ms, epoch, session, seq & 0xFFFFFFFF,
+                            sent_ms & 0xFFFFFFFF, table & 0xFFFF, len(ids))
+        body += struct.pack(f'<{len(ids)}H', *ids)
+    else:
+        body = _HEADER.pack(VERSION, 0, hold_ms, epoch, session, seq & 0xFFFFFFFF,
+                            sent_ms & 0xFFFFFFFF, 0, 0) + _MASK.pack((mask or 0) & 0xFFFFFFFF)
+    return body + _tag(key, body)
+
+
+def decode(key, data):
+    """Verify and parse a datagram; raises BadPacket."""
+    if len(data) < _HEADER.size + TAG_SIZE:
+        raise BadPacket('short datagram')
+    body, tag = data[:-TAG_SIZE], data[-TAG_SIZE:]
+    if not hmac.compare_digest(tag, _tag(key, body)):
+        raise BadPacket('bad tag')
+    version, flags, hold_ms, epoch, session, seq, sent_ms, table, count = _HEADER.unpack_from(body)
+    if version != VERSION:
+        raise BadPacket(f'unsupported version {version}')
+    payload = body[_HEADER.size:]
+    if flags & FLAG_IDS:
+        if len(payload) != 2 * count:
+            raise BadPacket('bad id list')
+        targets = struct.unpack(f'<{count}H', payload)
+    else:
+        if len(payload) != _MASK.size:
+            raise BadPacket('bad mask')
+        targets = _MASK.unpack(payload)[0]
+    return Packet(hold_ms, epoch, session, seq, sent_ms, table, targets)
+
+
+def encode_ack(key, seq, mask):
+    body = _ACK.pack(VERSION, seq & 0xFFFFFFFF, mask & 0xFFFFFFFF)
+    return body + _tag(key, body)
+
+
+def decode_ack(key, data):
+    """Return (seq, on_mask) from an ack; raises BadPacket."""
+    body, tag = data[:-TAG_SIZE], data[-TAG_SIZE:]
+    if len(body) != _ACK.size or not hmac.compare_digest(tag, _tag(key, body)):
+        raise BadPacket('bad ack')
+    _, seq, mask = _ACK.unpack(body)
+    return seq, mask
+
+
+def newer(seq, last):
+    """Serial-number comparison: True if seq comes after last (mod 2**32)."""
+    return 0 < (seq - last) & 0xFFFFFFFF < 0x80000000
+
+
+class TeleopClient:
+    """Sends teleop datagrams to one server. Not thread-safe."""
+
+    def __init__(self, host, key, port=DEFAULT_PORT, url=None, hold=0.2):
+        self.addr = (host, port)
+        self.key = key.encode() if isinstance(key, str) else key
+        self.url = (url or f'http://{host}:8000').rstrip('/')
+        self.hold_ms = int(hold * 1000)
+        self.session = random.getrandbits(32)
+        self.seq = 0
+        self.table = None
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+
+    def load_targets(self):
+        """Fetch the target id table and server epoch; call again after a server restart."""
+        r = requests.get(self.url + '/api/teleop/targets', timeout=2.0)
+        r.raise_for_status()
+        self.table = r.json()
+        return self.table
+
+    def send(self, mask=None, targets=None, hold=None):
+        """Hold a pin mask or named targets on for `hold` seconds (default: client hold)."""
+        hold_ms = self.hold_ms if hold is None else int(hold * 1000)
+        self.seq = (self.seq + 1) & 0xFFFFFFFF
+        if self.table is None:
+            self.load_targets()
+        epoch = self.table['epoch']
+        if targets is not None:
+            ids = [self.table['targets'][name] for name in targets]
+            data = encode(self.key, epoch, self.session, self.seq, hold_ms, ids=ids, table=self.table['version'])
+        else:
+            data = encode(self.key, epoch, self.session, self.seq, hold_ms, mask=mask or 0)
+        self.sock.sendto(data, self.addr)
+        return self.seq
+
+    def release(self):
+        """Turn off everything this session holds."""
+        return self.send(mask=0, hold=0)
+
+    def acks(self):
+        """Drain pending acks; returns [(seq, on_mask)]."""
+        out = []
+        while True:
+            try:
+                data = self.sock.recv(64)
+            except (BlockingIOError, InterruptedError):
+                return out
+            try:
+                out.append(decode_ack(self.key, data))
+            except BadPacket:
+                pass
+
+    def close(self):
+        self.sock.close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Hold RobotCLI targets over the UDP teleop channel')
+    ap.add_argument('host')
+    ap.add_argument('targets', nargs='+', help='aliases or groups to hold on')
+    ap.add_argument('--port', type=int, default=int(os.environ.get('ROBOTCLI_TELEOP_PORT', DEFAULT_PORT)))
+    ap.add_argument('--url', help='web server URL for the target table (default http://<host>:8000)')
+    ap.add_argument('--rate', type=float, default=100.0, help='packets per second')
+    ap.add_argument('--seconds', type=float, default=1.0)
+    args = ap.parse_args()
+    key = os.environ.get('ROBOTCLI_TELEOP_KEY')
+    if not key:
+        ap.error('set ROBOTCLI_TELEOP_KEY')
+
+    client = TeleopClient(args.host, key, args.port, args.url, hold=max(0.1, 3.0 / args.rate))
+    client.load_targets()
+    interval = 1.0 / args.rate
+    sent = acked = 0
+    end = time.monotonic() + args.seconds
+    next_send = time.monotonic()
+    while time.monotonic() < end:
+        client.send(targets=args.targets)
+        sent += 1
+        acked += len(client.acks())
+        next_send += interval
+        time.sleep(max(0.0, next_send - time.monotonic()))
+    client.release()
+    time.sleep(0.05)
+    acked += len(client.acks())
+    print(f'{sent} packets sent, {acked} acknowledged')
+    client.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,245 @@
+"""AI chat test, in-process on the fake GPIO against mock_provider.py.
+
+Checks that conversations are kept on the server, that only the new
+message is needed per request, and that the history sent to the
+provider stays within the token budget however long the chat runs.
+Streamed replies must run each command as soon as it is complete, well
+before the reply has finished. Commands are checked against the compiled
+AI schema first (with `run` programs compiled): an invalid batch on
+/api/ai/execute runs nothing, and a chat reply stops at its first
+invalid command. Also checks the provider client: retries ride out
+failures, a hedge beats a stalled request, and the circuit breaker fails
+fast while the provider is down and recovers after it comes back.
+
+    pip3 install -r requirements-web.txt
+    python3 tests/ai_test.py
+"""
+
+import json
+import threading
+import time
+
+from harness import setup
+
+gpio = setup('ai')
+
+import config  # noqa: E402
+import ai_sessions  # noqa: E402
+import web_server  # noqa: E402
+from ai_provider import ChatProvider, CircuitBreaker, CircuitOpen, ProviderError  # noqa: E402
+from mock_provider import MockProvider  # noqa: E402
+
+
+def check_store():
+    store = ai_sessions.ConversationStore(budget=100, max_conversations=2)
+    cid = store.record(None, 'x' * 400, 'y')       # one turn over budget alone
+    assert [m['content'] for m in store.history(cid)] == ['x' * 400, 'y'], 'the latest turn is kept'
+    store.record(cid, 'short', 'z' * 200)
+    assert [m['content'] for m in store.history(cid)] == ['short', 'z' * 200]
+    for i in range(20):
+        store.record(cid, f'message {i}', 'reply' * (i % 4))
+        roles = [m['role'] for m in store.history(cid)]
+        assert roles == ['user', 'assistant'] * (len(roles) // 2), 'whole turns are dropped'
+    conv = store.get(cid)
+    assert conv.tokens <= 100 and conv.messages[-1]['content'] == 'reply' * 3
+    assert conv.messages[-2]['content'] == 'message 19'
+    a, b = store.record(None, 'a', 'a'), store.record(None, 'b', 'b')
+    assert store.get(cid) is None and len(store) == 2, 'least recently used is evicted'
+    assert store.history('unknown') == [] and store.discard(a) and not store.discard(a)
+    print('conversation store: budget trimming and eviction ok')
+
+
+def check_chat(mock):
+    client = web_server.app.test_client()
+    with config.edit() as draft:
+        draft.ai_settings = {'api_key': 'test', 'model': 'test-model', 'base_url': mock.url, 'enabled': True}
+
+    r = client.post('/api/ai/chat', json={'message': 'hello'})
+    assert r.status_code == 200, r.get_data(as_text=True)
+    cid = r.get_json()['conversation']
+    assert [m['role'] for m in mock.last_body['messages']] == ['system', 'user']
+    assert mock.last_body['model'] == 'test-model'
+
+    for i in range(50):
+        r = client.post('/api/ai/chat', json={'message': f'turn {i} ' + 'words ' * 20, 'conversation': cid})
+        assert r.get_json()['conversation'] == cid
+    history = mock.last_body['messages'][1:-1]
+    tokens = sum(ai_sessions.estimate_tokens(m['content']) for m in history)
+    assert history and tokens <= web_server.AI_HISTORY_TOKENS, tokens
+    assert history[-1] == {'role': 'assistant', 'content': '{"response":"ok","commands":[{"action":"status"}]}'}
+    print(f'chat: {len(history)} history messages (~{tokens} tokens) sent after 51 turns')
+
+    # Legacy clients may still send their own history; it seeds a conversation
+    r = client.post('/api/ai/chat', json={'message': 'hi', 'history': [{'role': 'user', 'content': 'earlier'}]})
+    assert mock.last_body['messages'][1] == {'role': 'user', 'content': 'earlier'}
+    assert client.get(f'/api/ai/conversation/{cid}').get_json()['turns'] == 51
+    assert client.delete(f'/api/ai/conversation/{cid}').status_code == 200
+    assert client.get(f'/api/ai/conversation/{cid}').status_code == 404
+
+    # Saving settings without a key keeps the stored one
+    r = client.post('/api/ai/register', json={'model': 'other-model'})
+    assert r.status_code == 200 and config.AI_SETTINGS['api_key'] == 'test'
+    assert client.get('/api/ai/config').get_json()['provider']['base_url'] == mock.url
+
+
+def check_outage(mock):
+    # A provider outage is a 503 once the breaker opens, not a hang per request
+    client = web_server.app.test_client()
+    mock.fail_rate = 1.0
+    codes = [client.post('/api/ai/chat', json={'message': 'hi'}).status_code
+             for _ in range(web_server.AI_BREAKER_FAILURES + 1)]
+    assert codes == [502] * web_server.AI_BREAKER_FAILURES + [503], codes
+    mock.fail_rate = 0.0
+
+
+def check_stream(mock):
+    client = web_server.app.test_client()
+    reply = {'response': 'Going', 'commands': [
+        {'action': 'activate_alias', 'target': 'motor_1', 'duration': 0.1},
+        {'action': 'status'}, {'target': 'motor_1'}, {'action': 'stop', 'target': 'motor_1'}]}
+    mock.chunk_size, mock.chunk_delay = 8, 0.02
+    start = time.monotonic()
+    r = client.post('/api/ai/chat', json={'message': 'go ' + json.dumps(reply), 'stream': True}, buffered=False)
+    assert r.status_code == 200 and r.mimetype == 'application/x-ndjson', r.status_code
+    events = []
+    for line in r.response:
+        for part in line.splitlines():
+            events.append((time.monotonic() - start, json.loads(part)))
+    kinds = [e['event'] for _, e in events]
+    assert kinds == ['reply', 'executed', 'executed', 'executed', 'executed', 'done'], kinds
+    first_run, total = events[1][0], events[-1][0]
+    assert events[1][1]['result']['action'] == 'activate_alias'
+    assert events[3][1]['result']['error'] == 'Invalid command', events[3]
+    assert events[4][1]['result']['error'].startswith('Not run'), 'the rest of the batch is skipped'
+    # The rest of the reply is still streaming (a delta every 20 ms) when the first command runs
+    assert total - first_run > 0.15, (first_run, total)
+    assert events[-1][1]['reply'] == 'Going' and len(events[-1][1]['executed']) == 4
+    print(f'stream: first command ran at {first_run * 1000:.0f} ms of a {total * 1000:.0f} ms reply')
+
+    # Without `stream` the same reply arrives as one body
+    r = client.post('/api/ai/chat', json={'message': 'go ' + json.dumps(reply)})
+    assert r.status_code == 200 and len(r.get_json()['executed']) == 4
+    mock.chunk_delay = 0.0
+
+
+def check_validation():
+    validate = web_server.ai_command_validator()
+    assert validate({'action': 'activate_alias', 'target': 'motor_1', 'duration': 2}) is None
+    assert validate({'action': 'run', 'program': 'motor_1(1)'}) is None
+    for cmd, expected in [
+            ({'action': 'fly'}, "action: 'fly' is not one of"),
+            ({'action': 'activate_alias', 'target': 'warp_drive'}, "target: 'warp_drive' is not one of"),
+            ({'action': 'activate_alias', 'target': 'motor_1', 'duration': 0}, 'duration: must be at least 0.1'),
+            ({'action': 'activate_alias', 'target': 'motor_1', 'duration': True}, 'duration: expected number'),
+            ({'action': 'run'}, "'program' is required"),
+            ({'target': 'motor_1'}, "'action' is required"),
+            ('status', 'expected object')]:
+        error = validate(cmd)
+        assert error and expected in error, (cmd, error)
+
+    # Recompiled only when alias or group names change
+    with config.edit(save=False) as draft:
+        draft.ai_settings = dict(draft.ai_settings, model='another-model')
+    assert web_server.ai_command_validator() is validate
+    with config.edit(save=False) as draft:
+        draft.aliases['warp_drive'] = {'config_spot': 'config_spot1', 'auto_off': True}
+    assert web_server.ai_command_validator() is not validate
+    assert web_server.ai_command_validator()({'action': 'activate_alias', 'target': 'warp_drive'}) is None
+
+    start = time.perf_counter()
+    for _ in range(10000):
+        validate({'action': 'activate_alias', 'target': 'motor_1', 'duration': 2})
+    per_call = (time.perf_counter() - start) / 10000 * 1e6
+
+    # /api/ai/execute checks the whole batch first: one bad command and nothing runs
+    client = web_server.app.test_client()
+    batch = [{'action': 'activate_alias', 'target': 'motor_2', 'duration': '2s'},
+             {'action': 'activate_alias', 'target': 'no_such_alias'}]
+    writes = gpio.writes
+    r = client.post('/api/ai/execute', json={'api_key': 'test', 'commands': batch})
+    assert r.status_code == 400, r.get_data(as_text=True)
+    assert [e['index'] for e in r.get_json()['invalid']] == [1]
+    assert gpio.writes == writes, 'no pin may be touched'
+    r = client.post('/api/ai/execute', json={'api_key': 'test', 'commands': batch[:1] + [{'action': 'stop', 'target': 'motor_2'}]})
+    assert r.status_code == 200 and all(res.get('success') for res in r.get_json()['results']), r.get_json()
+
+    # `run` programs are compiled and their targets resolved during validation too
+    for program in ('forward((', 'motor_2(1); no_such_alias(1)'):
+        batch = [{'action': 'activate_alias', 'target': 'motor_1', 'duration': 5}, {'action': 'run', 'program': program}]
+        writes = gpio.writes
+        r = client.post('/api/ai/execute', json={'api_key': 'test', 'commands': batch})
+        assert r.status_code == 400, r.get_data(as_text=True)
+        assert [e['index'] for e in r.get_json()['invalid']] == [1] and r.get_json()['invalid'][0]['error'].startswith('program')
+        assert gpio.writes == writes, 'motor_1 must not run before the bad program is found'
+    r = client.post('/api/ai/execute', json={'api_key': 'test', 'commands': [{'action': 'run', 'program': 'motor_2(1); stop(motor_2)'}]})
+    assert r.status_code == 200 and r.get_json()['results'][0]['success'], r.get_json()
+    print(f'validation: compiled validator {per_call:.1f} us per command; invalid batches run nothing')
+
+
+MESSAGES = [{'role': 'user', 'content': 'go'}]
+
+
+def check_provider(mock):
+    # Retries: one in three requests fails, every call still succeeds
+    mock.fail_rate, mock.requests, mock.failed = 0.3, 0, 0
+    provider = ChatProvider(mock.url, 'key', retries=5, backoff=0.01)
+    for _ in range(30):
+        provider.complete(MESSAGES)
+    assert mock.failed and provider.stats['retries'] == mock.failed, (provider.stats, mock.failed)
+    print(f'retries: 30 calls ok with {mock.failed} failed attempts retried')
+
+    # Hedging: the first request stalls, the hedge sent after 0.1 s answers
+    mock.fail_rate, mock.hang_rate, mock.hang_seconds, mock.hung = 0.0, 1.0, 2.0, 0
+
+    def recover():
+        time.sleep(0.05)
+        mock.hang_rate = 0.0
+
+    provider = ChatProvider(mock.url, 'key', timeout=5, hedge_after=0.1)
+    threading.Thread(target=recover).start()
+    start = time.monotonic()
+    provider.complete(MESSAGES)
+    elapsed = time.monotonic() - start
+    assert mock.hung == 1 and provider.stats['hedge_wins'] == 1 and elapsed < 1.0, elapsed
+    print(f'hedging: stalled request answered by the hedge in {elapsed * 1000:.0f} ms')
+
+    # Breaker: opens after consecutive failures, fails fast, then recovers
+    mock.fail_rate = 1.0
+    provider = ChatProvider(mock.url, 'key', retries=0, breaker=CircuitBreaker(failures=3, reset_after=0.2))
+    for _ in range(3):
+        try:
+            provider.complete(MESSAGES)
+        except CircuitOpen:
+            raise AssertionError('breaker opened too early')
+        except ProviderError as e:
+            assert e.status == 503
+    before = mock.requests
+    try:
+        provider.complete(MESSAGES)
+        raise AssertionError('breaker did not open')
+    except CircuitOpen:
+        pass
+    assert mock.requests == before, 'an open breaker must not reach the provider'
+    mock.fail_rate = 0.0
+    time.sleep(0.25)
+    provider.complete(MESSAGES)
+    assert provider.breaker.state == 'closed'
+    print('breaker: opened after 3 failures, short-circuited, closed after reset')
+
+
+def main():
+    check_store()
+    mock = MockProvider(seed=1).start()
+    try:
+        check_chat(mock)
+        check_stream(mock)
+        check_validation()
+        check_outage(mock)
+        check_provider(mock)
+    finally:
+        mock.stop()
+    print('\nAI test completed successfully')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,326 @@
+"""In-process benchmark suite for RobotCLI.
+
+Runs `web_server` and `parser` inside this process against the in-memory
+GPIO backend, so no Raspberry Pi or running server is needed.
+
+Run with:
+
+    pip3 install -r requirements-web.txt
+    python3 tests/benchmark.py --output bench.json
+
+Compare against an earlier run (e.g. from a previous version):
+
+    python3 tests/benchmark.py --output new.json --compare old.json
+
+Alias counts scale from the stock 27 up to 10k (override with --scales).
+Before `config` is first imported, ROBOTCLI_CONFIG_FILE is pointed at a
+temporary directory so the benchmark does not clobber the repository
+`config.json`.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SCALES = [27, 100, 1000, 10000]
+
+
+# ---- Fake GPIO ----
+def install_fake_gpio():
+    """Make the in-memory GPIO backend the one every module shares, and return it.
+
+    Call before importing pinrun, parser or web_server.
+    """
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    import gpio_backend
+    return gpio_backend.use('fake')
+
+
+# ---- Helpers ----
+def summarize(samples):
+    """Return latency statistics (in milliseconds) for a list of seconds."""
+    ordered = sorted(samples)
+    n = len(ordered)
+
+    def pct(p):
+        return ordered[min(n - 1, int(p * n))] * 1000.0
+
+    return {
+        'n': n,
+        'mean_ms': statistics.fmean(ordered) * 1000.0,
+        'p50_ms': pct(0.50),
+        'p95_ms': pct(0.95),
+        'p99_ms': pct(0.99),
+        'max_ms': ordered[-1] * 1000.0,
+    }
+
+
+def timed(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return summarize(samples)
+
+
+def git_revision():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                             capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def build_config(config, n_aliases):
+    """Publish a synthetic N-alias setup in place of the live config."""
+    pins = list(range(2, 28))
+    gpio_pins, aliases, groups = {}, {}, {}
+    for i in range(n_aliases):
+        spot = f'config_spot{i + 1}'
+        gpio_pins[spot] = pins[i % len(pins)]
+        aliases[f'alias_{i}'] = {'config_spot': spot, 'auto_off': True}
+    names = list(aliases.keys())
+    groups['bench_a'] = {'aliases': names[0:4], 'action': 'on'}
+    groups['bench_b'] = {'aliases': names[4:8], 'action': 'on'}
+    groups['bench_all'] = {'aliases': names[:26], 'action': 'on'}
+    for i in range(max(0, n_aliases // 10)):
+        groups[f'group_{i}'] = {'aliases': names[i:i + 4], 'action': 'on'}
+    with config.edit(save=False) as draft:
+        draft.gpio_pins, draft.aliases, draft.groups = gpio_pins, aliases, groups
+    return names
+
+
+# ---- Benchmarks ----
+def concurrent_load(app, names, writers, seconds):
+    """Hammer activations/stops from several threads while timing /api/status.
+
+    Returns writer throughput and status latency under load, which exposes
+    lock contention between mutations and status reads.
+    """
+    stop = threading.Event()
+    counts = [0] * writers
+
+    def writer(idx):
+        client = app.test_client()
+        i = idx
+        while not stop.is_set():
+            alias = names[i % len(names)]
+            client.post('/api/activate', json={'alias': alias, 'duration': 0.002})
+            if i % 4 == 0:
+                client.post('/api/activate-group', json={'group': 'bench_a', 'duration': 0.002})
+            i += writers
+            counts[idx] += 1
+
+    threads = [threading.Thread(target=writer, args=(i,), daemon=True) for i in range(writers)]
+    for t in threads:
+        t.start()
+    reader = app.test_client()
+    samples = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        t0 = time.perf_counter()
+        reader.get('/api/status')
+        samples.append(time.perf_counter() - t0)
+    stop.set()
+    for t in threads:
+        t.join()
+    result = summarize(samples)
+    result['writer_ops_per_s'] = sum(counts) / seconds
+    return result
+
+
+def estop_latency(web_server, names, writers, trials):
+    """Fire the emergency stop repeatedly while writer threads keep activating pins."""
+    stop = threading.Event()
+
+    def writer(idx):
+        client = web_server.app.test_client()
+        i = idx
+        while not stop.is_set():
+            client.post('/api/activate-group', json={'group': 'bench_all', 'duration': 0.01})
+            client.post('/api/activate', json={'alias': names[i % len(names)], 'duration': 0.01})
+            i += writers
+
+    threads = [threading.Thread(target=writer, args=(i,), daemon=True) for i in range(writers)]
+    for t in threads:
+        t.start()
+    low, sweep = [], []
+    for _ in range(trials):
+        time.sleep(0.01)
+        stats = web_server.emergency_stop('benchmark')
+        low.append(stats['last_ms'] / 1000.0)
+        sweep.append(stats['last_sweep_ms'] / 1000.0)
+        web_server.reset_emergency_stop()
+    stop.set()
+    for t in threads:
+        t.join()
+    result = summarize(low)
+    result['sweep_p99_ms'] = summarize(sweep)['p99_ms']
+    result['sweep_max_ms'] = summarize(sweep)['max_ms']
+    return result
+
+
+def run_scale(n_aliases, iterations, modules, writers=4, load_seconds=2.0):
+    config, web_server, parser = modules
+    names = build_config(config, n_aliases)
+    client = web_server.app.test_client()
+    results = {}
+
+    def reset():
+        client.post('/api/stop', json={})
+
+    # Activation throughput: short auto-off activations through the REST API.
+    reset()
+    targets = [names[i % len(names)] for i in range(iterations)]
+    t0 = time.perf_counter()
+    for alias in targets:
+        client.post('/api/activate', json={'alias': alias, 'duration': 0.001})
+    elapsed = time.perf_counter() - t0
+    results['activate_throughput'] = {
+        'n': iterations,
+        'ops_per_s': iterations / elapsed if elapsed else None,
+    }
+    time.sleep(0.05)
+
+    # Group switch latency: alternate between two disjoint groups.
+    reset()
+    flip = {'i': 0}
+
+    def switch_group():
+        flip['i'] ^= 1
+        group = 'bench_a' if flip['i'] else 'bench_b'
+        client.post('/api/activate-group', json={'group': group, 'duration': 0.001})
+
+    results['group_switch'] = timed(switch_group, iterations)
+    time.sleep(0.05)
+
+    # Status latency with every valid pin held active.
+    reset()
+    client.post('/api/activate-group', json={'group': 'bench_all', 'duration': 60})
+    results['status'] = timed(lambda: client.get('/api/status'), iterations)
+    results['status_binary'] = timed(lambda: client.get('/api/status?format=bin'), iterations)
+    seq = web_server.current_state[0]
+    results['status_binary_delta'] = timed(lambda: client.get(f'/api/status?format=bin&since={seq}'), iterations)
+    reset()
+
+    results['config'] = timed(lambda: client.get('/api/config'), max(10, iterations // 10))
+    results['generate_ai_schema'] = timed(web_server.generate_ai_schema, max(10, iterations // 10))
+    results['save_config'] = timed(config.save_config, max(5, iterations // 50))
+    results['parse_command'] = timed(lambda: parser.parse_command('alias_1(2.5)'), iterations)
+    # Command path incl. its logging (stop keeps the pin state unchanged)
+    results['execute_command'] = timed(
+        lambda: web_server._execute_single_command({'action': 'stop', 'target': names[0]}), iterations)
+
+    if writers:
+        reset()
+        results['status_under_load'] = concurrent_load(web_server.app, names, writers, load_seconds)
+        time.sleep(0.05)
+        reset()
+        results['estop_under_load'] = estop_latency(web_server, names, writers, max(20, iterations // 10))
+        time.sleep(0.05)
+        reset()
+    return results
+
+
+def compare(current, baseline):
+    """Print per-metric ratios of current vs. baseline (>1.0 means slower)."""
+    print('\nComparison vs baseline ({}):'.format(baseline.get('meta', {}).get('git_revision')))
+    for scale, metrics in current['results'].items():
+        base_metrics = baseline.get('results', {}).get(scale)
+        if not base_metrics:
+            continue
+        for name, stats in metrics.items():
+            base = base_metrics.get(name)
+            if not base:
+                continue
+            if 'ops_per_s' in stats and base.get('ops_per_s'):
+                ratio = base['ops_per_s'] / stats['ops_per_s']
+            elif 'p50_ms' in stats and base.get('p50_ms'):
+                ratio = stats['p50_ms'] / base['p50_ms']
+            else:
+                continue
+            flag = '  <-- regression' if ratio > 1.2 else ''
+            print(f'  {scale:>6} aliases  {name:<20} x{ratio:.2f}{flag}')
+
+
+def main():
+    ap = argparse.ArgumentParser(description='RobotCLI in-process benchmark')
+    ap.add_argument('--scales', type=int, nargs='+', default=DEFAULT_SCALES,
+                    help='alias counts to benchmark')
+    ap.add_argument('--iterations', type=int, default=500,
+                    help='iterations per latency measurement')
+    ap.add_argument('--output', default='benchmark_results.json',
+                    help='where to write the JSON results')
+    ap.add_argument('--compare', help='earlier results JSON to compare against')
+    ap.add_argument('--writers', type=int, default=4,
+                    help='writer threads for the concurrent load scenario (0 to skip)')
+    ap.add_argument('--load-seconds', type=float, default=2.0,
+                    help='duration of the concurrent load scenario')
+    ap.add_argument('--gpio-write-us', type=float, default=0.0,
+                    help='simulated latency of each GPIO.output call, in microseconds')
+    ap.add_argument('--log-file', default=os.devnull,
+                    help='where the server logs go during the run (ROBOTCLI_LOG_FILE)')
+    args = ap.parse_args()
+    os.environ.setdefault('ROBOTCLI_LOG_FILE', args.log_file)
+    # Keep benchmark writes away from the repository's config.json; config
+    # reads (and rewrites) its file on first import
+    os.environ['ROBOTCLI_CONFIG_FILE'] = os.path.join(tempfile.mkdtemp(prefix='robotcli-bench-'), 'config.json')
+
+    gpio = install_fake_gpio()
+    gpio.write_delay = args.gpio_write_us / 1e6
+    sys.path.insert(0, ROOT)
+    import config
+    import web_server
+    import parser as robot_parser
+    import logging
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    report = {
+        'meta': {
+            'timestamp': time.time(),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'iterations': args.iterations,
+            'writers': args.writers,
+            'gpio_write_us': args.gpio_write_us,
+        },
+        'results': {},
+    }
+    for n in args.scales:
+        print(f'Benchmarking {n} aliases...')
+        report['results'][str(n)] = run_scale(n, args.iterations, (config, web_server, robot_parser),
+                                              writers=args.writers, load_seconds=args.load_seconds)
+        for name, stats in report['results'][str(n)].items():
+            if 'sweep_max_ms' in stats:
+                print(f'  {name:<20} max {stats["max_ms"]:8.3f} ms   sweep max {stats["sweep_max_ms"]:8.3f} ms')
+            elif 'writer_ops_per_s' in stats:
+                print(f'  {name:<20} p50 {stats["p50_ms"]:8.3f} ms   p99 {stats["p99_ms"]:8.3f} ms'
+                      f'   writers {stats["writer_ops_per_s"]:8.0f} ops/s')
+            elif 'ops_per_s' in stats:
+                print(f'  {name:<20} {stats["ops_per_s"]:10.0f} ops/s')
+            else:
+                print(f'  {name:<20} p50 {stats["p50_ms"]:8.3f} ms   p99 {stats["p99_ms"]:8.3f} ms')
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'\nResults written to {args.output}')
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
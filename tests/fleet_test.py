@@ -0,0 +1,152 @@
+"""Fleet fan-out test against several local RobotCLI servers.
+
+Starts a few `web_server` instances on local ports (each set up by
+harness.setup with the fake GPIO, so no Pi is needed) plus one node
+that accepts connections but never answers and one that trickles out its
+reply a byte at a time, then drives them all with fleet.Fleet.
+
+Run with:
+
+    pip3 install -r requirements-web.txt
+    python3 tests/fleet_test.py
+
+Set ROBOTCLI_FLEET="r1=http://host:8000,r2=..." to test real nodes
+instead of local servers (the unresponsive nodes are still added).
+"""
+
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fleet import Fleet, parse_nodes
+
+NODES = 3
+BASE_PORT = 8760
+
+# Child process: fake GPIO, private config file, web_server on ROBOTCLI_PORT
+SERVER = '''
+import os, sys
+sys.path.insert(0, {tests!r})
+from harness import setup
+setup('fleet')
+import web_server
+web_server.app.run(host='127.0.0.1', port=int(os.environ['ROBOTCLI_PORT']))
+'''
+
+
+def start_local_nodes(count):
+    procs = []
+    nodes = {}
+    for i in range(count):
+        port = BASE_PORT + i
+        code = SERVER.format(tests=os.path.join(ROOT, 'tests'))
+        env = dict(os.environ, ROBOTCLI_PORT=str(port))
+        procs.append(subprocess.Popen([sys.executable, '-c', code], env=env,
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+        nodes[f'local{i + 1}'] = f'http://127.0.0.1:{port}'
+    return procs, nodes
+
+
+def wait_until_up(nodes, seconds=15.0):
+    deadline = time.time() + seconds
+    with Fleet(nodes, timeout=0.5) as fleet:
+        while time.time() < deadline:
+            if fleet.status().ok:
+                return
+            time.sleep(0.2)
+    raise RuntimeError('local servers did not start')
+
+
+def trickle(sock):
+    """Answer every connection with a reply that never finishes, one byte per 0.1 s."""
+    while True:
+        try:
+            conn, _ = sock.accept()
+        except OSError:
+            return
+
+        def drip(conn=conn):
+            try:
+                conn.recv(4096)
+                conn.sendall(b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: 100000\r\n\r\n')
+                while True:
+                    conn.sendall(b' ')
+                    time.sleep(0.1)
+            except OSError:
+                conn.close()
+        threading.Thread(target=drip, daemon=True).start()
+
+
+def main():
+    procs = []
+    # A node that accepts TCP connections but never responds
+    silent = socket.socket()
+    silent.bind(('127.0.0.1', 0))
+    silent.listen(16)
+    # A node that answers but never finishes its reply; each read succeeds
+    slow = socket.socket()
+    slow.bind(('127.0.0.1', 0))
+    slow.listen(16)
+    threading.Thread(target=trickle, args=(slow,), daemon=True).start()
+    try:
+        if os.environ.get('ROBOTCLI_FLEET'):
+            nodes = parse_nodes(os.environ['ROBOTCLI_FLEET'])
+        else:
+            procs, nodes = start_local_nodes(NODES)
+            wait_until_up(nodes)
+        healthy = list(nodes)
+        nodes['silent'] = {'url': 'http://127.0.0.1:%d' % silent.getsockname()[1], 'timeout': 0.5}
+        nodes['trickle'] = {'url': 'http://127.0.0.1:%d' % slow.getsockname()[1], 'timeout': 0.5}
+
+        with Fleet(nodes, timeout=2.0) as fleet:
+            status = fleet.status(healthy)
+            print('status:', status.summary())
+            assert status.ok
+
+            r = fleet.activate_group('forward', 0.5, healthy)
+            print('activate-group:', r.summary())
+            assert r.ok
+            assert all('2' in n.data for n in fleet.status(healthy).results.values())
+
+            r = fleet.run('led_1(250ms); led_2(250ms)', healthy)
+            print('run:', r.summary())
+            assert r.ok
+
+            # Unresponsive nodes cost their own timeout, not one per node, and
+            # a reply trickling in a byte at a time is cut off at the deadline
+            t0 = time.time()
+            r = fleet.stop()
+            elapsed = time.time() - t0
+            print('stop (with silent and trickling nodes):', r.summary(), f'{elapsed:.2f}s')
+            assert set(r.failed) == {'silent', 'trickle'}
+            assert all('timeout' in error for error in r.failed.values())
+            assert elapsed < 1.5
+
+            r = fleet.activate('no_such_alias', 1, healthy)
+            print('unknown alias:', r.failed)
+            assert set(r.failed) == set(healthy)
+
+            # Keep-alive: a burst of status fan-outs reuses pooled connections
+            t0 = time.time()
+            for _ in range(50):
+                assert fleet.status(healthy).ok
+            print(f'50 status fan-outs to {len(healthy)} nodes: {(time.time() - t0) * 1000:.0f} ms')
+
+        print('\nFleet test completed successfully')
+    finally:
+        silent.close()
+        slow.close()
+        for p in procs:
+            p.terminate()
+        for p in procs:
+            p.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""GPIO backend test: lazy pin setup and one shared backend, on the fake backend.
+
+Checks that only mapped pins are set up at startup, that other pins are
+set up on their first HIGH write and skipped by LOW writes until then,
+that the e-stop and the CLI's all off still drive every output LOW, that
+pinrun (the CLI) and web_server drive the same backend, and that the
+backend choice is saved in config.json.
+
+    pip3 install -r requirements-web.txt
+    python3 tests/gpio_test.py
+"""
+
+import json
+
+from harness import setup
+
+gpio = setup('gpio')
+
+import config  # noqa: E402
+
+# Unmap pin 27, so it is not set up at startup
+with config.edit() as draft:
+    for spot, pin in draft.gpio_pins.items():
+        if pin == 27:
+            draft.gpio_pins[spot] = None
+
+import gpio_backend  # noqa: E402
+import pinrun  # noqa: E402
+import web_server  # noqa: E402
+
+
+def check_backend():
+    backend = gpio_backend.create('fake')
+    backend.output([4, 5], backend.LOW)
+    assert backend.writes == 0 and not backend.outputs, 'LOW to pins never set up is skipped'
+    backend.output([4, 5], backend.HIGH)
+    assert backend.outputs == {4, 5} and backend.levels == {4: 1, 5: 1} and backend.writes == 1
+    backend.output([4, 6], backend.LOW)
+    assert backend.levels == {4: 0, 5: 1} and 6 not in backend.outputs
+    backend.setup(5, backend.IN, pull_up_down=backend.PUD_UP)
+    backend.output([4, 5], backend.LOW)
+    assert backend.levels[5] == backend.HIGH, 'inputs are not written'
+    backend.sweep_low([4, 5, 6])
+    assert backend.outputs == {4, 6} and backend.levels == {4: 0, 5: 1, 6: 0}, 'sweeps claim outputs, skip inputs'
+    assert gpio_backend.use('fake') is gpio, 'naming the backend in use returns it'
+    try:
+        gpio_backend.create('nope')
+        raise AssertionError('unknown backends must be refused')
+    except ValueError:
+        pass
+    print('fake backend: outputs set up on first HIGH write; LOW writes skip pins never set up')
+
+
+def check_shared():
+    assert pinrun.GPIO is web_server.GPIO is gpio
+    client = web_server.app.test_client()
+    assert client.post('/api/activate', json={'alias': 'motor_1', 'duration': 5}).status_code == 200
+    pin = web_server.group_index().alias_pins['motor_1'][0]
+    assert gpio.levels[pin] == gpio.HIGH
+    pinrun.all_off()
+    assert gpio.levels[pin] == gpio.LOW, 'the CLI drives the same pins'
+    info = client.get('/api/gpio').get_json()
+    assert info['backend'] == 'fake' and pin in info['outputs'] and info['writes'] >= 2
+    print('pinrun and web_server share one backend; /api/gpio reports it')
+
+
+def check_sweeps():
+    mapped = {pin for pin in config.GPIO_PINS.values() if pin is not None}
+    assert gpio.outputs == mapped, 'only mapped pins are set up at startup'
+    # Pins set HIGH behind the backend's back (another code path) are
+    # still driven LOW by the e-stop and the CLI's all off
+    unmapped = sorted(web_server.output_pins - gpio.outputs)
+    assert unmapped, 'some pins start unclaimed'
+    for sweep in (lambda: web_server.emergency_stop('test'), pinrun.all_off):
+        for pin in unmapped:
+            gpio.levels[pin] = gpio.HIGH
+        sweep()
+        assert all(gpio.levels[pin] == gpio.LOW for pin in unmapped)
+    assert web_server.output_pins <= gpio.outputs
+    web_server.reset_emergency_stop()
+    print('e-stop and all off drive pins never set up LOW')
+
+
+def check_settings():
+    client = web_server.app.test_client()
+    assert client.get('/api/gpio').get_json()['settings'] == {'backend': 'rpi', 'chip': '/dev/gpiochip0'}
+    r = client.post('/api/gpio', json={'backend': 'gpiochip', 'chip': '/dev/gpiochip4'})
+    assert r.status_code == 200, r.get_data(as_text=True)
+    with open(config.CONFIG_FILE) as f:
+        assert json.load(f)['GPIO_SETTINGS'] == {'backend': 'gpiochip', 'chip': '/dev/gpiochip4'}
+    assert config.load_config() and gpio_backend.configured() == ('gpiochip', {'path': '/dev/gpiochip4'})
+    assert client.post('/api/gpio', json={'backend': 'nope'}).status_code == 400
+    assert client.post('/api/gpio', json={'backend': 'rpi'}).status_code == 200
+    assert gpio_backend.configured() == ('rpi', {})
+    print('backend choice saved in config.json')
+
+
+def main():
+    check_backend()
+    check_sweeps()
+    check_shared()
+    check_settings()
+    print('\nGPIO test completed successfully')
+
+
+if __name__ == '__main__':
+    main()
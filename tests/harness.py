@@ -0,0 +1,42 @@
+"""Setup shared by the in-process tests.
+
+config.py loads (and rewrites) its file the first time it is imported,
+so a test must choose its config file before anything imports config:
+
+    from harness import setup
+
+    gpio = setup('input')          # before importing config, pinrun or web_server
+
+    import config  # noqa: E402
+    import web_server  # noqa: E402
+
+Scripts in tests/ have this directory on sys.path already.
+"""
+
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup(name, fake_gpio=True):
+    """Give the test a private config directory and quiet logs.
+
+    Points ROBOTCLI_CONFIG_FILE at a new temporary directory (so
+    config.json and the files kept next to it stay out of the
+    repository) unless it is already set, sends the server log to
+    os.devnull and puts the repository on sys.path. With fake_gpio, also
+    installs the fake GPIO from benchmark.py and returns it.
+    """
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    if 'config' in sys.modules:
+        raise RuntimeError('harness.setup() must run before config is imported')
+    os.environ.setdefault('ROBOTCLI_CONFIG_FILE',
+                          os.path.join(tempfile.mkdtemp(prefix=f'robotcli-{name}-'), 'config.json'))
+    os.environ.setdefault('ROBOTCLI_LOG_FILE', os.devnull)
+    if not fake_gpio:
+        return None
+    from benchmark import install_fake_gpio
+    return install_fake_gpio()
@@ -0,0 +1,133 @@
+"""GPIO input and edge rule test, in-process on the fake GPIO.
+
+Turns a config spot into an input through /api/config/inputs, adds
+rules for it, and drives the pin from "outside" (gpio.drive), which runs
+the edge callback like RPi.GPIO's event thread would: the rule's program
+must have switched the pins by the time the callback returns. Also
+checks debouncing (a short press and release, then a second press),
+that input pins are never driven, and the time from edge to pins
+written.
+
+    pip3 install -r requirements-web.txt
+    python3 tests/input_test.py
+"""
+
+import statistics
+import time
+
+from harness import setup
+
+gpio = setup('input')
+
+import config  # noqa: E402
+import web_server  # noqa: E402
+
+
+def post(client, url, body, status=200):
+    r = client.post(url, json=body)
+    assert r.status_code == status, (url, body, r.status_code, r.get_data(as_text=True))
+    return r.get_json()
+
+
+def main():
+    client = web_server.app.test_client()
+    index = web_server.group_index()
+    motors = [index.alias_pins[a][0] for a in ('motor_1', 'motor_2')]
+    pin = config.GPIO_PINS['config_spot26']
+    assert index.alias_pins['spare_8'][0] == pin
+
+    # The config spot becomes an input: set up with its pull, not driven
+    post(client, '/api/config/inputs', {'name': 'bumper', 'config_spot': 'config_spot26', 'pull': 'up', 'bounce_ms': 5})
+    assert pin in gpio.callbacks and gpio.levels[pin] == gpio.HIGH
+    assert pin not in web_server.ALL_OUTPUTS and web_server.group_index().alias_pins['spare_8'][0] is None
+    post(client, '/api/activate', {'alias': 'spare_8', 'duration': 1}, 400)
+    writes = gpio.writes
+    web_server.emergency_stop('test')
+    web_server.reset_emergency_stop()
+    assert gpio.levels[pin] == gpio.HIGH and gpio.writes > writes, 'e-stop must not drive inputs'
+    print('input pin set up with its pull and never driven')
+
+    # A falling edge (switch closes to ground) stops the motors inside the callback
+    post(client, '/api/config/rules', {'name': 'bump_stop', 'input': 'bumper', 'edge': 'falling', 'run': 'stop'})
+    post(client, '/api/config/rules', {'name': 'bump_light', 'input': 'bumper', 'edge': 'rising', 'run': 'led_1(0.2)'})
+    post(client, '/api/run', {'program': 'forward(5)'})
+    assert all(gpio.levels[p] for p in motors)
+    gpio.drive(pin, gpio.LOW)
+    assert not any(gpio.levels[p] for p in motors), 'rule did not run in the callback'
+    assert web_server.history.query(pins=set(motors))[-1]['source'] == 'input'
+    status = client.get('/api/inputs').get_json()
+    assert status['inputs']['bumper']['level'] == 0 and status['inputs']['bumper']['edges'] == 1
+    assert status['rules']['bump_stop']['fired'] == 1 and status['rules']['bump_light']['fired'] == 0
+
+    # Chatter inside bounce_ms is dropped; the rising edge after it fires
+    gpio.drive(pin, gpio.HIGH)
+    gpio.drive(pin, gpio.LOW)
+    gpio.drive(pin, gpio.HIGH)
+    status = client.get('/api/inputs').get_json()
+    assert status['inputs']['bumper']['bounced'] >= 1, status
+    assert status['rules']['bump_stop']['fired'] == 1, 'bounce fired a rule'
+    time.sleep(0.01)
+    gpio.drive(pin, gpio.LOW)
+    time.sleep(0.01)
+    gpio.drive(pin, gpio.HIGH)
+    led = web_server.group_index().alias_pins['led_1'][0]
+    assert gpio.levels[led] == gpio.HIGH and client.get('/api/inputs').get_json()['rules']['bump_light']['fired'] >= 1
+
+    # A release inside the bounce window is still recorded, so the next
+    # real press is an edge and not mistaken for bounce
+    time.sleep(0.01)
+    fired = client.get('/api/inputs').get_json()['rules']['bump_stop']['fired']
+    gpio.drive(pin, gpio.LOW)
+    gpio.drive(pin, gpio.HIGH)
+    assert client.get('/api/inputs').get_json()['inputs']['bumper']['level'] == 1
+    time.sleep(0.01)
+    post(client, '/api/run', {'program': 'forward(5)'})
+    gpio.drive(pin, gpio.LOW)
+    assert client.get('/api/inputs').get_json()['rules']['bump_stop']['fired'] == fired + 2
+    assert not any(gpio.levels[p] for p in motors), 'second bump missed'
+    time.sleep(0.01)
+    gpio.drive(pin, gpio.HIGH)
+    print('edge rules run in the callback; bounce filtered')
+
+    # Edge-to-output reaction time, measured inside the callback
+    samples = []
+    for i in range(500):
+        post(client, '/api/run', {'program': 'forward(5)'})
+        time.sleep(0.006)
+        gpio.drive(pin, gpio.LOW)
+        samples.append(web_server.input_watcher._stats['bump_stop']['last_ms'])
+        time.sleep(0.006)
+        gpio.drive(pin, gpio.HIGH)
+    assert not any(gpio.levels[p] for p in motors)
+    samples.sort()
+    print(f'reaction: median {statistics.median(samples) * 1000:.0f} us, '
+          f'p99 {samples[int(len(samples) * 0.99)] * 1000:.0f} us over {len(samples)} edges')
+
+    # Invalid rules and inputs are refused
+    for bad in ({'name': 'r', 'input': 'bumper', 'edge': 'sideways', 'run': 'stop'},
+                {'name': 'r', 'input': 'bumper', 'run': 'forward('},
+                {'name': 'r', 'input': 'bumper', 'run': 'warp(1)'},
+                {'name': 'r', 'input': 'nothing', 'run': 'stop'},
+                {'name': 'r', 'input': 'bumper'}):
+        post(client, '/api/config/rules', bad, 400)
+    for bad in ({'name': 'i', 'config_spot': 'config_spot99'}, {'name': 'i', 'config_spot': 'config_spot25', 'pull': 'sideways'},
+                {'name': 'i', 'config_spot': 'config_spot25', 'bounce_ms': -1},
+                {'name': 'i', 'config_spot': 'config_spot26'}):
+        post(client, '/api/config/inputs', bad, 400)
+    r = client.delete('/api/config/inputs', json={'name': 'bumper'})
+    assert r.status_code == 400 and 'bump_stop' in r.get_json()['error']
+    print('invalid inputs and rules rejected')
+
+    # Removing the input gives the pin back as an output
+    for name in ('bump_stop', 'bump_light'):
+        assert client.delete('/api/config/rules', json={'name': name}).status_code == 200
+    assert client.delete('/api/config/inputs', json={'name': 'bumper'}).status_code == 200
+    assert pin not in gpio.callbacks and pin in web_server.ALL_OUTPUTS
+    post(client, '/api/activate', {'alias': 'spare_8', 'duration': 0.1})
+    assert gpio.levels[pin] == gpio.HIGH
+    print('input removed; pin is an output again')
+    print('\nInput test completed successfully')
+
+
+if __name__ == '__main__':
+    main()
@@ -9,9 +9,14 @@ Set ROBOTCLI_URL env var to point at the server, e.g. http://127.0.0.1:8000
 """
 
 import os
+import re
+import sys
 import time
 import requests
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import status_codec
+
 BASE = os.environ.get('ROBOTCLI_URL', 'http://127.0.0.1:8000')
 
 def post_json(path, payload):
@@ -31,6 +36,18 @@ def get_json(path):
 
 def main():
     try:
+        # Web UI: a small revalidated shell pointing at hashed, immutable, gzipped assets
+        r = requests.get(BASE + '/', headers={'Accept-Encoding': 'gzip'})
+        r.raise_for_status()
+        assert r.headers['Content-Encoding'] == 'gzip' and r.headers['Cache-Control'] == 'no-cache'
+        assert requests.get(BASE + '/', headers={'If-None-Match': r.headers['ETag'],
+                                                 'Accept-Encoding': 'gzip'}).status_code == 304
+        script = re.search(r'<script src="(/static/app\.\w+\.js)"', r.text).group(1)
+        r = requests.get(BASE + script, headers={'Accept-Encoding': 'gzip'})
+        r.raise_for_status()
+        assert 'immutable' in r.headers['Cache-Control'] and 'loadConfig' in r.text
+        print('Web UI shell and', script, 'ok')
+
         # Map config_spot27 -> 26
         post_json('/api/config/gpio-pins', {'config_spot': 'config_spot27', 'pin_num': 26})
 
@@ -45,15 +62,92 @@ def main():
         status = get_json('/api/status')
         print('Status snapshot:', status)
 
+        # Binary status: same pins as JSON, and an empty delta when nothing changed
+        r = requests.get(BASE + '/api/status?format=bin')
+        r.raise_for_status()
+        frame = status_codec.decode(r.content)
+        print('Binary status:', len(r.content), 'bytes', frame)
+        assert 26 in frame.pins and frame.pins[26] is None
+        r = requests.get(BASE + '/api/status', params={'since': frame.seq},
+                         headers={'Accept': status_codec.MIMETYPE})
+        assert r.headers['Content-Type'] == status_codec.MIMETYPE and len(r.content) == 12
+        assert int(r.headers['X-Config-Version']) == get_json('/api/config')['version']
+
         # Now stop alias
         post_json('/api/stop', {'alias': 'test_motor'})
 
+        # The activation and stop should both be in the transition history
+        hist = get_json('/api/history?pin=26')
+        print('History for pin 26:', hist['events'][-2:])
+
+        # A lease holds the pin while renewed and drops it once renewals stop
+        lease = post_json('/api/lease', {'target': 'test_motor', 'ttl': 0.3})['lease']
+        for _ in range(3):
+            time.sleep(0.15)
+            post_json(f'/api/lease/{lease}/renew', {})
+        assert '26' in get_json('/api/status')
+        time.sleep(0.6)
+        assert '26' not in get_json('/api/status')
+        r = requests.post(BASE + f'/api/lease/{lease}/renew')
+        print('/api/lease renew after expiry', r.status_code)
+        assert r.status_code == 410
+
+        # Emergency stop latches: activation is refused until reset
+        post_json('/api/estop', {})
+        r = requests.post(BASE + '/api/activate', json={'alias': 'test_motor', 'duration': 0.5})
+        print('/api/activate during estop', r.status_code)
+        assert r.status_code == 409
+        post_json('/api/estop/reset', {})
+
+        # Command language: a timed sequence runs in the background, bad syntax is a 400
+        run = post_json('/api/run', {'program': 'test_motor(250MS) then stop(test_motor)'})
+        assert run.get('background')
+        r = requests.post(BASE + '/api/run', json={'program': 'test_motor(('})
+        print('/api/run with bad syntax', r.status_code)
+        assert r.status_code == 400
+        r = requests.post(BASE + '/api/config/aliases', json={'name': 'Then', 'config_spot': 'config_spot27'})
+        print('/api/config/aliases with a reserved name', r.status_code)
+        assert r.status_code == 400
+
         # Add a group that turns OFF (example: lights_off)
         post_json('/api/config/groups', {'name': 'test_off_group', 'aliases': ['led_1', 'led_2'], 'action': 'off'})
 
         # Activate group (action=off) - should turn pins off
         post_json('/api/activate-group', {'group': 'test_off_group', 'duration': 0.5})
 
+        # Groups can nest, but not in a cycle
+        post_json('/api/config/groups', {'name': 'test_nested_group', 'aliases': ['test_off_group', 'buzzer'], 'action': 'off'})
+        r = requests.post(BASE + '/api/config/groups', json={'name': 'test_off_group', 'aliases': ['test_nested_group']})
+        print('/api/config/groups with a cycle', r.status_code)
+        assert r.status_code == 400
+        r = requests.delete(BASE + '/api/config/groups', json={'name': 'test_nested_group'})
+        r.raise_for_status()
+
+        # Interlocked aliases cannot be on together
+        post_json('/api/config/interlocks', {'name': 'test_interlock', 'members': ['led_1', 'led_2'], 'policy': 'reject'})
+        post_json('/api/activate', {'alias': 'led_1', 'duration': 1})
+        r = requests.post(BASE + '/api/activate', json={'alias': 'led_2', 'duration': 1})
+        print('/api/activate against an interlock', r.status_code)
+        assert r.status_code == 409
+        post_json('/api/stop', {'alias': 'led_1'})
+        r = requests.delete(BASE + '/api/config/interlocks', json={'name': 'test_interlock'})
+        r.raise_for_status()
+
+        # The example drive interlock: members sharing motors with both
+        # sides (left, right) still run, the two sides together do not
+        post_json('/api/config/interlocks', {'name': 'test_drive', 'members': ['forward', 'backward'], 'policy': 'reject'})
+        for group in ('left', 'right'):
+            post_json('/api/activate-group', {'group': group, 'duration': 1})
+            post_json('/api/stop', {})
+        post_json('/api/activate-group', {'group': 'forward', 'duration': 1})
+        post_json('/api/activate-group', {'group': 'left', 'duration': 1})
+        r = requests.post(BASE + '/api/activate-group', json={'group': 'backward', 'duration': 1})
+        print('/api/activate-group against the drive interlock', r.status_code)
+        assert r.status_code == 409
+        post_json('/api/stop', {})
+        r = requests.delete(BASE + '/api/config/interlocks', json={'name': 'test_drive'})
+        r.raise_for_status()
+
         # Test AI endpoints: register, get schema, and execute status
         post_json('/api/ai/register', {'api_key': 'testkey', 'model': 'test-model', 'enabled': True})
         get_json('/api/ai/schema')
@@ -0,0 +1,102 @@
+"""Lease test: overlapping leases, release, expiry and renewal, on the fake GPIO.
+
+Checks that a pin stays on while any live lease covers it (two leases on
+one alias, and group leases sharing a motor), that ending a lease leaves
+holds no lease made alone, and that leases lapse without renewals and
+refuse renewal afterwards.
+
+    pip3 install -r requirements-web.txt
+    python3 tests/lease_test.py
+"""
+
+import time
+
+from harness import setup
+
+gpio = setup('lease')
+
+import web_server  # noqa: E402
+
+
+def pin_of(alias):
+    return web_server.group_index().alias_pins[alias][0]
+
+
+def on(pin):
+    return pin in web_server.active_pins and gpio.levels.get(pin) == gpio.HIGH
+
+
+def take(client, target, ttl=5):
+    r = client.post('/api/lease', json={'target': target, 'ttl': ttl})
+    assert r.status_code == 200, r.get_data(as_text=True)
+    return r.get_json()['lease']
+
+
+def check_overlap(client):
+    pin = pin_of('motor_1')
+    first, second = take(client, 'motor_1'), take(client, 'motor_1')
+    assert client.delete(f'/api/lease/{first}').status_code == 200
+    assert on(pin), 'the second lease still holds the pin'
+    assert client.post(f'/api/lease/{second}/renew').status_code == 200
+    assert client.delete(f'/api/lease/{second}').status_code == 200
+    assert not on(pin), 'the pin goes off with the last lease'
+    assert client.delete(f'/api/lease/{second}').status_code == 410
+
+    # forward and left share motor_1
+    m1, m2, m4 = pin_of('motor_1'), pin_of('motor_2'), pin_of('motor_4')
+    forward, left = take(client, 'forward'), take(client, 'left')
+    client.delete(f'/api/lease/{forward}')
+    assert on(m1) and on(m4) and not on(m2)
+    client.delete(f'/api/lease/{left}')
+    assert not (on(m1) or on(m4))
+    print('overlapping leases: pins go off with the last lease on them')
+
+
+def check_holds(client):
+    assert client.post('/api/config/aliases', json={'name': 'held_led', 'config_spot': 'config_spot9',
+                                                     'auto_off': False}).status_code == 200
+    pin = pin_of('held_led')
+    assert pin == pin_of('led_1')
+    # A hold taken before the lease, and one taken while it is live
+    for hold_first in (True, False):
+        if hold_first:
+            client.post('/api/activate', json={'alias': 'held_led', 'duration': 1})
+        lease = take(client, 'led_1')
+        if not hold_first:
+            client.post('/api/activate', json={'alias': 'held_led', 'duration': 1})
+        client.delete(f'/api/lease/{lease}')
+        assert on(pin), 'holds no lease made stay on'
+        client.post('/api/stop', json={'alias': 'held_led'})
+        assert not on(pin)
+    client.delete('/api/config/aliases', json={'name': 'held_led'})
+    print('holds taken outside leases are left alone')
+
+
+def check_expiry(client):
+    pin = pin_of('motor_2')
+    lease = take(client, 'motor_2', ttl=0.2)
+    short = take(client, 'motor_3', ttl=0.2)
+    for _ in range(4):
+        time.sleep(0.1)
+        assert client.post(f'/api/lease/{lease}/renew').status_code == 200
+    assert on(pin) and not on(pin_of('motor_3')), 'only the renewed lease lives on'
+    assert client.post(f'/api/lease/{short}/renew').status_code == 410
+    deadline = time.monotonic() + 2
+    while on(pin) and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert not on(pin), 'the lease lapses once renewals stop'
+    assert client.post(f'/api/lease/{lease}/renew').status_code == 410
+    assert not web_server.leases and not web_server._lease_counts
+    print('leases lapse without renewals and refuse renewal afterwards')
+
+
+def main():
+    client = web_server.app.test_client()
+    check_overlap(client)
+    check_holds(client)
+    check_expiry(client)
+    print('\nLease test completed successfully')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+"""Scheduler test: timing wheel, catch-up after restarts, and /api/schedule.
+
+Checks the timing wheel against a brute-force list of timers, that jobs
+missed while the server was down run once (or are skipped) on restart
+and after a clock jump, that concurrent changes leave schedule.json
+complete, and that jobs added through the API switch pins
+through the normal pin-state engine. Runs in-process on the fake GPIO.
+
+    pip3 install -r requirements-web.txt
+    python3 tests/schedule_test.py
+"""
+
+import contextlib
+import io
+import json
+import math
+import os
+import random
+import tempfile
+import threading
+import time
+
+from harness import setup
+
+gpio = setup('schedule')
+os.environ.setdefault('ROBOTCLI_SCHEDULE_TICK', '0.05')
+
+import web_server  # noqa: E402
+from scheduler import Job, Scheduler  # noqa: E402
+from timing_wheel import TimingWheel  # noqa: E402
+
+
+def check_wheel():
+    rnd = random.Random(7)
+    for trial in range(100):
+        slots, levels = rnd.choice([2, 4, 64]), rnd.choice([1, 2, 4])
+        now = rnd.uniform(0, 1e6)
+        wheel, live = TimingWheel(1.0, slots, levels, now), {}
+        for step in range(300):
+            op = rnd.random()
+            if op < 0.5:
+                when = now + rnd.choice([rnd.uniform(-5, 5), rnd.uniform(0, 100), rnd.uniform(0, 3 * slots ** levels)])
+                live[step] = (when, wheel.schedule(when, step))
+            elif op < 0.6 and live:
+                assert wheel.cancel(live.pop(rnd.choice(list(live)))[1])
+            else:
+                now += rnd.choice([0.3, 1, 7, rnd.uniform(0, 3 * slots)])
+                expected = {k for k, (when, _) in live.items() if math.ceil(when) <= math.floor(now)}
+                due = wheel.advance(now)
+                assert set(due) == expected and len(due) == len(expected), (trial, step)
+                for k in due:
+                    del live[k]
+                assert len(wheel) == len(live)
+
+    wheel = TimingWheel(1.0, now=0.0)
+    n = 100000
+    start = time.perf_counter()
+    for i in range(n):
+        wheel.schedule(rnd.uniform(0, 86400), i)
+    inserted = time.perf_counter()
+    fired, wakeups, now = 0, 0, 0.0
+    while len(wheel):
+        now = wheel.next_due()
+        fired += len(wheel.advance(now))
+        wakeups += 1
+    done = time.perf_counter()
+    assert fired == n
+    print(f'wheel: matches brute force; {n} timers over a day: '
+          f'{(inserted - start) / n * 1e6:.1f} us insert, {(done - inserted) / n * 1e6:.1f} us expiry, '
+          f'{wakeups} wakeups')
+
+
+class Clock:
+    def __init__(self, t):
+        self.t = t
+
+    def __call__(self):
+        return self.t
+
+
+def check_catch_up():
+    path = os.path.join(tempfile.mkdtemp(prefix='robotcli-schedule-'), 'schedule.json')
+    clock = Clock(1_000_000.0)
+    ran = []
+
+    def make():
+        sched = Scheduler(path, run=lambda job: ran.append(job.program) or {'success': True}, clock=clock)
+        sched.load()
+        return sched
+
+    sched = make()
+    for spec in ({'program': 'pulse', 'every': '10m'}, {'program': 'later', 'in': '30s'},
+                 {'program': 'tick', 'every': '1m', 'catch_up': 'skip'}):
+        sched.add(Job.from_dict(spec, clock()))
+    try:
+        sched.add(Job.from_dict({'program': 'past', 'at': clock() - 5}, clock()))
+        raise AssertionError('a one-shot in the past must be refused')
+    except ValueError:
+        pass
+    for _ in range(1300 // 5):
+        clock.t += 5
+        sched.run_pending()
+    sched.stop()
+    assert ran.count('pulse') == 2 and ran.count('later') == 1 and ran.count('tick') == 21, ran
+    assert [job.program for job in sched.list()] == ['tick', 'pulse'], 'one-shots leave after running'
+
+    # Down for two hours: the interval job runs once, the skip job is only counted
+    del ran[:]
+    clock.t += 7200
+    sched = make()
+    sched.stop()
+    assert ran == ['pulse'] and sched.stats['caught_up'] == 1 and sched.stats['missed'] == 1, (ran, sched.stats)
+    pulse = next(job for job in sched.list() if job.program == 'pulse')
+    assert (pulse.next_run - pulse.start) % 600 == 0, 'interval jobs keep their phase'
+
+    # Down for three hours: a one-shot missed by more than its grace is dropped
+    sched = make()
+    sched.add(Job.from_dict({'program': 'once', 'in': '1m', 'grace': '1h'}, clock()))
+    sched.stop()
+    del ran[:]
+    clock.t += 3 * 3600
+    sched = make()
+    sched.add(Job.from_dict({'program': 'soon', 'in': '10s'}, clock()))
+    sched.stop()
+    assert ran == ['pulse'] and sched.stats['missed'] == 2, (ran, sched.stats)
+    assert 'once' not in [job.program for job in sched.list()]
+    del ran[:]
+
+    # A clock jump while running is handled like a restart, not replayed tick by tick
+    sched = make()
+    clock.t += 86400
+    start = time.perf_counter()
+    sched.run_pending()
+    sched.stop()
+    assert sched.stats['resyncs'] == 1 and time.perf_counter() - start < 0.5
+    assert ran == ['pulse'], 'the missed one-shot is past its grace, the interval job runs once'
+    assert [job.program for job in sched.list()] == ['tick', 'pulse'], ran
+    print('catch-up: missed runs coalesced, skipped or dropped past grace; clock jumps resync')
+
+
+def check_concurrent_saves():
+    path = os.path.join(tempfile.mkdtemp(prefix='robotcli-schedule-'), 'schedule.json')
+    sched = Scheduler(path, run=lambda job: {'success': True})
+    errors = []
+
+    def churn(n):
+        try:
+            for i in range(40):
+                job = sched.add(Job.from_dict({'program': f'p{n}_{i}', 'every': '1h'}))
+                if i % 2:
+                    sched.remove(job.id)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=churn, args=(n,)) for n in range(8)]
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):    # save() reports failures on stdout
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    assert not errors and 'Failed saving' not in out.getvalue(), (errors, out.getvalue()[:500])
+    with open(path) as f:
+        saved = {entry['id'] for entry in json.load(f)['jobs']}
+    assert saved == set(sched.jobs) and len(saved) == 8 * 20, 'the last save wins and is complete'
+    assert not os.path.exists(path + '.tmp')
+    print('saves: concurrent adds and removes leave a complete, current schedule.json')
+
+
+def wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+def check_api():
+    client = web_server.app.test_client()
+    pin = web_server.group_index().alias_pins['motor_1'][0]
+    r = client.post('/api/schedule', json={'program': 'motor_1(0.2)', 'in': '0.1s', 'name': 'nudge'})
+    assert r.status_code == 200, r.get_data(as_text=True)
+    job_id = r.get_json()['id']
+    assert client.get(f'/api/schedule/{job_id}').get_json()['name'] == 'nudge'
+    assert wait_for(lambda: gpio.levels.get(pin) == gpio.HIGH), 'scheduled job did not run'
+    assert web_server.history.query(pins={pin})[-1]['source'] == 'schedule'
+    assert wait_for(lambda: gpio.levels.get(pin) == gpio.LOW), 'timed pin did not turn off'
+    assert client.get(f'/api/schedule/{job_id}').status_code == 404, 'one-shot is gone after running'
+
+    r = client.post('/api/schedule', json={'program': 'motor_2(0.1)', 'every': '1s'})
+    job_id = r.get_json()['id']
+    assert wait_for(lambda: client.get(f'/api/schedule/{job_id}').get_json()['runs'] >= 2, timeout=3.0)
+    listed = client.get('/api/schedule').get_json()
+    assert [job['id'] for job in listed['jobs']] == [job_id] and listed['scheduler']['runs'] >= 3
+    assert client.delete(f'/api/schedule/{job_id}').status_code == 200
+    assert client.delete(f'/api/schedule/{job_id}').status_code == 404
+
+    for bad in ({'program': 'warp(1)', 'every': '1m'}, {'program': 'motor_1(', 'every': '1m'},
+                {'program': 'stop', 'every': '1m', 'daily': '19:00'}, {'program': 'stop'},
+                {'program': 'stop', 'daily': '25:00'}, {'program': 'stop', 'every': '0.2s'},
+                {'program': 'stop', 'at': '2001-01-01T00:00'}):
+        r = client.post('/api/schedule', json=bad)
+        assert r.status_code == 400, (bad, r.get_data(as_text=True))
+    print('api: jobs run through the pin engine; invalid jobs rejected')
+
+
+def main():
+    check_wheel()
+    check_catch_up()
+    check_concurrent_saves()
+    check_api()
+    print('\nSchedule test completed successfully')
+
+
+if __name__ == '__main__':
+    main()
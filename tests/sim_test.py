@@ -0,0 +1,91 @@
+"""Timing tests on the simulated GPIO and virtual clock (gpio_sim.py).
+
+Runs the CLI parser and the web server in-process on simulated GPIO and
+checks the recorded waveforms of choreographies that would take minutes
+in real time. No Pi, server or waiting needed:
+
+    pip3 install -r requirements-web.txt
+    python3 tests/sim_test.py [--vcd sim.vcd]
+"""
+
+import sys
+import time
+
+from harness import setup
+
+setup('sim', fake_gpio=False)
+
+from gpio_sim import Simulator  # noqa: E402
+
+sim = Simulator().install()
+
+import config  # noqa: E402
+import command_lang  # noqa: E402
+import parser  # noqa: E402
+import pinrun  # noqa: E402
+import web_server  # noqa: E402
+
+sim.patch(command_lang, parser, pinrun, web_server)
+
+
+def pin_of(alias):
+    return config.GPIO_PINS[config.ALIASES[alias]['config_spot']]
+
+
+def check_cli():
+    motor_1, motor_2, led_1 = pin_of('motor_1'), pin_of('motor_2'), pin_of('led_1')
+    start = sim.now
+    parser.run_program('forward(1m30s); wait(2); motor_1(500ms) & led_1(10); stop')
+    # Blocking CLI: each step holds the calling thread for its duration
+    assert sim.gpio.pulses(motor_2) == [(start, start + 90)], sim.gpio.pulses(motor_2)
+    assert sim.gpio.pulses(motor_1) == [(start, start + 90), (start + 92, start + 92.5)]
+    assert sim.gpio.pulses(led_1) == [(start + 92, start + 102)]
+    assert sim.now == start + 102
+    print(f'cli: forward, wait, parallel block -> {sim.now - start:g}s simulated')
+
+
+def check_web():
+    client = web_server.app.test_client()
+    led_2 = pin_of('led_2')
+    start = sim.now
+    assert client.post('/api/activate', json={'alias': 'led_2', 'duration': 30}).status_code == 200
+    assert client.get('/api/status').get_json()[str(led_2)] == 30
+    sim.advance(10)
+    assert client.get('/api/status').get_json()[str(led_2)] == 20
+    sim.advance(25)
+    assert str(led_2) not in client.get('/api/status').get_json()
+    # The auto-off timer fired at its deadline, not when the test looked
+    assert sim.gpio.pulses(led_2) == [(start, start + 30)], sim.gpio.pulses(led_2)
+
+    # Background program: the request returns at once, steps follow on the clock
+    motor_1, motor_2, motor_4 = pin_of('motor_1'), pin_of('motor_2'), pin_of('motor_4')
+    start = sim.now
+    r = client.post('/api/run', json={'program': 'forward(2); left(500ms)'})
+    assert r.status_code == 200, r.get_data(as_text=True)
+    sim.advance(5)
+    assert sim.gpio.pulses(motor_2)[-1] == (start, start + 2), sim.gpio.pulses(motor_2)
+    assert sim.gpio.pulses(motor_4) == [(start + 2, start + 2.5)], sim.gpio.pulses(motor_4)
+    for t, level in ((start + 1, 1), (start + 2.25, 1), (start + 2.5, 0)):
+        assert sim.gpio.level_at(motor_1, t) == level, sim.gpio.waveform(motor_1)
+    print(f'web: timed alias and background program -> {sim.now - start:g}s simulated')
+
+
+def main():
+    t0 = time.perf_counter()
+    check_cli()
+    check_web()
+    elapsed = time.perf_counter() - t0
+    print(f'{sim.now:g}s of pin activity simulated in {elapsed * 1000:.0f} ms')
+    assert elapsed < 5.0
+
+    vcd = sim.gpio.to_vcd(labels={pin_of(a): a for a in ('motor_1', 'motor_2', 'led_1', 'led_2')})
+    assert '$var wire 1 ! motor_1 $end' in vcd and '#90000000' in vcd
+    if len(sys.argv) > 2 and sys.argv[1] == '--vcd':
+        with open(sys.argv[2], 'w') as f:
+            f.write(vcd)
+        print(f'Waveforms written to {sys.argv[2]}')
+    print('\nSimulation test completed successfully')
+
+
+if __name__ == '__main__':
+    main()
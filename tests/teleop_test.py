@@ -0,0 +1,130 @@
+"""UDP teleop channel test, in-process on the fake GPIO.
+
+Starts the web server's teleop listener on a local UDP port and drives
+it with teleop.TeleopClient: holds, dead-man expiry, released pins,
+replayed, stale and forged packets, packets replayed after a restart or
+after their session was evicted, and the packet rate it sustains.
+
+    pip3 install -r requirements-web.txt
+    python3 tests/teleop_test.py
+"""
+
+import time
+
+from harness import setup
+
+gpio = setup('teleop')
+
+import teleop  # noqa: E402
+import web_server  # noqa: E402
+
+KEY = b'test-key'
+
+
+def wait_for(predicate, timeout=1.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.002)
+    return predicate()
+
+
+def main():
+    port = web_server.start_teleop(0, KEY, '127.0.0.1')
+    http = web_server.app.test_client()
+    client = teleop.TeleopClient('127.0.0.1', KEY, port, hold=0.15)
+    client.table = http.get('/api/teleop/targets').get_json()
+    stats = web_server.teleop_stats
+    forward = [web_server.group_index().alias_pins[a][0] for a in ('motor_1', 'motor_2')]
+    left_only = web_server.group_index().alias_pins['motor_4'][0]
+
+    # Held while packets keep coming, then dropped by the dead-man timeout
+    for _ in range(20):
+        client.send(targets=['forward'])
+        time.sleep(0.01)
+    assert wait_for(lambda: all(gpio.levels.get(p) for p in forward))
+    assert wait_for(lambda: client.acks())
+    assert wait_for(lambda: not any(gpio.levels.get(p) for p in forward), 0.5)
+    print('hold and dead-man expiry ok')
+
+    # Switching targets turns the old ones off at once, not at expiry
+    client.send(targets=['forward'], hold=5)
+    assert wait_for(lambda: all(gpio.levels.get(p) for p in forward))
+    client.send(targets=['left'], hold=5)
+    assert wait_for(lambda: gpio.levels.get(left_only) and not gpio.levels.get(forward[1]))
+    client.release()
+    assert wait_for(lambda: not web_server.active_pins)
+    print('switch and release ok')
+
+    # Replayed, stale and forged packets are dropped
+    before = dict(stats)
+    epoch = client.table['epoch']
+    replay = teleop.encode(KEY, epoch, client.session, client.seq, 5000, mask=1 << left_only)
+    client.sock.sendto(replay, client.addr)
+    stale = teleop.encode(KEY, epoch, client.session, client.seq + 1, 5000, mask=1 << left_only,
+                          sent_ms=int(time.monotonic() * 1000) - 5000)
+    client.sock.sendto(stale, client.addr)
+    client.seq += 1
+    forged = teleop.encode(b'wrong', epoch, client.session, client.seq + 1, 5000, mask=1 << left_only)
+    client.sock.sendto(forged, client.addr)
+    assert wait_for(lambda: stats['bad'] == before['bad'] + 1)
+    assert stats['out_of_order'] == before['out_of_order'] + 1
+    assert stats['stale'] == before['stale'] + 1
+    assert not web_server.active_pins
+    print('replayed, stale and forged packets dropped')
+
+    # E-stop: packets are refused until reset
+    web_server.emergency_stop('test')
+    client.send(targets=['forward'])
+    assert wait_for(lambda: stats['rejected'] > before['rejected'])
+    assert not web_server.active_pins
+    web_server.reset_emergency_stop()
+
+    # Sustained 200 Hz for one second: every packet accepted and acked
+    rate, n = 200, 200
+    client.acks()
+    accepted = stats['accepted']
+    acked = 0
+    t0 = time.perf_counter()
+    for i in range(n):
+        client.send(targets=['forward'])
+        acked += len(client.acks())
+        time.sleep(max(0.0, t0 + (i + 1) / rate - time.perf_counter()))
+    assert wait_for(lambda: stats['accepted'] == accepted + n)
+    time.sleep(0.01)
+    acked += len(client.acks())
+    print(f'{n} packets at {rate} Hz: {stats["accepted"] - accepted} accepted, {acked} acked')
+    assert acked == n
+    client.release()
+    assert wait_for(lambda: not web_server.active_pins)
+
+    # An idle session evicted from the table keeps its sequence number
+    sessions, last_seqs = {}, {}
+    recv_ms = int(time.monotonic() * 1000)
+    old = teleop.decode(KEY, teleop.encode(KEY, epoch, 7, 1, 0, mask=0, sent_ms=recv_ms))
+    assert web_server._teleop_handle(sessions, last_seqs, old, recv_ms)
+    sessions.clear()
+    assert not web_server._teleop_handle(sessions, last_seqs, old, recv_ms)
+
+    # After a restart, packets captured from the earlier listener are refused
+    captured = teleop.encode(KEY, epoch, client.session, client.seq + 1, 5000, mask=1 << left_only)
+    new_port = web_server.start_teleop(0, KEY, '127.0.0.1')
+    assert http.get('/api/teleop/targets').get_json()['epoch'] != epoch
+    wrong_epoch = stats['wrong_epoch']
+    client.sock.sendto(captured, ('127.0.0.1', new_port))
+    assert wait_for(lambda: stats['wrong_epoch'] == wrong_epoch + 1)
+    assert not web_server.active_pins
+    fresh = teleop.TeleopClient('127.0.0.1', KEY, new_port, hold=0.15)
+    fresh.table = http.get('/api/teleop/targets').get_json()
+    fresh.send(targets=['forward'])
+    assert wait_for(lambda: all(gpio.levels.get(p) for p in forward))
+    fresh.release()
+    assert wait_for(lambda: not web_server.active_pins)
+    print('packets replayed after eviction or a restart dropped')
+
+    print('\nTeleop test completed successfully')
+
+
+if __name__ == '__main__':
+    main()
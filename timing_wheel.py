@@ -0,0 +1,143 @@
+"""Hierarchical timing wheel: O(1) insert, cancel and expiry for many timers.
+
+    wheel = TimingWheel(tick=1.0, now=time.time())
+    timer = wheel.schedule(time.time() + 600, job)
+    ...
+    for job in wheel.advance(time.time()):     # everything now due
+        ...
+    wheel.cancel(timer)
+
+Time is cut into ticks. Level 0 has one slot per tick for the next
+`slots` ticks; each level above has slots `slots` times as wide (with
+the defaults: 64 s, ~68 min, ~73 h and ~194 days per turn). A timer
+goes into the lowest level whose current turn contains its tick, in the
+slot of its tick's digit at that level. When a level's slot comes up it
+is emptied into the levels below ("cascading"), so each timer is moved
+at most once per level and nothing is ever sorted or scanned. Timers
+beyond the top level wait in an overflow set, re-placed once per turn
+of the top level.
+
+A timer fires on the first tick at or after its time, so up to one tick
+late. next_due() tells a driver thread how long it may sleep: the next
+occupied level-0 slot, or the next cascade, whichever comes first, so an
+idle wheel wakes at most once per `slots` ticks.
+
+Not thread-safe; the owner serializes calls.
+"""
+
+import math
+
+
+class Timer:
+    __slots__ = ('when', 'tick', 'item', '_slot')
+
+    def __init__(self, when, tick, item):
+        self.when = when
+        self.tick = tick
+        self.item = item
+        self._slot = None
+
+    @property
+    def active(self):
+        return self._slot is not None
+
+
+class TimingWheel:
+    def __init__(self, tick=1.0, slots=64, levels=4, now=0.0):
+        self.tick = tick
+        self.slots = slots
+        self.levels = levels
+        # Slots are dicts used as ordered sets, so a timer leaves in O(1)
+        self._wheels = [[{} for _ in range(slots)] for _ in range(levels)]
+        self._spans = [slots ** level for level in range(levels + 1)]
+        self._overflow = {}
+        self._ready = {}            # already due when scheduled
+        self.current = math.floor(now / tick)   # last tick processed
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def schedule(self, when, item):
+        """Add a timer for wall time `when`; returns a Timer for cancel()."""
+        timer = Timer(when, math.ceil(when / self.tick), item)
+        self._place(timer)
+        self._count += 1
+        return timer
+
+    def cancel(self, timer):
+        """Remove a timer; False if it already fired or was cancelled."""
+        slot = timer._slot
+        if slot is None:
+            return False
+        del slot[timer]
+        timer._slot = None
+        self._count -= 1
+        return True
+
+    def _place(self, timer):
+        tick, current = timer.tick, self.current
+        if tick <= current:
+            slot = self._ready
+        else:
+            # The highest digit (base `slots`) where the timer's tick and
+            # the current tick differ picks the level
+            level = 0
+            while level < self.levels and tick // self._spans[level + 1] != current // self._spans[level + 1]:
+                level += 1
+            if level == self.levels:
+                slot = self._overflow
+            else:
+                slot = self._wheels[level][(tick // self._spans[level]) % self.slots]
+        slot[timer] = None
+        timer._slot = slot
+
+    def _take(self, slot):
+        timers = list(slot)
+        slot.clear()
+        for timer in timers:
+            timer._slot = None
+        return timers
+
+    def advance(self, now):
+        """Move time forward to `now`; returns the items of every timer now due, in order."""
+        target = math.floor(now / self.tick)
+        due = []
+        if self._ready:
+            due.extend(self._take(self._ready))
+        if not self._count - len(due):
+            self.current = max(self.current, target)
+        while self.current < target and self._count - len(due):
+            t = self.current = self.current + 1
+            if t % self._spans[1] == 0:
+                # Cascade from the top down: a level's turn starts, so its
+                # next slot's timers are re-placed in the levels below
+                if t % self._spans[self.levels] == 0:
+                    for timer in self._take(self._overflow):
+                        self._place(timer)
+                for level in range(self.levels - 1, 0, -1):
+                    if t % self._spans[level] == 0:
+                        for timer in self._take(self._wheels[level][(t // self._spans[level]) % self.slots]):
+                            self._place(timer)
+                if self._ready:     # re-placed timers due this very tick
+                    due.extend(self._take(self._ready))
+            slot = self._wheels[0][t % self.slots]
+            if slot:
+                due.extend(self._take(slot))
+        self.current = max(self.current, target)
+        self._count -= len(due)
+        due.sort(key=lambda timer: timer.when)
+        return [timer.item for timer in due]
+
+    def next_due(self):
+        """Wall time worth waking at (a timer may be due, or a cascade is), or None if empty."""
+        if not self._count:
+            return None
+        if self._ready:
+            return self.current * self.tick
+        level0 = self._wheels[0]
+        block_end = (self.current // self.slots + 1) * self.slots
+        for t in range(self.current + 1, block_end):
+            if level0[t % self.slots]:
+                return t * self.tick
+        return block_end * self.tick
@@ -5,116 +5,1042 @@ Run: python3 web_server.py
 Access at: http://<your-pi-ip>:8000
 """
 
-from flask import Flask, render_template, jsonify, request
-import RPi.GPIO as GPIO
+from flask import Flask, jsonify, request, g, Response
 import threading
 import time
-import requests
+import heapq
 import json
 import logging
-import re
-from config import GPIO_PINS, ALIASES, GROUPS, AI_SETTINGS, save_config, load_config, reset_gpio_pins_to_defaults
-
-# Basic logging
-logging.basicConfig(level=logging.INFO)
+import os
+import secrets
+import signal
+import socket
+from contextlib import contextmanager
+import config
+import gpio_backend
+from config import load_config, reset_gpio_pins_to_defaults
+from request_log import RequestCapture
+from log_setup import setup_logging, Truncated
+from pin_history import TransitionHistory
+from pin_usage import UsageCounters
+from pin_groups import GroupIndex, find_cycle, group_members, INTERLOCK_POLICIES, bits, conflicting
+import command_lang
+from command_lang import compile_program, parse_duration, CommandSyntaxError, RESERVED_NAMES
+import static_assets
+import status_codec
+from ai_sessions import ConversationStore
+from ai_stream import ReplyParser
+from schema_compile import compile_schema
+from scheduler import Scheduler, Job
+from gpio_inputs import InputIndex, InputWatcher, input_pins, check_input, EDGES
+from ai_provider import ChatProvider, CircuitBreaker, CircuitOpen, ProviderError, DEFAULT_BASE_URL
+import teleop
+
+# Asynchronous structured logging (see log_setup.py for ROBOTCLI_LOG_* settings)
+setup_logging()
 logger = logging.getLogger(__name__)
+# Hot-path categories, sampled and rate limited independently
+command_log = logging.getLogger(__name__ + '.command')
+ai_log = logging.getLogger(__name__ + '.ai')
 
 
-def _parse_duration(value):
-    """Parse duration expressed as number or string like '40 seconds' or '2 min'.
+# static/ is served by serve_static from the prebuilt bundle below
+app = Flask(__name__, static_folder=None)
 
-    Returns float seconds or raises ValueError if cannot parse.
-    """
-    if value is None:
-        return 1.0
-    if isinstance(value, (int, float)):
-        return float(value)
-    s = str(value).strip().lower()
-    # Find numeric portion
-    m = re.search(r'([0-9]+(?:\.[0-9]+)?)', s)
-    if m:
-        num = float(m.group(1))
-        if re.search(r'\b(h|hr|hour|hours)\b', s):
-            return num * 3600.0
-        if re.search(r'\b(m|min|minute|minutes)\b', s):
-            return num * 60.0
-        # default seconds
-        return num
-    # Fallback: try some small word-number map
-    words_map = {
-        'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5,
-        'six': 6, 'seven': 7, 'eight': 8, 'nine': 9, 'ten': 10,
-        'forty': 40
-    }
-    for w, v in words_map.items():
-        if re.search(r'\b' + w + r'\b', s):
-            if re.search(r'\b(m|min|minute)\b', s):
-                return float(v) * 60.0
-            return float(v)
-    raise ValueError(f'Cannot parse duration: {value}')
+# The process-wide GPIO backend (config GPIO_SETTINGS, see gpio_backend.py)
+GPIO = gpio_backend.get()
+VALID_PINS = set(gpio_backend.VALID_PINS)
 
-app = Flask(__name__)
 
-# Setup GPIO
-GPIO.setmode(GPIO.BCM)
-# Note: GPIO 0 and 1 are reserved for I2C, pins 2-27 are standard GPIO
-VALID_PINS = set(range(2, 28))
+def unset_invalid_mappings():
+    """Unset GPIO mappings that are not valid output pins (persisted so they
+    survive a restart). Returns the config spots that were unset."""
+    with config.edit() as draft:
+        invalid = [k for k, v in draft.gpio_pins.items()
+                   if v is not None and (not isinstance(v, int) or v not in VALID_PINS)]
+        for k in invalid:
+            draft.gpio_pins[k] = None
+    return invalid
+
 
 # Validate existing mappings in config (unset invalid entries)
-invalid_spots = []
-for k, v in list(GPIO_PINS.items()):
-    if not isinstance(v, int) or v not in VALID_PINS:
-        invalid_spots.append(k)
-        GPIO_PINS[k] = None
+invalid_spots = unset_invalid_mappings()
 if invalid_spots:
     print(f"⚠️ Invalid GPIO mappings for: {invalid_spots}. They have been unset (set to None).")
-    # Persist the changes so they survive a restart
-    save_config()
-
-for pin in VALID_PINS:
-    GPIO.setup(pin, GPIO.OUT)
-    GPIO.output(pin, GPIO.LOW)
 
-# Track active pins for status
+# Only mapped output pins are set up (LOW) now; the backend claims any
+# other pin on its first write. Pins of config INPUTS are never driven;
+# the input watcher sets them up.
+_startup_inputs = input_pins(config.GPIO_PINS, config.INPUTS, VALID_PINS)
+GPIO.setup(sorted(VALID_PINS.difference(_startup_inputs).intersection(config.GPIO_PINS.values())),
+           GPIO.OUT, initial=GPIO.LOW)
+
+# ---- Pin state ----
+# active_pins maps pin -> end_time (None = on until stopped). The dict is
+# never mutated in place: writers publish a new dict under _state_lock
+# (held only for the swap, never across GPIO I/O), so status readers just
+# take the current reference without locking and always see a consistent
+# snapshot. state_version increments on every publish.
 active_pins = {}
-lock = threading.Lock()
+state_version = 0
+# Bit N set while pin N is on (kept in step with active_pins)
+on_mask = 0
+_state_lock = threading.Lock()
+# Notified on every publish; interlock-queued activations wait on it
+_state_changed = threading.Condition(_state_lock)
+_OFF = object()
+
+# The latest (version, active_pins, on_mask) as one reference, plus the
+# recent ones indexed by version % STATE_RING, so binary status clients
+# can ask for the changes since a version they have seen.
+STATE_RING = 256
+current_state = (0, active_pins, 0)
+_recent_states = [None] * STATE_RING
+_recent_states[0] = current_state
+
+# Every on/off transition is recorded in a fixed-size ring buffer
+# (served by /api/history). pin_labels remembers which alias turned a pin
+# on so the matching off event can be attributed to it.
+HISTORY_CAPACITY = 4096
+history = TransitionHistory(HISTORY_CAPACITY)
+pin_labels = {}
+
+# Pins whose current hold (end_time None) a lease created, so ending the
+# last lease on a pin leaves holds taken by anything else alone
+lease_held = set()
+
+# Cumulative on-time and cycle counts per pin, updated on each transition
+# and persisted next to config.json every USAGE_SAVE_INTERVAL seconds.
+USAGE_SAVE_INTERVAL = 60.0
+usage = UsageCounters(os.path.join(os.path.dirname(config.CONFIG_FILE), 'usage.json'))
+usage.load()
+usage.start_autosave(USAGE_SAVE_INTERVAL)
+
+# Per-pin locks serialize the hardware write and state update of each pin.
+# Multi-pin operations acquire them in ascending pin order (_locked_pins)
+# so concurrent group operations cannot deadlock.
+pin_locks = {pin: threading.Lock() for pin in VALID_PINS}
+
+
+@contextmanager
+def _locked_pins(pins):
+    ordered = sorted(set(pins))
+    for pin in ordered:
+        pin_locks[pin].acquire()
+    try:
+        yield
+    finally:
+        for pin in reversed(ordered):
+            pin_locks[pin].release()
 
 
-def activate_pin(pin_num, duration):
-    """Activate a pin for specified duration"""
-    with lock:
-        GPIO.output(pin_num, GPIO.HIGH)
-        active_pins[pin_num] = time.time() + duration
-    
-    # Deactivate after duration
+def _publish(changes, source='system', labels=None, lease=False):
+    """Apply {pin: end_time | _OFF} to active_pins as a single reference swap.
+
+    Pins that actually change state are recorded in `history` with the
+    given source and alias labels ({pin: alias}). With `lease`, holds the
+    change creates are marked in lease_held. Callers must hold the pin
+    locks of every pin in `changes`.
+    """
+    global active_pins, state_version, on_mask, current_state
+    with _state_changed:
+        now = time.monotonic()
+        pins = dict(active_pins)
+        mask = on_mask
+        for pin, end_time in changes.items():
+            if end_time is _OFF:
+                lease_held.discard(pin)
+                if pins.pop(pin, _OFF) is not _OFF:
+                    mask &= ~(1 << pin)
+                    alias = pin_labels.pop(pin, None)
+                    history.record(pin, 0, source, labels.get(pin, alias) if labels else alias, now)
+                    usage.off(pin, now)
+            else:
+                if pin not in pins:
+                    mask |= 1 << pin
+                    alias = labels.get(pin) if labels else None
+                    pin_labels[pin] = alias
+                    history.record(pin, 1, source, alias, now)
+                    usage.on(pin, now)
+                if end_time is None and lease:
+                    # A lease takes over pins that were off or timed, not other holds
+                    if pins.get(pin, _OFF) is not None:
+                        lease_held.add(pin)
+                else:
+                    lease_held.discard(pin)
+                pins[pin] = end_time
+        active_pins = pins
+        on_mask = mask
+        state_version += 1
+        current_state = _recent_states[state_version % STATE_RING] = (state_version, pins, mask)
+        _state_changed.notify_all()
+
+
+def pins_on(deadlines, source='ui', labels=None, conflicts=None, lease=False):
+    """Drive pins HIGH. `deadlines` maps pin -> end_time (None = until stopped).
+
+    `conflicts` is the precomputed interlock record for these pins (looked
+    up when omitted); `lease` is passed on to _publish. Returns the deadlines as published (shifted by any
+    time spent queued behind an interlock). Raises EmergencyStopActive if the e-stop is engaged
+    or fires while this call is waiting for its pin locks, and
+    InterlockConflict if an interlock refuses the activation.
+    """
+    epoch = estop_epoch
+    if conflicts is None:
+        conflicts = group_index().conflicts_for(deadlines)
+    if conflicts is None:
+        with _locked_pins(deadlines):
+            if estop_engaged or epoch != estop_epoch:
+                raise EmergencyStopActive('Emergency stop engaged')
+            if deadlines:
+                GPIO.output(list(deadlines), GPIO.HIGH)
+            _publish(deadlines, source, labels, lease)
+        return deadlines
+
+    if conflicts.self_conflict:
+        raise InterlockConflict('Activation turns on interlocked members together', [])
+    started = time.time()
+    deadline = time.monotonic() + INTERLOCK_QUEUE_TIMEOUT
+    while True:
+        if conflicting(conflicts.queue, on_mask):
+            _wait_for_interlock(conflicts.queue, epoch, deadline)
+        # Conflicting pins are locked too, so nothing can turn them on
+        # between the check and our write
+        with _locked_pins(set(deadlines).union(conflicts.pins)):
+            if estop_engaged or epoch != estop_epoch:
+                raise EmergencyStopActive('Emergency stop engaged')
+            on = on_mask
+            rejected = conflicting(conflicts.reject, on)
+            if rejected:
+                raise InterlockConflict('Interlock: conflicting pins are on', bits(rejected))
+            if conflicting(conflicts.queue, on):
+                continue  # turned on again while we were waiting for the locks
+            dropped = 0
+            for rest, drop in conflicts.preempt:
+                if on & rest == rest:
+                    dropped |= drop
+            preempted = bits(dropped)
+            if preempted:
+                GPIO.output(preempted, GPIO.LOW)
+                _publish(dict.fromkeys(preempted, _OFF), 'interlock')
+            waited = time.time() - started
+            if waited > 0.001:
+                # Time spent queued does not count against the duration
+                deadlines = {pin: (None if end is None else end + waited) for pin, end in deadlines.items()}
+            if deadlines:
+                GPIO.output(list(deadlines), GPIO.HIGH)
+            _publish(deadlines, source, labels, lease)
+            return deadlines
+
+
+def pins_off(pins, source='ui', labels=None):
+    """Drive pins LOW (one bank write) and drop them from active_pins."""
+    pins = list(pins)
+    with _locked_pins(pins):
+        if pins:
+            GPIO.output(pins, GPIO.LOW)
+        _publish(dict.fromkeys(pins, _OFF), source, labels)
+
+
+def activate_pins(pins, duration, hold=(), source='ui', labels=None, conflicts=None):
+    """Turn pins on together. Pins in `hold` stay on until stopped; the rest
+    turn off after `duration` seconds unless re-activated or stopped first."""
+    end_time = time.time() + duration
+    deadlines = pins_on({pin: (None if pin in hold else end_time) for pin in pins}, source, labels, conflicts)
+    timed = [pin for pin in pins if pin not in hold]
+    if not timed:
+        return
+    end_time = deadlines[timed[0]]
+
     def deactivate():
-        time.sleep(duration)
-        with lock:
-            GPIO.output(pin_num, GPIO.LOW)
-            if pin_num in active_pins:
-                del active_pins[pin_num]
-    
+        time.sleep(max(0.0, end_time - time.time()))
+        with _locked_pins(timed):
+            # Skip pins that a later activation or stop has taken over
+            expired = [pin for pin in timed if active_pins.get(pin) == end_time]
+            if expired:
+                GPIO.output(expired, GPIO.LOW)
+                _publish(dict.fromkeys(expired, _OFF), 'timer')
+
     thread = threading.Thread(target=deactivate, daemon=True)
     thread.start()
 
 
+def activate_pin(pin_num, duration):
+    """Activate a pin for specified duration"""
+    activate_pins([pin_num], duration)
+
+
+# ---- Emergency stop ----
+class EmergencyStopActive(RuntimeError):
+    """Raised when pins would be turned on while the e-stop is engaged."""
+
+
+# Pins driven as outputs: VALID_PINS less the inputs (see sync_inputs)
+output_pins = frozenset(VALID_PINS.difference(_startup_inputs))
+ALL_OUTPUTS = sorted(output_pins)
+estop_engaged = False
+estop_epoch = 0
+estop_stats = {
+    'count': 0,
+    'last_source': None,
+    'engaged_at': None,
+    'last_ms': None,
+    'max_ms': None,
+    'last_sweep_ms': None,
+    'max_sweep_ms': None,
+}
+
+
+def emergency_stop(source='api'):
+    """Drive every configured output LOW ahead of any queued or in-flight command.
+
+    The first write is a single bank operation that takes no locks, so its
+    latency does not depend on whatever else is running. Bumping
+    estop_epoch makes activations still waiting for pin locks abort, and
+    the sweep under all pin locks catches any write that was already past
+    that check. The e-stop stays engaged (activations are rejected) until
+    reset_emergency_stop() is called.
+    """
+    global estop_engaged, estop_epoch
+    t0 = time.perf_counter()
+    estop_engaged = True
+    estop_epoch += 1
+    # sweep_low() also claims pins never set up, which a plain LOW write
+    # skips, so a pin set HIGH outside the pin engine is caught too
+    GPIO.sweep_low(ALL_OUTPUTS)
+    low_ms = (time.perf_counter() - t0) * 1000.0
+    with _locked_pins(ALL_OUTPUTS):
+        GPIO.sweep_low(ALL_OUTPUTS)
+        _publish(dict.fromkeys(active_pins, _OFF), 'estop')
+    sweep_ms = (time.perf_counter() - t0) * 1000.0
+
+    estop_stats['count'] += 1
+    estop_stats['last_source'] = source
+    estop_stats['engaged_at'] = time.time()
+    estop_stats['last_ms'] = low_ms
+    estop_stats['max_ms'] = max(low_ms, estop_stats['max_ms'] or 0.0)
+    estop_stats['last_sweep_ms'] = sweep_ms
+    estop_stats['max_sweep_ms'] = max(sweep_ms, estop_stats['max_sweep_ms'] or 0.0)
+    logger.warning('EMERGENCY STOP (%s): outputs LOW in %.3f ms, sweep done in %.3f ms',
+                   source, low_ms, sweep_ms)
+    return dict(estop_stats, engaged=True)
+
+
+def reset_emergency_stop():
+    """Release the e-stop latch so pins can be activated again."""
+    global estop_engaged
+    estop_engaged = False
+    estop_stats['engaged_at'] = None
+
+
+# ---- Interlocks (config INTERLOCKS, compiled in pin_groups.GroupIndex) ----
+class InterlockConflict(RuntimeError):
+    """Raised when an interlock refuses an activation."""
+
+    def __init__(self, message, pins):
+        super().__init__(message)
+        self.pins = pins
+
+
+# How long a `queue` interlock waits for conflicting pins to turn off
+INTERLOCK_QUEUE_TIMEOUT = float(os.environ.get('ROBOTCLI_INTERLOCK_QUEUE_TIMEOUT', 30.0))
+
+
+def _wait_for_interlock(clauses, epoch, deadline):
+    """Block until on_mask completes none of the interlock clauses; gives up
+    at deadline or on an e-stop."""
+    with _state_changed:
+        while conflicting(clauses, on_mask):
+            if estop_engaged or epoch != estop_epoch:
+                raise EmergencyStopActive('Emergency stop engaged')
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise InterlockConflict('Interlock: timed out waiting for conflicting pins',
+                                        bits(conflicting(clauses, on_mask)))
+            _state_changed.wait(remaining)
+
+
+def status_snapshot():
+    """Return {pin_str: remaining_seconds | None} without taking any lock."""
+    pins = active_pins
+    current_time = time.time()
+    return {str(pin_num): (None if end_time is None else max(0, end_time - current_time))
+            for pin_num, end_time in pins.items()}
+
+
+# ---- Targets and the command language ----
+# Aliases and (nested) groups resolved to pins, rebuilt from each new
+# config snapshot; readers take the current reference without locking.
+_group_index = None
+
+
+def group_index():
+    global _group_index
+    index = _group_index
+    cfg = config.snapshot
+    if index is None or index.version != cfg.version:
+        outputs = sync_inputs(cfg)
+        index = _group_index = GroupIndex(cfg.version, cfg.aliases, cfg.groups, cfg.gpio_pins,
+                                          outputs, cfg.interlocks)
+    return index
+
+
+def _alias_pin(alias):
+    """Return (pin, auto_off) for a configured alias; pin is None if unmapped."""
+    return group_index().alias_pins.get(alias, (None, True))
+
+
+def _group_pins(group):
+    """Return (action, {pin: alias}, hold, conflicts) for a configured group,
+    nested groups flattened."""
+    flat = group_index().groups.get(group)
+    if flat is None:
+        return 'on', {}, frozenset(), None
+    return flat.action, flat.labels, flat.hold, flat.conflicts
+
+
+def _run_alias(alias, duration, source='ui'):
+    """Activate one alias, honouring its auto_off setting."""
+    index = group_index()
+    pin_num, auto_off = index.alias_pins.get(alias, (None, True))
+    if pin_num is None:
+        return {'error': 'Alias not mapped to a valid pin', 'alias': alias}
+    # Pins without auto_off stay on indefinitely until manually stopped
+    activate_pins([pin_num], duration, hold=() if auto_off else (pin_num,),
+                  source=source, labels={pin_num: alias}, conflicts=index.alias_conflicts.get(alias))
+    return {'success': True, 'alias': alias, 'pin': pin_num, 'duration': duration, 'auto_off': auto_off}
+
+
+def _run_group(group, duration, source='ui'):
+    """Switch a whole group on or off depending on the group's `action`."""
+    action, labels, hold, conflicts = _group_pins(group)
+    # Switch the whole group at once (pin locks taken in a consistent order)
+    if action == 'on':
+        if labels:
+            activate_pins(list(labels), duration, hold=hold, source=source, labels=labels,
+                          conflicts=conflicts)
+    else:
+        pins_off(list(labels), source=source, labels=labels)
+    return {
+        'success': True,
+        'group': group,
+        'activated': [{'alias': alias, 'pin': pin} for pin, alias in labels.items()],
+        'duration': duration,
+        'group_action': action,
+    }
+
+
+def _stop_target(target, source='ui'):
+    """Turn off an alias, a group, or every output (target None)."""
+    if target is None:
+        pins_off(ALL_OUTPUTS, source=source)
+        return {'success': True, 'stopped': 'all'}
+    cfg = config.snapshot
+    if target in cfg.aliases:
+        pin_num, _ = _alias_pin(target)
+        if pin_num is None:
+            return {'error': 'Alias not mapped to a valid GPIO pin', 'target': target}
+        pins_off([pin_num], source=source, labels={pin_num: target})
+        return {'success': True, 'stopped': target, 'pin': pin_num}
+    if target in cfg.groups:
+        labels = _group_pins(target)[1]
+        pins_off(list(labels), source=source, labels=labels)
+        return {'success': True, 'stopped': list(labels.values())}
+    return {'error': 'Unknown target for stop', 'target': target}
+
+
+class _PinPlanHandler(command_lang.PlanHandler):
+    """Runs command-language plans against the pins.
+
+    Activations return at once (pins turn off on their own timers) and
+    the executor waits between sequence steps. A plan started before an
+    emergency stop never resumes after it, even once the e-stop is reset.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.epoch = estop_epoch
+
+    def activate(self, target, duration):
+        if estop_engaged or self.epoch != estop_epoch:
+            raise EmergencyStopActive('Emergency stop engaged')
+        cfg = config.snapshot
+        if target in cfg.groups:
+            return _run_group(target, duration, self.source)
+        if target in cfg.aliases:
+            return _run_alias(target, duration, self.source)
+        return {'error': 'Unknown target', 'target': target}
+
+    def stop(self, target):
+        return _stop_target(target, self.source)
+
+
+def run_program(text, source='ui'):
+    """Compile and run a command-language program (see command_lang.py).
+
+    Programs that complete immediately run inline and return each step's
+    result; timed sequences run on a background thread. Raises
+    CommandSyntaxError for invalid text.
+    """
+    return _run_plan(compile_program(text), text, source)
+
+
+def _run_plan(plan, text, source):
+    """run_program for a program compiled beforehand."""
+    cfg = config.snapshot
+    unknown = [name for name in command_lang.targets(plan) if name not in cfg.groups and name not in cfg.aliases]
+    if unknown:
+        return {'error': 'Unknown target', 'targets': unknown, 'program': text}
+    handler = _PinPlanHandler(source)
+    runtime = command_lang.blocking_time(plan)
+    if not runtime:
+        return {'success': True, 'program': text, 'results': command_lang.execute(plan, handler)}
+
+    def run():
+        try:
+            command_lang.execute(plan, handler)
+        except EmergencyStopActive:
+            command_log.warning('Program aborted by emergency stop: %s', text)
+        except InterlockConflict as e:
+            command_log.warning('Program stopped by interlock (%s): %s', e, text)
+        except Exception:
+            command_log.exception('Program failed: %s', text)
+
+    threading.Thread(target=run, name='program', daemon=True).start()
+    return {'success': True, 'program': text, 'background': True, 'runtime': runtime}
+
+
+# ---- GPIO inputs and edge rules (config INPUTS / RULES, see gpio_inputs.py) ----
+# Input pins are watched with edge-detection callbacks. Each edge looks
+# up the rules filed under its pin and runs their precompiled programs
+# right in the callback, so a bumper can stop the motors without waiting
+# for a poll or a thread switch.
+def _run_rule(rule):
+    try:
+        result = _run_plan(rule.plan, rule.program, 'input')
+    except (EmergencyStopActive, InterlockConflict) as e:
+        result = {'error': str(e)}
+    if 'error' in result:
+        command_log.warning('Input rule %s failed: %s', rule.name, result['error'], extra={'result': result})
+    else:
+        command_log.debug('Input rule %s ran: %s', rule.name, rule.program)
+    return result
+
+
+input_watcher = InputWatcher(GPIO, _run_rule)
+_inputs_lock = threading.Lock()
+
+
+def sync_inputs(cfg):
+    """Bring the input pins and rules in line with a config snapshot; returns the output pins.
+
+    A pin that becomes an input is turned off and dropped from
+    ALL_OUTPUTS before it is set up as an input, and one that stops
+    being an input is set up as an output before it is added back.
+    """
+    global output_pins, ALL_OUTPUTS
+    with _inputs_lock:
+        watched = input_watcher.index
+        if watched is not None and watched.version >= cfg.version:
+            return output_pins
+        inputs = input_pins(cfg.gpio_pins, cfg.inputs, VALID_PINS)
+        outputs = frozenset(VALID_PINS.difference(inputs))
+        ALL_OUTPUTS = sorted(outputs & output_pins)
+        index = InputIndex(cfg.version, cfg.inputs, cfg.rules, cfg.gpio_pins, VALID_PINS)
+        changed = set(inputs).symmetric_difference(watched.pins if watched is not None else ())
+        with _locked_pins(changed):
+            on = [pin for pin in inputs if pin in active_pins]
+            if on:
+                GPIO.output(on, GPIO.LOW)
+                _publish(dict.fromkeys(on, _OFF), 'system')
+            input_watcher.apply(index)
+        output_pins = outputs
+        ALL_OUTPUTS = sorted(outputs)
+        return outputs
+
+
+group_index()
+
+
+# ---- Leases ----
+# A lease holds an alias or group on for as long as its client keeps
+# renewing it. Renewal only stores a new expiry in the lease (no thread,
+# no publish); one reaper thread sleeps until the earliest entry of a heap
+# of expiries and turns off the pins of leases that lapsed. A renewed
+# lease's stale entry is pushed again at its new expiry when it comes up,
+# so each wake costs O(log n) rather than a scan of every lease. Leases on
+# the same pins are counted per pin: a pin goes off with the last of them,
+# and only if a lease made its hold (see lease_held).
+LEASE_TTL = float(os.environ.get('ROBOTCLI_LEASE_TTL', 2.0))
+LEASE_MAX_TTL = 60.0
+leases = {}
+_lease_cond = threading.Condition()
+_lease_heap = []    # (expires, lease id); entries may be stale
+_lease_counts = {}  # pin -> number of live leases on it
+_lease_reaper = None
+
+
+class _Lease:
+    __slots__ = ('id', 'target', 'labels', 'ttl', 'expires')
+
+    def __init__(self, target, labels, ttl):
+        self.id = secrets.token_urlsafe(9)
+        self.target = target
+        self.labels = labels
+        self.ttl = ttl
+        self.expires = time.monotonic() + ttl
+
+    def to_dict(self, now):
+        return {'lease': self.id, 'target': self.target, 'pins': list(self.labels),
+                'ttl': self.ttl, 'expires_in': max(0.0, self.expires - now)}
+
+
+def _lease_ttl(value):
+    ttl = LEASE_TTL if value is None else parse_duration(value)
+    if not 0 < ttl <= LEASE_MAX_TTL:
+        raise ValueError(f'ttl must be between 0 and {LEASE_MAX_TTL:g} seconds')
+    return ttl
+
+
+def _uncount_lease(lease):
+    """Drop a lease from the per-pin counts; returns the pins it was the last lease on.
+
+    Callers hold _lease_cond.
+    """
+    last = []
+    for pin in lease.labels:
+        count = _lease_counts[pin] - 1
+        if count:
+            _lease_counts[pin] = count
+        else:
+            del _lease_counts[pin]
+            last.append(pin)
+    return last
+
+
+def _end_lease(lease, source):
+    """Uncount a lease that has left `leases` and turn off the lease-made
+    holds no other live lease covers."""
+    with _lease_cond:
+        last = _uncount_lease(lease)
+    if not last:
+        return
+    with _locked_pins(last):
+        with _lease_cond:
+            # A new lease may have taken a pin since; it keeps it on
+            held = [pin for pin in last if pin not in _lease_counts and pin in lease_held
+                    and active_pins.get(pin, _OFF) is None]
+        if held:
+            GPIO.output(held, GPIO.LOW)
+            _publish(dict.fromkeys(held, _OFF), source, lease.labels)
+
+
+def _reap_leases():
+    with _lease_cond:
+        while True:
+            now = time.monotonic()
+            lapsed = []
+            while _lease_heap and _lease_heap[0][0] <= now:
+                _, lease_id = heapq.heappop(_lease_heap)
+                lease = leases.get(lease_id)
+                if lease is None:
+                    continue  # released
+                if lease.expires > now:
+                    heapq.heappush(_lease_heap, (lease.expires, lease_id))  # renewed
+                    continue
+                del leases[lease_id]
+                lapsed.append(lease)
+            if lapsed:
+                _lease_cond.release()
+                try:
+                    for lease in lapsed:
+                        _end_lease(lease, 'timer')
+                        command_log.info('Lease %s on %s expired', lease.id, lease.target)
+                finally:
+                    _lease_cond.acquire()
+                continue
+            _lease_cond.wait(_lease_heap[0][0] - now if _lease_heap else None)
+
+
+def create_lease(target, ttl=None, source='ui'):
+    """Turn an alias or group on, held until the lease lapses or is released."""
+    global _lease_reaper
+    ttl = _lease_ttl(ttl)
+    index = group_index()
+    if target in index.alias_pins:
+        pin_num = index.alias_pins[target][0]
+        if pin_num is None:
+            return {'error': 'Alias not mapped to a valid GPIO pin', 'target': target}
+        labels, conflicts = {pin_num: target}, index.alias_conflicts.get(target)
+    elif target in index.groups and index.groups[target].action == 'on':
+        labels, conflicts = index.groups[target].labels, index.groups[target].conflicts
+    else:
+        return {'error': 'Unknown target', 'target': target}
+    lease = _Lease(target, labels, ttl)
+    # Counted before the pins go on, so a lease ending meanwhile on the
+    # same pins leaves them on
+    with _lease_cond:
+        for pin in labels:
+            _lease_counts[pin] = _lease_counts.get(pin, 0) + 1
+    try:
+        pins_on(dict.fromkeys(labels), source, labels, conflicts, lease=True)
+    except BaseException:
+        _end_lease(lease, source)
+        raise
+    with _lease_cond:
+        lease.expires = time.monotonic() + ttl
+        leases[lease.id] = lease
+        heapq.heappush(_lease_heap, (lease.expires, lease.id))
+        if _lease_reaper is None:
+            _lease_reaper = threading.Thread(target=_reap_leases, name='lease-reaper', daemon=True)
+            _lease_reaper.start()
+        _lease_cond.notify()
+    return dict(lease.to_dict(time.monotonic()), success=True)
+
+
+def renew_lease(lease_id, ttl=None):
+    """Push a lease's expiry out by its TTL; None if it has lapsed or its pins were stopped."""
+    with _lease_cond:
+        lease = leases.get(lease_id)
+        if lease is None:
+            return None
+        if not any(active_pins.get(pin, _OFF) is None for pin in lease.labels):
+            # Stopped or e-stopped since: the lease has nothing left to hold
+            del leases[lease_id]
+            _uncount_lease(lease)
+            return None
+        if ttl is not None:
+            lease.ttl = ttl
+        lease.expires = time.monotonic() + lease.ttl
+        return lease
+
+
+def release_lease(lease_id, source='ui'):
+    with _lease_cond:
+        lease = leases.pop(lease_id, None)
+    if lease is not None:
+        _end_lease(lease, source)
+    return lease
+
+
+# ---- Scheduled jobs (see scheduler.py) ----
+# Recurring and one-shot programs, kept in schedule.json next to
+# config.json and run through run_program like any other command.
+SCHEDULE_TICK = float(os.environ.get('ROBOTCLI_SCHEDULE_TICK', 1.0))
+
+
+def _run_scheduled(job):
+    try:
+        result = run_program(job.program, source='schedule')
+    except (EmergencyStopActive, InterlockConflict) as e:
+        result = {'error': str(e)}
+    if 'error' in result:
+        command_log.warning('Scheduled job %s failed: %s', job.id, result['error'], extra={'result': result})
+    else:
+        command_log.info('Scheduled job %s ran: %s', job.id, job.program)
+    return result
+
+
+scheduler = Scheduler(os.path.join(os.path.dirname(config.CONFIG_FILE), 'schedule.json'),
+                      run=_run_scheduled, tick=SCHEDULE_TICK)
+scheduler.load()
+scheduler.start()
+
+
+# ---- UDP teleop (packet format in teleop.py) ----
+# Each accepted datagram holds its pins on for hold_ms; pins the session
+# held before but did not repeat turn off at once. One thread receives
+# datagrams and expires lapsed holds, using the receive timeout as its
+# timer, so no thread is started per packet. Packets name the epoch of
+# the listener they were sent to, and a session's last sequence number is
+# kept for as long as that listener runs, so captured packets cannot be
+# replayed after a restart or after their session went idle.
+TELEOP_MAX_AGE_MS = int(os.environ.get('ROBOTCLI_TELEOP_MAX_AGE_MS', 250))
+TELEOP_MAX_SESSIONS = 64
+teleop_stats = {'accepted': 0, 'bad': 0, 'wrong_epoch': 0, 'out_of_order': 0, 'stale': 0, 'rejected': 0}
+teleop_port = None
+teleop_epoch = None
+_teleop_table = None
+
+
+def teleop_targets():
+    """(index, table version, names, pin tuples) for the current config; ids index names."""
+    global _teleop_table
+    index = group_index()
+    table = _teleop_table
+    if table is None or table[0] is not index:
+        names = sorted(index.alias_pins) + sorted(
+            name for name, flat in index.groups.items()
+            if name not in index.alias_pins and flat.action == 'on')
+        pins = []
+        for name in names:
+            if name in index.alias_pins:
+                pin_num = index.alias_pins[name][0]
+                pins.append(() if pin_num is None else (pin_num,))
+            else:
+                pins.append(tuple(index.groups[name].labels))
+        table = _teleop_table = (index, index.version & 0xFFFF, names, pins)
+    return table
+
+
+class _TeleopSession:
+    __slots__ = ('min_delay', 'held', 'seen')
+
+    def __init__(self):
+        self.min_delay = None
+        self.held = {}  # pin -> end_time we published
+        self.seen = time.monotonic()
+
+
+def _teleop_release(held, pins, source):
+    """Turn off pins a session held, unless something else has taken them over."""
+    with _locked_pins(pins):
+        ours = [pin for pin in pins if active_pins.get(pin) == held.pop(pin)]
+        if ours:
+            GPIO.output(ours, GPIO.LOW)
+            _publish(dict.fromkeys(ours, _OFF), source)
+
+
+def _teleop_pins(packet):
+    """Pins and labels a packet asks for, or None if it names unknown pins/targets."""
+    if isinstance(packet.targets, int):
+        pins = bits(packet.targets)
+        if any(pin not in output_pins for pin in pins):
+            return None
+        return pins, None
+    index, version, names, table = teleop_targets()
+    if packet.table != version:
+        return None
+    labels = {}
+    for target in packet.targets:
+        if target >= len(names):
+            return None
+        for pin in table[target]:
+            labels.setdefault(pin, names[target])
+    return list(labels), labels
+
+
+def _teleop_handle(sessions, last_seqs, packet, recv_ms):
+    """Apply one authenticated packet; returns False if it was dropped.
+
+    `last_seqs` (session id -> newest sequence number) outlives the
+    sessions evicted from `sessions`.
+    """
+    last_seq = last_seqs.get(packet.session)
+    if last_seq is not None and not teleop.newer(packet.seq, last_seq):
+        teleop_stats['out_of_order'] += 1
+        return False
+    session = sessions.get(packet.session)
+    if session is None:
+        if len(sessions) >= TELEOP_MAX_SESSIONS:
+            idle = [sid for sid, s in sessions.items() if not s.held]
+            if not idle:
+                teleop_stats['rejected'] += 1
+                return False
+            del sessions[min(idle, key=lambda sid: sessions[sid].seen)]
+        session = sessions[packet.session] = _TeleopSession()
+    last_seqs[packet.session] = packet.seq
+    session.seen = time.monotonic()
+
+    # One-way delay relative to the best seen from this sender; clocks need
+    # not be synchronized since only the difference matters
+    delay = (recv_ms - packet.sent_ms) & 0xFFFFFFFF
+    if session.min_delay is None or delay < session.min_delay:
+        session.min_delay = delay
+    elif delay - session.min_delay > TELEOP_MAX_AGE_MS:
+        teleop_stats['stale'] += 1
+        return False
+
+    wanted = _teleop_pins(packet)
+    if wanted is None:
+        teleop_stats['rejected'] += 1
+        return False
+    pins, labels = wanted
+    if not packet.hold_ms:
+        pins = []
+    dropped = [pin for pin in session.held if pin not in pins]
+    if dropped:
+        _teleop_release(session.held, dropped, 'teleop')
+    if pins:
+        conflicts = group_index().conflicts_for(pins)
+        if conflicts is not None and conflicts.queue:
+            # A joystick cannot wait in a queue: treat it as reject
+            conflicts = conflicts._replace(reject=conflicts.reject + conflicts.queue, queue=())
+        end_time = time.time() + packet.hold_ms / 1000.0
+        try:
+            deadlines = pins_on(dict.fromkeys(pins, end_time), 'teleop', labels, conflicts)
+        except (EmergencyStopActive, InterlockConflict):
+            teleop_stats['rejected'] += 1
+            return False
+        session.held.update(deadlines)
+    teleop_stats['accepted'] += 1
+    return True
+
+
+def _teleop_loop(sock, key, epoch):
+    sessions = {}
+    # Only key holders can add entries, one per client run
+    last_seqs = {}
+    while True:
+        now = time.time()
+        next_expiry = None
+        for session in sessions.values():
+            lapsed = [pin for pin, end in session.held.items() if end <= now]
+            if lapsed:
+                _teleop_release(session.held, lapsed, 'timer')
+            for end in session.held.values():
+                if next_expiry is None or end < next_expiry:
+                    next_expiry = end
+        sock.settimeout(None if next_expiry is None else max(0.001, next_expiry - now))
+        try:
+            data, addr = sock.recvfrom(512)
+        except socket.timeout:
+            continue
+        except OSError:
+            return  # socket closed
+        recv_ms = int(time.monotonic() * 1000) & 0xFFFFFFFF
+        try:
+            packet = teleop.decode(key, data)
+        except teleop.BadPacket:
+            teleop_stats['bad'] += 1
+            continue
+        if packet.epoch != epoch:
+            teleop_stats['wrong_epoch'] += 1
+            continue
+        try:
+            if _teleop_handle(sessions, last_seqs, packet, recv_ms):
+                sock.sendto(teleop.encode_ack(key, packet.seq, on_mask), addr)
+        except Exception:
+            command_log.exception('Teleop packet failed')
+
+
+def start_teleop(port, key, host='0.0.0.0'):
+    """Listen for teleop datagrams on a daemon thread; returns the bound port.
+
+    Each start draws a new epoch, so packets sent to an earlier listener
+    are refused.
+    """
+    global teleop_port, teleop_epoch
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind((host, port))
+    teleop_port = sock.getsockname()[1]
+    teleop_epoch = secrets.randbits(32)
+    key = key.encode() if isinstance(key, str) else key
+    threading.Thread(target=_teleop_loop, args=(sock, key, teleop_epoch), name='teleop', daemon=True).start()
+    logger.info('Teleop listening on udp/%d', teleop_port)
+    return teleop_port
+
+
+# Optional request capture for offline replay (see replay.py).
+# Enable with ROBOTCLI_CAPTURE_LOG=/path/to/requests.jsonl
+capture = None
+if os.environ.get('ROBOTCLI_CAPTURE_LOG'):
+    capture = RequestCapture(
+        os.environ['ROBOTCLI_CAPTURE_LOG'],
+        max_bytes=int(os.environ.get('ROBOTCLI_CAPTURE_MAX_BYTES', 10 * 1024 * 1024)),
+    )
+
+    @app.before_request
+    def _capture_start():
+        g.capture_t0 = time.perf_counter()
+
+    @app.after_request
+    def _capture_request(response):
+        if request.path.startswith('/api/'):
+            latency_ms = (time.perf_counter() - g.capture_t0) * 1000.0
+            route = request.full_path.rstrip('?')
+            capture.record(time.time(), request.method, route,
+                           request.get_json(silent=True), response.status_code, latency_ms)
+        return response
+
+
+# ---- Web UI assets ----
+# Built once at startup: minified, content-hashed and precompressed (see
+# static_assets.py). The HTML shell is rendered once with the hashed URLs.
+assets = static_assets.AssetBundle(os.path.join(app.root_path, 'static')).build()
+index_page = static_assets.make_asset(
+    'index.html', '/',
+    static_assets.minify_html(app.jinja_env.get_template('index.html').render(asset=assets.url)).encode('utf-8'),
+    static_assets.REVALIDATE)
+
+
+def _send_asset(asset):
+    coding = static_assets.choose_encoding(asset, request.accept_encodings)
+    etag = asset.etag if coding == 'identity' else f'{asset.etag}-{coding}'
+    headers = {'Cache-Control': asset.cache_control, 'ETag': f'"{etag}"', 'Vary': 'Accept-Encoding'}
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
+    if coding != 'identity':
+        headers['Content-Encoding'] = coding
+    return Response(asset.encodings[coding], content_type=asset.mimetype, headers=headers)
+
+
 @app.route('/')
 def index():
     """Serve the main GUI"""
-    return render_template('index.html')
+    return _send_asset(index_page)
+
+
+@app.route('/static/<name>')
+def serve_static(name):
+    asset = assets.get(name)
+    if asset is None:
+        return jsonify({'error': 'Not found'}), 404
+    return _send_asset(asset)
 
 
 @app.route('/api/config', methods=['GET'])
 def get_config():
     """Return aliases and groups configuration"""
+    cfg = config.snapshot
     return jsonify({
-        'aliases': ALIASES,
-        'groups': GROUPS,
-        'gpio_pins': GPIO_PINS
+        'version': cfg.version,
+        'aliases': cfg.aliases,
+        'groups': cfg.groups,
+        'interlocks': cfg.interlocks,
+        'inputs': cfg.inputs,
+        'rules': cfg.rules,
+        'gpio_pins': cfg.gpio_pins,
+        'gpio_settings': cfg.gpio_settings,
     })
 
 
 # ---- AI Integration Endpoints ----
+# Chat history is kept here per conversation id, trimmed to a token budget
+# (see ai_sessions.py); the UI only sends its new message.
+AI_HISTORY_TOKENS = int(os.environ.get('ROBOTCLI_AI_HISTORY_TOKENS', 1500))
+ai_conversations = ConversationStore(
+    budget=AI_HISTORY_TOKENS,
+    max_conversations=int(os.environ.get('ROBOTCLI_AI_CONVERSATIONS', 64)),
+    ttl=float(os.environ.get('ROBOTCLI_AI_CONVERSATION_TTL', 3600.0)))
+
+# Provider calls: total time limit, retries with jittered backoff, an
+# optional hedge after ROBOTCLI_AI_HEDGE_AFTER seconds, and a circuit
+# breaker that fails fast while the provider is down (see ai_provider.py)
+AI_TIMEOUT = float(os.environ.get('ROBOTCLI_AI_TIMEOUT', 20.0))
+AI_RETRIES = int(os.environ.get('ROBOTCLI_AI_RETRIES', 2))
+AI_HEDGE_AFTER = float(os.environ.get('ROBOTCLI_AI_HEDGE_AFTER', 0)) or None
+AI_BREAKER_FAILURES = int(os.environ.get('ROBOTCLI_AI_BREAKER_FAILURES', 5))
+AI_BREAKER_RESET = float(os.environ.get('ROBOTCLI_AI_BREAKER_RESET', 30.0))
+_ai_provider = None
+
+
+def ai_provider():
+    """ChatProvider for the current AI settings; rebuilt (with a fresh
+    breaker) only when the base URL, key or model change."""
+    global _ai_provider
+    ai = config.AI_SETTINGS
+    settings = (ai.get('base_url') or os.environ.get('ROBOTCLI_AI_BASE_URL') or DEFAULT_BASE_URL,
+                ai.get('api_key'), ai.get('model'))
+    provider = _ai_provider
+    if provider is None or provider.settings != settings:
+        provider = ChatProvider(*settings, timeout=AI_TIMEOUT, retries=AI_RETRIES, hedge_after=AI_HEDGE_AFTER,
+                                breaker=CircuitBreaker(AI_BREAKER_FAILURES, AI_BREAKER_RESET))
+        provider.settings = settings
+        _ai_provider = provider
+    return provider
+
+
 def generate_ai_schema():
     """Dynamically generate a JSON Schema that describes valid AI commands.
 
@@ -122,16 +1048,35 @@ def generate_ai_schema():
     AI can discover exactly what it can control. Additionally supports
     an array-of-commands payload for multi-command execution.
     """
-    aliases = list(ALIASES.keys())
-    groups = list(GROUPS.keys())
+    single_cmd = _ai_command_schema(config.snapshot)
+    schema = {
+        'title': 'RobotCLI AI Command Schema',
+        'description': 'Either a single command object or an array of command objects (multi-command).',
+        'oneOf': [
+            single_cmd,
+            {
+                'type': 'array',
+                'items': single_cmd,
+                'minItems': 1
+            }
+        ]
+    }
+    return schema
+
+
+def _ai_command_schema(cfg):
+    """JSON Schema of one AI command for the aliases and groups of `cfg`."""
+    aliases = list(cfg.aliases.keys())
+    groups = list(cfg.groups.keys())
 
     single_cmd = {
         'title': 'RobotCLI AI Single Command',
         'type': 'object',
         'properties': {
-            'action': {'type': 'string', 'enum': ['activate_alias', 'activate_group', 'stop', 'status']},
+            'action': {'type': 'string', 'enum': ['activate_alias', 'activate_group', 'stop', 'run', 'status']},
             'target': {'type': 'string'},
             'duration': {'type': 'number', 'minimum': 0.0},
+            'program': {'type': 'string'},
         },
         'required': ['action'],
         'oneOf': [
@@ -158,6 +1103,15 @@ def generate_ai_schema():
                 },
                 'required': ['action', 'target']
             },
+            {
+                'description': 'Timed sequence in the RobotCLI command language, '
+                               'e.g. "forward(2); left(500ms); stop" or "forward(2) & alarm(1)"',
+                'properties': {
+                    'action': {'const': 'run'},
+                    'program': {'type': 'string'}
+                },
+                'required': ['action', 'program']
+            },
             {
                 'properties': {
                     'action': {'const': 'status'}
@@ -166,54 +1120,115 @@ def generate_ai_schema():
             }
         ]
     }
+    return single_cmd
 
-    schema = {
-        'title': 'RobotCLI AI Command Schema',
-        'description': 'Either a single command object or an array of command objects (multi-command).',
-        'oneOf': [
-            single_cmd,
-            {
-                'type': 'array',
-                'items': single_cmd,
-                'minItems': 1
-            }
-        ]
-    }
-    return schema
+
+# The command schema compiled to a function (see schema_compile.py). It
+# only depends on the alias and group names, so a config change that
+# keeps them (a remapped pin, an interlock) reuses the compiled one.
+_ai_validator = None    # (config version, (alias names, group names), validate)
+
+
+def ai_command_validator():
+    """validate(cmd) -> None or an error message, for the current config."""
+    global _ai_validator
+    cfg = config.snapshot
+    cached = _ai_validator
+    if cached is None or cached[0] != cfg.version:
+        names = (tuple(cfg.aliases), tuple(cfg.groups))
+        if cached is None or cached[1] != names:
+            validate = compile_schema(_ai_command_schema(cfg))
+        else:
+            validate = cached[2]
+        cached = _ai_validator = (cfg.version, names, validate)
+    return cached[2]
+
+
+def validate_ai_commands(commands):
+    """Normalize durations and check every command before any runs.
+
+    Returns (invalid, plans): a list of {'index', 'error', 'cmd'} for the
+    invalid commands (empty when the whole batch may run), and each
+    command's compiled program (None for actions other than `run`).
+    """
+    validate = ai_command_validator()
+    invalid = []
+    plans = []
+    for i, cmd in enumerate(commands):
+        error, plan = _check_ai_command(cmd, validate)
+        if error is not None:
+            invalid.append({'index': i, 'error': error, 'cmd': cmd})
+        plans.append(plan)
+    return invalid, plans
+
+
+def _check_ai_command(cmd, validate):
+    """(error or None, compiled program or None) for one command.
+
+    The schema only sees that a `run` program is a string, so the program
+    is compiled and its targets looked up here too: a batch with a
+    program that cannot run is refused before any of it runs.
+    """
+    error = _normalize_ai_command(cmd) or validate(cmd)
+    if error is not None or cmd['action'] != 'run':
+        return error, None
+    try:
+        plan = compile_program(cmd['program'])
+    except CommandSyntaxError as e:
+        return f'program: {e}', None
+    cfg = config.snapshot
+    unknown = [name for name in command_lang.targets(plan) if name not in cfg.groups and name not in cfg.aliases]
+    if unknown:
+        return f'program: unknown target {", ".join(unknown)}', None
+    return None, plan
+
+
+def _normalize_ai_command(cmd):
+    # Durations may arrive as text ('2s', 'two minutes'); the schema wants seconds
+    if isinstance(cmd, dict) and 'duration' in cmd:
+        try:
+            cmd['duration'] = parse_duration(cmd['duration'])
+        except ValueError as e:
+            return f'duration: {e}'
+    return None
 
 
 @app.route('/api/ai/config', methods=['GET'])
 def get_ai_config():
     """Return current AI configuration (key masked) and a boolean flag indicating if a key is configured."""
-    masked = AI_SETTINGS.copy()
-    has_key = bool(AI_SETTINGS.get('api_key'))
+    masked = config.AI_SETTINGS.copy()
+    has_key = bool(masked.get('api_key'))
     if masked.get('api_key'):
         masked['api_key'] = '****' + (masked['api_key'][-4:] if isinstance(masked['api_key'], str) else '')
     masked['api_key_configured'] = has_key
+    if _ai_provider is not None:
+        masked['provider'] = _ai_provider.to_dict()
     return jsonify(masked)
 
 
 @app.route('/api/ai/register', methods=['POST'])
 def register_ai():
-    """Register or update AI settings (key, model, enabled)."""
+    """Register or update AI settings (key, model, base URL, enabled).
+
+    An omitted api_key or base_url keeps the stored one.
+    """
     data = request.json or {}
-    api_key = data.get('api_key')
     model = data.get('model')
     enabled = bool(data.get('enabled', True))
 
-    AI_SETTINGS['api_key'] = api_key
-    AI_SETTINGS['model'] = model
-    AI_SETTINGS['enabled'] = enabled
-    save_config()
+    with config.edit() as draft:
+        api_key = data.get('api_key') or draft.ai_settings.get('api_key')
+        base_url = data.get('base_url', draft.ai_settings.get('base_url')) or None
+        draft.ai_settings = {'api_key': api_key, 'model': model, 'base_url': base_url, 'enabled': enabled}
 
     masked_key = None
-    if AI_SETTINGS.get('api_key'):
-        ak = AI_SETTINGS['api_key']
-        masked_key = '****' + (ak[-4:] if isinstance(ak, str) and len(ak) > 4 else '')
+    if api_key:
+        masked_key = '****' + (api_key[-4:] if isinstance(api_key, str) and len(api_key) > 4 else '')
 
     return jsonify({'success': True, 'ai': {
-        'enabled': AI_SETTINGS['enabled'],
-        'model': AI_SETTINGS['model'],
+        'enabled': enabled,
+        'model': model,
+        'base_url': base_url,
         'api_key': masked_key
     }})
 
@@ -232,16 +1247,28 @@ def ai_chat():
     and a JSON array "commands" containing one or more commands that conform to
     the generated schema. The server will validate/parse and execute those commands
     safely (simple validation), then return the model's response back to the UI.
+
+    Earlier turns come from the server-side conversation named by
+    `conversation` (returned by the previous call); a new one is started
+    when it is missing or expired. Clients without one may still send
+    their own `history` list, which seeds a new conversation.
+
+    The reply is streamed from the provider and each command runs as soon
+    as its JSON object is complete. With `stream: true` the caller gets
+    that progress as newline-delimited JSON events (see _ai_chat_events);
+    otherwise one JSON body once the reply has finished.
     """
     data = request.json or {}
     user_msg = data.get('message')
+    conversation_id = data.get('conversation')
     history = data.get('history')
     # For chat coming from the local UI we use the stored AI_SETTINGS api key
     # and therefore do not require the caller to present the key. We still
     # require AI integration to be enabled and a server-side API key to exist.
-    if not AI_SETTINGS.get('enabled'):
+    ai_settings = config.AI_SETTINGS
+    if not ai_settings.get('enabled'):
         return jsonify({'error': 'AI access disabled'}), 400
-    if not AI_SETTINGS.get('api_key'):
+    if not ai_settings.get('api_key'):
         return jsonify({'error': 'AI API key not configured on server'}), 400
     if not user_msg:
         return jsonify({'error': 'Missing message'}), 400
@@ -254,258 +1281,203 @@ def ai_chat():
     system_prompt = (
         "You are a RobotCLI assistant. When given a user instruction, produce a JSON object only. "
         "Format exactly as: {\"response\":\"<short human-readable reply>\", \"commands\": [ ... ]}. "
-        "Commands must follow the RobotCLI AI Command Schema: actions: activate_alias, activate_group, stop, status. "
+        "Commands must follow the RobotCLI AI Command Schema: actions: activate_alias, activate_group, stop, run, status. "
+        "Use run with a `program` string for timed sequences: steps separated by ';' run one after another, "
+        "steps joined by '&' run together, e.g. {\"action\":\"run\",\"program\":\"forward(2); left(1.5); stop\"}. "
         "Durations must be numbers and expressed in seconds (e.g., 40). Do not include units or string values in the JSON `duration` field. "
         "If provided, consider previous messages in the `history` array to interpret user intent and context. "
         "Example: {\"response\":\"Okay, turning on the light\", \"commands\": [{\"action\":\"activate_alias\",\"target\":\"led_1\",\"duration\":40}]}" 
         "Return no additional text, explanation, or code fences. Keep the response short (one sentence)."
     )
 
-    # Prepare messages for OpenAI-like chat completion
-    messages = [
-        { 'role': 'system', 'content': system_prompt },
-        { 'role': 'user', 'content': user_msg }
-    ]
-
-    # Build final messages for provider: system + history (if any) + user message
+    # Build final messages for provider: system + stored history (already
+    # within the token budget) + user message
+    if not conversation_id and history:
+        conversation_id = ai_conversations.seed(history)
     prov_messages = [ { 'role': 'system', 'content': system_prompt } ]
-    # 'history' is an array of { role: 'user'|'assistant'|'system', content: '...' }
-    if isinstance(history, list):
-        # Only include up to last 12 messages
-        for h in history[-12:]:
-            r = h.get('role') if isinstance(h.get('role'), str) else 'user'
-            c = h.get('content') if isinstance(h.get('content'), str) else str(h.get('content', ''))
-            if r not in ('user', 'assistant', 'system'):
-                r = 'user'
-            prov_messages.append({ 'role': r, 'content': c })
-    # Finally append the current user message
+    prov_messages += ai_conversations.history(conversation_id)
     prov_messages.append({ 'role': 'user', 'content': user_msg })
 
-    logger.info('Sending %d messages to provider', len(prov_messages))
+    ai_log.info('Sending %d messages to provider', len(prov_messages))
 
-    # Call provider (OpenAI-compatible)
+    # Call provider (OpenAI-compatible). The first piece is awaited here so
+    # that a provider that cannot be reached still gets a proper status.
     try:
-        resp = requests.post(
-            'https://api.openai.com/v1/chat/completions',
-            headers={
-                'Authorization': 'Bearer ' + AI_SETTINGS['api_key'],
-                'Content-Type': 'application/json'
-            },
-            json={
-                'model': AI_SETTINGS.get('model') or 'gpt-4o-mini',
-                'messages': prov_messages,
-                'temperature': 0.0,
-                'max_tokens': 512
-            },
-            timeout=20
-        )
-    except Exception as e:
-        logger.exception('Provider request failed')
-        return jsonify({'error': f'Provider request failed: {e}'}), 502
+        chunks = ai_provider().stream(prov_messages)
+        first = next(chunks, '')
+    except CircuitOpen as e:
+        return jsonify({'error': str(e)}), 503
+    except ProviderError as e:
+        return jsonify(_provider_error(e)), 502
+
+    events = _ai_chat_events(first, chunks, conversation_id, user_msg)
+    if data.get('stream'):
+        lines = (json.dumps(event, separators=(',', ':')) + '\n' for event in events)
+        return Response(lines, mimetype='application/x-ndjson',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    for event in events:
+        pass
+    kind = event.pop('event')
+    return jsonify(event), (502 if kind == 'error' else 200)
+
+
+def _provider_error(e):
+    ai_log.warning('Provider request failed: %s', e, extra={'status': e.status})
+    # Include limited provider details for easier debugging
+    out = {'error': str(e)}
+    if e.status is not None:
+        out['status'] = e.status
+    if e.details:
+        out['details'] = e.details
+    return out
+
+
+def _ai_chat_events(first, chunks, conversation_id, user_msg):
+    """Parse the streamed reply and run each command once it is complete.
+
+    Yields {'event': 'reply', 'reply'} when the model's short reply is
+    complete, {'event': 'executed', 'result'} after each command, and
+    last either {'event': 'done', 'reply', 'executed', 'conversation'}
+    or {'event': 'error', 'error', ...}. Commands already run stay run
+    if the stream fails later.
+    """
+    parser = ReplyParser()
+    validate = ai_command_validator()
+    executed = []
+    rejected = False
+    piece = first
+    try:
+        while piece is not None:
+            for kind, value in parser.feed(piece):
+                if kind == 'response':
+                    yield {'event': 'reply', 'reply': value}
+                    continue
+                # Each command is checked before it runs; after an invalid
+                # one, the rest of the batch does not run
+                if rejected:
+                    res = {'error': 'Not run: an earlier command was invalid', 'cmd': value}
+                elif kind == 'invalid':
+                    res, rejected = {'error': 'Invalid command format', 'cmd': value}, True
+                else:
+                    error, plan = _check_ai_command(value, validate)
+                    if error is None:
+                        res = _execute_ai_command(value, plan)
+                    else:
+                        res, rejected = {'error': 'Invalid command', 'details': error, 'cmd': value}, True
+                executed.append(res)
+                yield {'event': 'executed', 'result': res}
+            if parser.done:
+                break
+            piece = next(chunks, None)
+    except ProviderError as e:
+        yield dict(_provider_error(e), event='error', executed=executed)
+        return
+    finally:
+        # Stop reading once the object has closed, or the client went away
+        chunks.close()
+
+    content = parser.text
+    # Log provider content for debugging (truncated only if the record is emitted)
+    ai_log.debug('AI provider content: %s', Truncated(content, 1000))
+    snippet = (content[:600] + '...') if len(content) > 600 else content
+    if parser.response is None and not parser.commands:
+        # Return provider raw content to help debugging but keep it short
+        ai_log.info('Provider did not return valid JSON with response: %s', snippet)
+        yield {'event': 'error', 'error': 'Provider did not return valid JSON with `response`',
+               'raw': snippet, 'executed': executed}
+        return
+    if not executed:
+        # If the model returned no commands, surface that clearly
+        ai_log.info('Provider returned no commands; content: %s', Truncated(content, 600))
+        yield {'event': 'error', 'error': 'Provider returned no commands', 'raw': snippet, 'executed': executed}
+        return
+
+    # Remember the turn in its compact form for the next request
+    reply = json.dumps({'response': parser.response, 'commands': parser.commands}, separators=(',', ':'))
+    conversation_id = ai_conversations.record(conversation_id, user_msg, reply)
+    # Return only the model's short reply to the UI plus execution report
+    yield {'event': 'done', 'reply': parser.response, 'executed': executed, 'conversation': conversation_id}
 
-    if resp.status_code != 200:
-        # Include limited provider details for easier debugging (truncate to keep responses small)
-        snippet = (resp.text or '')[:400]
-        return jsonify({'error': 'Provider returned error', 'status': resp.status_code, 'details': snippet}), 502
 
+def _execute_ai_command(cmd, plan=None):
+    """Run one validated command (and its compiled program), reporting an exception as its result."""
     try:
-        body = resp.json()
-        content = body['choices'][0]['message']['content']
+        return _execute_single_command(cmd, plan=plan)
     except Exception as e:
-        logger.exception('Malformed provider response')
-        return jsonify({'error': 'Malformed provider response', 'details': str(e)}), 502
+        command_log.exception('Exception executing command')
+        return {'error': 'Execution exception', 'details': str(e), 'cmd': cmd}
 
-    # Log provider content for debugging
-    logger.info('AI provider content: %s', (content[:1000] + '...') if len(content) > 1000 else content)
 
-    # Extract JSON object from content
-    parsed = None
-    try:
-        parsed = json.loads(content)
-    except Exception:
-        # Try to locate a JSON block inside the text
-        start = content.find('{')
-        end = content.rfind('}')
-        if start != -1 and end != -1 and end > start:
-            try:
-                parsed = json.loads(content[start:end+1])
-            except Exception as e:
-                logger.info('Failed to extract JSON from provider content: %s', e)
-                parsed = None
+@app.route('/api/ai/conversation/<conversation_id>', methods=['GET', 'DELETE'])
+def ai_conversation(conversation_id):
+    """GET summarizes a stored conversation; DELETE forgets it."""
+    if request.method == 'DELETE':
+        if not ai_conversations.discard(conversation_id):
+            return jsonify({'error': 'Unknown conversation'}), 404
+        return jsonify({'success': True, 'deleted': conversation_id})
+    conv = ai_conversations.get(conversation_id)
+    if conv is None:
+        return jsonify({'error': 'Unknown conversation'}), 404
+    return jsonify(conv.to_dict())
 
-    if not parsed or 'response' not in parsed:
-        # Return provider raw content to help debugging but keep it short
-        snippet = (content[:600] + '...') if len(content) > 600 else content
-        logger.info('Provider did not return valid JSON with response: %s', snippet)
-        return jsonify({'error': 'Provider did not return valid JSON with `response`', 'raw': snippet}), 502
-
-    logger.info('Parsed provider JSON: %s', parsed)
-    # Validate and execute commands if present
-    commands = parsed.get('commands', [])
-    if not commands:
-        # If the model returned no commands, surface that clearly
-        logger.info('Provider returned no commands; content: %s', content[:600])
-        return jsonify({'error': 'Provider returned no commands', 'raw': (content[:600] + '...') if len(content) > 600 else content}), 502
 
-    executed = []
-    if isinstance(commands, dict):
-        commands = [commands]
-    for cmd in commands:
-        # Basic validation: must have action
-        if not isinstance(cmd, dict) or 'action' not in cmd:
-            executed.append({'error': 'Invalid command format', 'cmd': cmd})
-            continue
-        # Normalize duration if present and not numeric
-        if 'duration' in cmd:
-            try:
-                cmd['duration'] = _parse_duration(cmd['duration'])
-            except ValueError as e:
-                executed.append({'error': 'Invalid duration', 'details': str(e), 'cmd': cmd})
-                continue
-        try:
-            res = _execute_single_command(cmd)
-        except Exception as e:
-            logger.exception('Exception executing command')
-            res = {'error': 'Execution exception', 'details': str(e), 'cmd': cmd}
-        executed.append(res)
+def _execute_single_command(cmd, source='ai', plan=None):
+    """Execute a single normalized command dict and return result dict."""
+    res = _dispatch_command(cmd, source, plan)
+    # One structured record per command; args are formatted by the log thread
+    command_log.info('Command %s -> %s', cmd.get('action') if isinstance(cmd, dict) else None,
+                     'error' if 'error' in res else 'ok', extra={'cmd': cmd, 'result': res})
+    return res
 
-    # Return only the model's short reply to the UI plus execution report
-    return jsonify({'reply': parsed.get('response'), 'executed': executed})
 
+def _dispatch_command(cmd, source='ai', plan=None):
+    """Run one command dict against the pins and return its result dict.
 
-def _execute_single_command(cmd):
-    """Execute a single normalized command dict and return result dict."""
-    logger.info('Executing command: %s', cmd)
+    `plan` is a `run` command's program, compiled during validation.
+    """
     action = cmd.get('action')
     target = cmd.get('target')
     # Parse duration safely and return a helpful error if invalid
-    duration_raw = cmd.get('duration')
-    if duration_raw is None:
-        duration = 1.0
-    else:
-        try:
-            duration = float(duration_raw)
-        except Exception:
-            res = {'error': f'Invalid duration: {duration_raw}', 'cmd': cmd}
-            logger.info('Command result: %s', res)
-            return res
+    try:
+        duration = parse_duration(cmd.get('duration'))
+    except ValueError:
+        return {'error': f"Invalid duration: {cmd.get('duration')}", 'cmd': cmd}
 
+    cfg = config.snapshot
     if action == 'activate_alias':
-        if target not in ALIASES:
-            res = {'error': 'Unknown alias', 'cmd': cmd}
-            logger.info('Command result: %s', res)
-            return res
-        a = ALIASES[target]
-        if isinstance(a, str):
-            config_spot = a
-            auto_off = True
-        else:
-            config_spot = a.get('config_spot')
-            auto_off = bool(a.get('auto_off', True))
-        pin_num = GPIO_PINS.get(config_spot)
-        if pin_num is None or pin_num not in VALID_PINS:
-            res = {'error': 'Alias not mapped to a valid pin', 'cmd': cmd}
-            logger.info('Command result: %s', res)
-            return res
-        if auto_off:
-            activate_pin(pin_num, duration)
-        else:
-            with lock:
-                GPIO.output(pin_num, GPIO.HIGH)
-                active_pins[pin_num] = None
-        res = {'success': True, 'action': action, 'alias': target, 'duration': duration, 'pin': pin_num}
-        logger.info('Command result: %s', res)
-        return res
+        if target not in cfg.aliases:
+            return {'error': 'Unknown alias', 'cmd': cmd}
+        res = _run_alias(target, duration, source)
+        if 'error' in res:
+            return dict(res, cmd=cmd)
+        return dict(res, action=action)
 
     if action == 'activate_group':
-        if target not in GROUPS:
-            res = {'error': 'Unknown group', 'cmd': cmd}
-            logger.info('Command result: %s', res)
-            return res
-        grp = GROUPS[target]
-        aliases = grp.get('aliases', []) if isinstance(grp, dict) else grp
-        activated = []
-        for alias in aliases:
-            if alias in ALIASES:
-                a = ALIASES[alias]
-                if isinstance(a, str):
-                    config_spot = a
-                    auto_off = True
-                else:
-                    config_spot = a.get('config_spot')
-                    auto_off = bool(a.get('auto_off', True))
-                pin_num = GPIO_PINS.get(config_spot)
-                if pin_num is None or pin_num not in VALID_PINS:
-                    continue
-                if auto_off:
-                    activate_pin(pin_num, duration)
-                else:
-                    with lock:
-                        GPIO.output(pin_num, GPIO.HIGH)
-                        active_pins[pin_num] = None
-                activated.append({'alias': alias, 'pin': pin_num})
-        res = {'success': True, 'action': action, 'group': target, 'activated': activated, 'duration': duration}
-        logger.info('Command result: %s', res)
-        return res
+        if target not in cfg.groups:
+            return {'error': 'Unknown group', 'cmd': cmd}
+        return dict(_run_group(target, duration, source), action=action)
 
     if action == 'stop':
         # target may be alias or group
-        if target in ALIASES:
-            a = ALIASES[target]
-            config_spot = a.get('config_spot') if isinstance(a, dict) else a
-            pin_num = GPIO_PINS.get(config_spot)
-            if pin_num is None:
-                res = {'error': 'Alias not mapped to a valid GPIO pin', 'cmd': cmd}
-                logger.info('Command result: %s', res)
-                return res
-            with lock:
-                GPIO.output(pin_num, GPIO.LOW)
-                if pin_num in active_pins:
-                    del active_pins[pin_num]
-            res = {'success': True, 'stopped': target, 'pin': pin_num}
-            logger.info('Command result: %s', res)
-            return res
-        elif target in GROUPS:
-            grp = GROUPS[target]
-            aliases = grp.get('aliases', []) if isinstance(grp, dict) else grp
-            stopped = []
-            for alias in aliases:
-                if alias in ALIASES:
-                    a = ALIASES[alias]
-                    config_spot = a.get('config_spot') if isinstance(a, dict) else a
-                    pin_num = GPIO_PINS.get(config_spot)
-                    if pin_num is None:
-                        continue
-                    with lock:
-                        GPIO.output(pin_num, GPIO.LOW)
-                        if pin_num in active_pins:
-                            del active_pins[pin_num]
-                    stopped.append(alias)
-            res = {'success': True, 'stopped': stopped}
-            logger.info('Command result: %s', res)
-            return res
-        else:
-            res = {'error': 'Unknown target for stop', 'cmd': cmd}
-            logger.info('Command result: %s', res)
-            return res
+        if target not in cfg.aliases and target not in cfg.groups:
+            return {'error': 'Unknown target for stop', 'cmd': cmd}
+        res = _stop_target(target, source)
+        return dict(res, cmd=cmd) if 'error' in res else res
+
+    if action == 'run':
+        program = cmd.get('program')
+        if not isinstance(program, str):
+            return {'error': 'Missing program', 'cmd': cmd}
+        try:
+            res = run_program(program, source) if plan is None else _run_plan(plan, program, source)
+        except CommandSyntaxError as e:
+            return {'error': 'Syntax error', 'details': str(e), 'cmd': cmd}
+        return dict(res, action=action)
 
     if action == 'status':
-        with lock:
-            status = {}
-            current_time = time.time()
-            for pin_num, end_time in active_pins.items():
-                if end_time is None:
-                    status[str(pin_num)] = None
-                else:
-                    remaining = max(0, end_time - current_time)
-                    status[str(pin_num)] = remaining
-        res = {'success': True, 'status': status}
-        logger.info('Command result: %s', res)
-        return res
-
-    res = {'error': 'Unknown action', 'cmd': cmd}
-    logger.info('Command result: %s', res)
-    return res
+        return {'success': True, 'status': status_snapshot()}
+
+    return {'error': 'Unknown action', 'cmd': cmd}
 
 
 @app.route('/api/ai/execute', methods=['POST'])
@@ -514,14 +1486,17 @@ def ai_execute():
 
     Supports a single `command` or an array `commands` (multi-command).
     Requires AI to be enabled and the provided api_key to match the configured key.
+    Every command is validated against the AI schema before any of them
+    runs; an invalid batch is rejected (400) as a whole.
     """
     data = request.json or {}
     api_key = data.get('api_key') or request.headers.get('Authorization', '').replace('Bearer ', '')
-    if not AI_SETTINGS.get('enabled'):
+    ai_settings = config.AI_SETTINGS
+    if not ai_settings.get('enabled'):
         return jsonify({'error': 'AI access disabled'}), 400
-    if not AI_SETTINGS.get('api_key'):
+    if not ai_settings.get('api_key'):
         return jsonify({'error': 'AI API key not configured on server'}), 400
-    if api_key != AI_SETTINGS.get('api_key'):
+    if api_key != ai_settings.get('api_key'):
         return jsonify({'error': 'Unauthorized'}), 401
 
     # Accept either a single command or an array of commands
@@ -532,10 +1507,17 @@ def ai_execute():
         commands = [data.get('command')]
     else:
         return jsonify({'error': 'Missing command(s)'}), 400
+    if not isinstance(commands, list):
+        return jsonify({'error': '`commands` must be an array'}), 400
+
+    # The whole batch is checked first: if any command is invalid, none runs
+    invalid, plans = validate_ai_commands(commands)
+    if invalid:
+        return jsonify({'error': 'Invalid command(s)', 'invalid': invalid}), 400
 
     results = []
-    for cmd in commands:
-        results.append(_execute_single_command(cmd))
+    for cmd, plan in zip(commands, plans):
+        results.append(_execute_ai_command(cmd, plan))
 
     return jsonify({'success': True, 'results': results})
 
@@ -546,23 +1528,15 @@ def reload_config():
     success = load_config()
 
     # Re-validate mappings and unset invalid entries
-    invalid_spots = []
-    for k, v in list(GPIO_PINS.items()):
-        if not isinstance(v, int) or v not in VALID_PINS:
-            if v is not None:
-                invalid_spots.append(k)
-            GPIO_PINS[k] = None
-
-    if invalid_spots:
-        # Persist corrected state
-        save_config()
+    invalid_spots = unset_invalid_mappings()
 
+    cfg = config.snapshot
     return jsonify({
         'success': bool(success),
         'invalid': invalid_spots,
-        'gpio_pins': GPIO_PINS,
-        'aliases': ALIASES,
-        'groups': GROUPS,
+        'gpio_pins': cfg.gpio_pins,
+        'aliases': cfg.aliases,
+        'groups': cfg.groups,
     })
 
 
@@ -574,16 +1548,16 @@ def manage_aliases():
       { 'name': 'alias', 'config_spot': 'config_spot1', 'auto_off': true }
     """
     if request.method == 'GET':
-        return jsonify(ALIASES)
+        return jsonify(config.ALIASES)
     
     if request.method == 'DELETE':
         data = request.json or {}
         alias_name = data.get('name')
         if not alias_name:
             return jsonify({'error': 'Missing name'}), 400
-        if alias_name in ALIASES:
-            del ALIASES[alias_name]
-            save_config()
+        with config.edit() as draft:
+            found = draft.aliases.pop(alias_name, None) is not None
+        if found:
             return jsonify({'success': True, 'deleted': alias_name})
         else:
             return jsonify({'error': 'Unknown alias'}), 400
@@ -596,17 +1570,18 @@ def manage_aliases():
     
     if not alias_name or not config_spot:
         return jsonify({'error': 'Missing name or config_spot'}), 400
-    
-    if config_spot not in GPIO_PINS:
-        return jsonify({'error': 'Invalid config_spot'}), 400
+    if str(alias_name).lower() in RESERVED_NAMES:
+        return jsonify({'error': f'{alias_name!r} is reserved by the command language'}), 400
     
     try:
         auto_off = bool(auto_off)
     except Exception:
         auto_off = True
     
-    ALIASES[alias_name] = {'config_spot': config_spot, 'auto_off': auto_off}
-    save_config()
+    with config.edit() as draft:
+        if config_spot not in draft.gpio_pins:
+            return jsonify({'error': 'Invalid config_spot'}), 400
+        draft.aliases[alias_name] = {'config_spot': config_spot, 'auto_off': auto_off}
     return jsonify({'success': True, 'alias': alias_name, 'config_spot': config_spot, 'auto_off': auto_off})
 
 
@@ -614,16 +1589,18 @@ def manage_aliases():
 def manage_gpio_pins():
     """Get, add/update, or remove GPIO pin mappings"""
     if request.method == 'GET':
-        return jsonify(GPIO_PINS)
+        return jsonify(config.GPIO_PINS)
     
     if request.method == 'DELETE':
         data = request.json or {}
         config_spot = data.get('config_spot')
         if not config_spot:
             return jsonify({'error': 'Missing config_spot'}), 400
-        if config_spot in GPIO_PINS:
-            GPIO_PINS[config_spot] = None
-            save_config()
+        with config.edit() as draft:
+            found = config_spot in draft.gpio_pins
+            if found:
+                draft.gpio_pins[config_spot] = None
+        if found:
             return jsonify({'success': True, 'config_spot': config_spot, 'pin_num': None})
         else:
             return jsonify({'error': 'Unknown config_spot'}), 400
@@ -642,8 +1619,8 @@ def manage_gpio_pins():
     if pin_num < 2 or pin_num > 27:
         return jsonify({'error': 'Pin number must be between 2 and 27'}), 400
     
-    GPIO_PINS[config_spot] = pin_num
-    save_config()
+    with config.edit() as draft:
+        draft.gpio_pins[config_spot] = pin_num
     return jsonify({'success': True, 'config_spot': config_spot, 'pin_num': pin_num})
 
 
@@ -652,7 +1629,8 @@ def reset_gpio_pins():
     """Reset GPIO pin mappings back to defaults"""
     try:
         reset_gpio_pins_to_defaults()
-        return jsonify({'success': True, 'message': 'GPIO pins reset to defaults', 'gpio_pins': GPIO_PINS})
+        return jsonify({'success': True, 'message': 'GPIO pins reset to defaults',
+                        'gpio_pins': config.GPIO_PINS})
     except Exception as e:
         logger.exception('Reset GPIO defaults failed')
         return jsonify({'error': str(e)}), 500
@@ -664,21 +1642,26 @@ def manage_groups():
 
     Group format:
       { 'name': 'group', 'aliases': ['a','b'], 'action': 'on'|'off' }
+    `aliases` may also name other groups; cycles are rejected.
     """
     if request.method == 'GET':
-        return jsonify(GROUPS)
+        return jsonify(config.GROUPS)
     
     if request.method == 'DELETE':
         data = request.json or {}
         group_name = data.get('name')
         if not group_name:
             return jsonify({'error': 'Missing group name'}), 400
-        if group_name in GROUPS:
-            del GROUPS[group_name]
-            save_config()
-            return jsonify({'success': True, 'deleted': group_name})
-        else:
-            return jsonify({'error': 'Unknown group'}), 400
+        with config.edit() as draft:
+            if group_name not in draft.groups:
+                return jsonify({'error': 'Unknown group'}), 400
+            users = [g for g, grp in draft.groups.items()
+                     if g != group_name and group_name in group_members(grp)]
+            users += [f'interlock {n}' for n, il in draft.interlocks.items() if group_name in il.get('members', [])]
+            if users:
+                return jsonify({'error': f'Group is used by: {", ".join(users)}'}), 400
+            del draft.groups[group_name]
+        return jsonify({'success': True, 'deleted': group_name})
     
     # POST - update a group
     data = request.json
@@ -688,20 +1671,179 @@ def manage_groups():
     
     if not group_name:
         return jsonify({'error': 'Missing group name'}), 400
-    
-    # Validate all aliases exist
-    for alias in aliases_list:
-        if alias not in ALIASES:
-            return jsonify({'error': f'Unknown alias: {alias}'}), 400
+    if str(group_name).lower() in RESERVED_NAMES:
+        return jsonify({'error': f'{group_name!r} is reserved by the command language'}), 400
     
     if action not in ('on', 'off'):
         return jsonify({'error': 'Invalid action; must be "on" or "off"'}), 400
     
-    GROUPS[group_name] = {'aliases': aliases_list, 'action': action}
-    save_config()
+    with config.edit() as draft:
+        # Members may be aliases or other groups
+        for alias in aliases_list:
+            if alias not in draft.aliases and alias not in draft.groups and alias != group_name:
+                return jsonify({'error': f'Unknown alias or group: {alias}'}), 400
+        
+        cycle = find_cycle(draft.groups, group_name, aliases_list)
+        if cycle:
+            return jsonify({'error': f'Group cycle: {" -> ".join(cycle)}'}), 400
+        
+        draft.groups[group_name] = {'aliases': aliases_list, 'action': action}
     return jsonify({'success': True, 'group': group_name, 'aliases': aliases_list, 'action': action})
 
 
+@app.route('/api/config/interlocks', methods=['GET', 'POST', 'DELETE'])
+def manage_interlocks():
+    """Get, add/update, or remove interlocks
+
+    Interlock format:
+      { 'name': 'drive', 'members': ['forward', 'backward'], 'policy': 'reject'|'queue'|'preempt' }
+    """
+    if request.method == 'GET':
+        return jsonify(config.INTERLOCKS)
+    
+    data = request.json or {}
+    name = data.get('name')
+    if not name:
+        return jsonify({'error': 'Missing interlock name'}), 400
+    
+    if request.method == 'DELETE':
+        with config.edit() as draft:
+            found = draft.interlocks.pop(name, None) is not None
+        if not found:
+            return jsonify({'error': 'Unknown interlock'}), 400
+        return jsonify({'success': True, 'deleted': name})
+    
+    # POST - add or update an interlock
+    members = data.get('members', [])
+    policy = data.get('policy', 'reject')
+    if not isinstance(members, list) or len(members) < 2:
+        return jsonify({'error': 'An interlock needs at least two members'}), 400
+    if policy not in INTERLOCK_POLICIES:
+        return jsonify({'error': 'Invalid policy; must be "reject", "queue" or "preempt"'}), 400
+    with config.edit() as draft:
+        for member in members:
+            if member not in draft.aliases and member not in draft.groups:
+                return jsonify({'error': f'Unknown alias or group: {member}'}), 400
+        draft.interlocks[name] = {'members': members, 'policy': policy}
+    return jsonify({'success': True, 'interlock': name, 'members': members, 'policy': policy})
+
+
+@app.route('/api/config/inputs', methods=['GET', 'POST', 'DELETE'])
+def manage_inputs():
+    """Get, add/update, or remove inputs
+
+    Input format:
+      { 'name': 'bumper', 'config_spot': 'config_spot27', 'pull': 'up'|'down'|'off', 'bounce_ms': 20 }
+    The config spot's pin is read instead of driven; aliases on it stop working.
+    """
+    if request.method == 'GET':
+        return jsonify(config.INPUTS)
+
+    data = request.json or {}
+    name = data.get('name')
+    if not name:
+        return jsonify({'error': 'Missing input name'}), 400
+
+    if request.method == 'DELETE':
+        with config.edit() as draft:
+            if name not in draft.inputs:
+                return jsonify({'error': 'Unknown input'}), 400
+            users = [r for r, rule in draft.rules.items() if rule.get('input') == name]
+            if users:
+                return jsonify({'error': f'Input is used by: {", ".join(users)}'}), 400
+            del draft.inputs[name]
+        group_index()
+        return jsonify({'success': True, 'deleted': name})
+
+    # POST - add or update an input
+    entry = {'config_spot': data.get('config_spot'), 'pull': data.get('pull', 'up'),
+             'bounce_ms': data.get('bounce_ms', 20)}
+    problem = check_input(entry)
+    if problem:
+        return jsonify({'error': problem}), 400
+    with config.edit() as draft:
+        if entry['config_spot'] not in draft.gpio_pins:
+            return jsonify({'error': 'Invalid config_spot'}), 400
+        taken = [n for n, inp in draft.inputs.items() if n != name and inp.get('config_spot') == entry['config_spot']]
+        if taken:
+            return jsonify({'error': f'Config spot is already input {taken[0]}'}), 400
+        draft.inputs[name] = entry
+    group_index()
+    return jsonify(dict(entry, success=True, input=name))
+
+
+@app.route('/api/config/rules', methods=['GET', 'POST', 'DELETE'])
+def manage_rules():
+    """Get, add/update, or remove input rules
+
+    Rule format:
+      { 'name': 'bump_stop', 'input': 'bumper', 'edge': 'rising'|'falling'|'both', 'run': 'stop' }
+    """
+    if request.method == 'GET':
+        return jsonify(config.RULES)
+
+    data = request.json or {}
+    name = data.get('name')
+    if not name:
+        return jsonify({'error': 'Missing rule name'}), 400
+
+    if request.method == 'DELETE':
+        with config.edit() as draft:
+            found = draft.rules.pop(name, None) is not None
+        if not found:
+            return jsonify({'error': 'Unknown rule'}), 400
+        group_index()
+        return jsonify({'success': True, 'deleted': name})
+
+    # POST - add or update a rule
+    entry = {'input': data.get('input'), 'edge': data.get('edge', 'rising'), 'run': data.get('run')}
+    if entry['edge'] not in EDGES:
+        return jsonify({'error': 'Invalid edge; must be "rising", "falling" or "both"'}), 400
+    if not isinstance(entry['run'], str) or not entry['run'].strip():
+        return jsonify({'error': 'Missing run'}), 400
+    try:
+        plan = compile_program(entry['run'])
+    except CommandSyntaxError as e:
+        return jsonify({'error': 'Syntax error', 'details': str(e), 'pos': e.pos}), 400
+    with config.edit() as draft:
+        if entry['input'] not in draft.inputs:
+            return jsonify({'error': f'Unknown input: {entry["input"]}'}), 400
+        unknown = [t for t in command_lang.targets(plan) if t not in draft.groups and t not in draft.aliases]
+        if unknown:
+            return jsonify({'error': 'Unknown target', 'targets': unknown}), 400
+        draft.rules[name] = entry
+    group_index()
+    return jsonify(dict(entry, success=True, rule=name))
+
+
+@app.route('/api/gpio', methods=['GET', 'POST'])
+def gpio_status():
+    """The GPIO backend in use, the pins it has set up, and its write count and startup time.
+
+    POST { 'backend': 'gpiochip', 'chip': '/dev/gpiochip0' } stores the
+    backend to use from the next start (config GPIO_SETTINGS).
+    """
+    if request.method == 'POST':
+        data = request.json or {}
+        with config.edit() as draft:
+            settings = dict(draft.gpio_settings)
+            settings.update((k, data[k]) for k in ('backend', 'chip') if k in data)
+            if settings['backend'] not in gpio_backend.BACKENDS:
+                return jsonify({'error': f'Unknown backend; use one of: {", ".join(gpio_backend.BACKENDS)}'}), 400
+            if not isinstance(settings['chip'], str) or not settings['chip']:
+                return jsonify({'error': 'chip must be a device path'}), 400
+            draft.gpio_settings = settings
+        return jsonify(dict(settings, success=True))
+    return jsonify(dict(GPIO.to_dict(), settings=config.GPIO_SETTINGS))
+
+
+@app.route('/api/inputs', methods=['GET'])
+def inputs_status():
+    """Input levels and edge counts, and each rule's runs and reaction times."""
+    group_index()
+    return jsonify(input_watcher.to_dict())
+
+
 @app.route('/api/activate', methods=['POST'])
 def activate():
     """Activate an alias for specified duration. Respects per-alias `auto_off` setting."""
@@ -709,39 +1851,13 @@ def activate():
     alias = data.get('alias')
     duration = float(data.get('duration', 1.0))
     
-    if alias not in ALIASES:
+    if alias not in config.ALIASES:
         return jsonify({'error': 'Unknown alias'}), 400
-    # alias may be dict
-    a = ALIASES[alias]
-    if isinstance(a, str):
-        config_spot = a
-        auto_off = True
-    else:
-        config_spot = a.get('config_spot')
-        auto_off = bool(a.get('auto_off', True))
-    
-    pin_num = GPIO_PINS.get(config_spot)
     
-    if pin_num is None:
+    result = _run_alias(alias, duration)
+    if 'error' in result:
         return jsonify({'error': 'Alias not mapped to a valid GPIO pin'}), 400
-    if pin_num not in VALID_PINS:
-        return jsonify({'error': 'Configured pin is invalid'}), 400
-    
-    if auto_off:
-        activate_pin(pin_num, duration)
-    else:
-        # Set indefinitely until manually stopped
-        with lock:
-            GPIO.output(pin_num, GPIO.HIGH)
-            active_pins[pin_num] = None
-    
-    return jsonify({
-        'success': True,
-        'alias': alias,
-        'pin': pin_num,
-        'duration': duration,
-        'auto_off': auto_off
-    })
+    return jsonify(result)
 
 
 @app.route('/api/activate-group', methods=['POST'])
@@ -751,70 +1867,230 @@ def activate_group():
     group = data.get('group')
     duration = float(data.get('duration', 1.0))
     
-    if group not in GROUPS:
+    if group not in config.GROUPS:
         return jsonify({'error': 'Unknown group'}), 400
     
-    grp = GROUPS[group]
-    if isinstance(grp, list):
-        aliases = grp
-        action = 'on'
+    result = _run_group(group, duration)
+    result['action'] = result.pop('group_action')
+    return jsonify(result)
+
+
+@app.route('/api/run', methods=['POST'])
+def run_commands():
+    """Run a command-language program, e.g. {"program": "forward(2); left(500ms); stop"}"""
+    data = request.json or {}
+    program = data.get('program')
+    if not isinstance(program, str) or not program.strip():
+        return jsonify({'error': 'Missing program'}), 400
+    try:
+        result = run_program(program)
+    except CommandSyntaxError as e:
+        return jsonify({'error': 'Syntax error', 'details': str(e), 'pos': e.pos}), 400
+    return jsonify(result), (400 if 'error' in result else 200)
+
+
+def binary_status(since=None):
+    """Current state as a status_codec frame; a delta if `since` is still in the ring."""
+    version, pins, mask = current_state
+    since_pins = None
+    if since is not None:
+        seen = _recent_states[since % STATE_RING]
+        if seen is not None and seen[0] & 0xFFFFFFFF == since:
+            since_pins = seen[1]
+    return status_codec.encode(version, mask, pins, time.time(), since_pins)
+
+
+@app.route('/api/status', methods=['GET'])
+def get_status():
+    """Get status of all active pins.
+
+    ?format=bin or `Accept: application/x-robotcli-status` selects the
+    compact binary frame (see status_codec.py); add since=<seq> for a delta.
+    Binary responses carry the config version in X-Config-Version, so a
+    polling client knows when to refetch /api/config.
+    """
+    fmt = request.args.get('format')
+    if fmt == 'bin' or (fmt is None and status_codec.MIMETYPE in request.accept_mimetypes.values()):
+        body = binary_status(request.args.get('since', type=int))
+        response = Response(body, mimetype=status_codec.MIMETYPE)
+        response.headers['Cache-Control'] = 'no-store'
+        response.headers['X-Config-Version'] = str(config.snapshot.version)
+        response.vary.add('Accept')
+        return response
+    return jsonify(status_snapshot())
+
+
+@app.route('/api/lease', methods=['GET', 'POST'])
+def lease_collection():
+    """GET lists live leases; POST {"target": "forward", "ttl": 2} takes a new one."""
+    if request.method == 'GET':
+        now = time.monotonic()
+        return jsonify({'leases': [lease.to_dict(now) for lease in list(leases.values())]})
+    data = request.json or {}
+    target = data.get('target') or data.get('alias') or data.get('group')
+    try:
+        result = create_lease(target, data.get('ttl'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(result), (400 if 'error' in result else 200)
+
+
+@app.route('/api/lease/<lease_id>/renew', methods=['POST'])
+def lease_renew(lease_id):
+    """Keep a lease alive for another TTL. Optional body {"ttl": seconds}."""
+    ttl = None
+    if request.content_length:
+        data = request.get_json(silent=True) or {}
+        if data.get('ttl') is not None:
+            try:
+                ttl = _lease_ttl(data['ttl'])
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+    lease = renew_lease(lease_id, ttl)
+    if lease is None:
+        return jsonify({'error': 'Lease expired or released', 'lease': lease_id}), 410
+    return jsonify({'success': True, 'lease': lease_id, 'ttl': lease.ttl})
+
+
+@app.route('/api/lease/<lease_id>', methods=['DELETE'])
+def lease_release(lease_id):
+    if release_lease(lease_id) is None:
+        return jsonify({'error': 'Lease expired or released', 'lease': lease_id}), 410
+    return jsonify({'success': True, 'lease': lease_id})
+
+
+@app.route('/api/schedule', methods=['GET', 'POST'])
+def schedule_collection():
+    """GET lists scheduled jobs; POST adds one, e.g.
+    {"program": "relay_1(5)", "every": "10m"} or {"program": "lights_on", "daily": "19:00"}.
+    """
+    if request.method == 'GET':
+        return jsonify({'jobs': [job.to_dict() for job in scheduler.list()], 'scheduler': scheduler.to_dict()})
+    data = request.json or {}
+    data.pop('id', None)
+    try:
+        job = Job.from_dict(data, scheduler.clock())
+        plan = compile_program(job.program)
+    except CommandSyntaxError as e:
+        return jsonify({'error': 'Syntax error', 'details': str(e), 'pos': e.pos}), 400
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    cfg = config.snapshot
+    unknown = [name for name in command_lang.targets(plan) if name not in cfg.groups and name not in cfg.aliases]
+    if unknown:
+        return jsonify({'error': 'Unknown target', 'targets': unknown}), 400
+    try:
+        scheduler.add(job)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(dict(job.to_dict(), success=True))
+
+
+@app.route('/api/schedule/<job_id>', methods=['GET', 'DELETE'])
+def schedule_job(job_id):
+    if request.method == 'DELETE':
+        job = scheduler.remove(job_id)
     else:
-        aliases = grp.get('aliases', [])
-        action = grp.get('action', 'on')
+        job = scheduler.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job', 'id': job_id}), 404
+    return jsonify(dict(job.to_dict(), success=True) if request.method == 'DELETE' else job.to_dict())
 
-    activated = []
-    
-    for alias in aliases:
-        if alias in ALIASES:
-            a = ALIASES[alias]
-            if isinstance(a, str):
-                config_spot = a
-                auto_off = True
-            else:
-                config_spot = a.get('config_spot')
-                auto_off = bool(a.get('auto_off', True))
-            pin_num = GPIO_PINS.get(config_spot)
-            if pin_num is None or pin_num not in VALID_PINS:
-                continue
-            if action == 'on':
-                if auto_off:
-                    activate_pin(pin_num, duration)
-                else:
-                    with lock:
-                        GPIO.output(pin_num, GPIO.HIGH)
-                        active_pins[pin_num] = None
-                activated.append({'alias': alias, 'pin': pin_num})
-            else:
-                # action == 'off'
-                with lock:
-                    GPIO.output(pin_num, GPIO.LOW)
-                    if pin_num in active_pins:
-                        del active_pins[pin_num]
-                activated.append({'alias': alias, 'pin': pin_num})
-    
+
+@app.route('/api/teleop', methods=['GET'])
+def teleop_info():
+    """Teleop listener state and packet counters."""
+    return jsonify({'enabled': teleop_port is not None, 'port': teleop_port, 'stats': teleop_stats})
+
+
+@app.route('/api/teleop/targets', methods=['GET'])
+def teleop_target_table():
+    """Target ids and the listener epoch for teleop packets; the version changes with the config."""
+    _, version, names, _ = teleop_targets()
+    return jsonify({'version': version, 'epoch': teleop_epoch,
+                    'targets': {name: i for i, name in enumerate(names)}})
+
+
+@app.route('/api/estop', methods=['GET', 'POST'])
+def estop():
+    """Emergency stop: all outputs LOW, activations rejected until reset.
+
+    GET returns the latch state and measured latencies.
+    """
+    if request.method == 'GET':
+        return jsonify(dict(estop_stats, engaged=estop_engaged))
+    return jsonify(dict(emergency_stop('api'), success=True))
+
+
+@app.route('/api/estop/reset', methods=['POST'])
+def estop_reset():
+    """Release the emergency stop latch"""
+    reset_emergency_stop()
+    return jsonify({'success': True, 'engaged': False})
+
+
+@app.route('/api/history', methods=['GET'])
+def get_history():
+    """Return recorded pin transitions, oldest first.
+
+    Query parameters (all optional):
+      since, until  wall-clock epoch seconds (inclusive)
+      pin           pin number; repeat or comma-separate for several
+      limit         keep only the newest N matching events
+    """
+    try:
+        since = request.args.get('since', type=float)
+        until = request.args.get('until', type=float)
+        limit = request.args.get('limit', type=int)
+        pins = None
+        raw_pins = request.args.getlist('pin')
+        if raw_pins:
+            pins = {int(p) for raw in raw_pins for p in raw.split(',') if p.strip()}
+    except ValueError:
+        return jsonify({'error': 'Invalid pin filter'}), 400
+    offset = history.wall_offset
+    events = history.query(
+        since=None if since is None else since - offset,
+        until=None if until is None else until - offset,
+        pins=pins,
+        limit=limit,
+    )
+    return jsonify({'events': events, 'capacity': history.capacity, 'recorded': len(history)})
+
+
+@app.route('/api/usage', methods=['GET'])
+def get_usage():
+    """Cumulative on-time and cycle counts per pin, with per-alias rollups."""
+    pins = usage.snapshot(ALL_OUTPUTS)
+    aliases = {}
+    cfg = config.snapshot
+    for alias, a in cfg.aliases.items():
+        config_spot = a.get('config_spot') if isinstance(a, dict) else a
+        pin_num = cfg.gpio_pins.get(config_spot)
+        if pin_num in pins:
+            aliases[alias] = dict(pins[pin_num], pin=pin_num)
     return jsonify({
-        'success': True,
-        'group': group,
-        'activated': activated,
-        'duration': duration,
-        'action': action
+        'pins': {str(pin): stats for pin, stats in pins.items()},
+        'aliases': aliases,
+        'saved_at': usage.saved_at,
     })
 
 
-@app.route('/api/status', methods=['GET'])
-def get_status():
-    """Get status of all active pins"""
-    with lock:
-        status = {}
-        current_time = time.time()
-        for pin_num, end_time in active_pins.items():
-            if end_time is None:
-                status[str(pin_num)] = None
-            else:
-                remaining = max(0, end_time - current_time)
-                status[str(pin_num)] = remaining
-    
-    return jsonify(status)
+@app.route('/api/usage/reset', methods=['POST'])
+def reset_usage():
+    """Zero the usage counters of one pin ({"pin": 4}) or of every pin."""
+    data = request.json or {}
+    pin_num = data.get('pin')
+    if pin_num is not None:
+        try:
+            pin_num = int(pin_num)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Invalid pin'}), 400
+        if pin_num not in VALID_PINS:
+            return jsonify({'error': 'Invalid pin'}), 400
+    usage.reset(pin_num)
+    usage.save()
+    return jsonify({'success': True, 'pin': pin_num})
 
 
 @app.route('/api/stop', methods=['POST'])
@@ -824,30 +2100,30 @@ def stop():
     alias = data.get('alias')
     
     if alias:
-        if alias not in ALIASES:
+        if alias not in config.ALIASES:
             return jsonify({'error': 'Unknown alias'}), 400
         
-        config_spot = ALIASES[alias]
-        pin_num = GPIO_PINS.get(config_spot)
-        if pin_num is None:
-            return jsonify({'error': 'Alias not mapped to a valid GPIO pin'}), 400
-        
-        with lock:
-            GPIO.output(pin_num, GPIO.LOW)
-            if pin_num in active_pins:
-                del active_pins[pin_num]
-        
-        return jsonify({'success': True, 'alias': alias, 'pin': pin_num})
+        result = _stop_target(alias)
+        if 'error' in result:
+            return jsonify({'error': result['error']}), 400
+        return jsonify({'success': True, 'alias': alias, 'pin': result['pin']})
     else:
-        # Stop all
-        with lock:
-            for pin_num in active_pins.keys():
-                GPIO.output(pin_num, GPIO.LOW)
-            active_pins.clear()
+        # Stop all: every configured output, not just the ones we are tracking
+        _stop_target(None)
         
         return jsonify({'success': True, 'message': 'All pins stopped'})
 
 
+@app.errorhandler(EmergencyStopActive)
+def handle_estop_active(e):
+    return jsonify({'error': str(e), 'estop': True}), 409
+
+
+@app.errorhandler(InterlockConflict)
+def handle_interlock_conflict(e):
+    return jsonify({'error': str(e), 'interlock': True, 'pins': e.pins}), 409
+
+
 @app.errorhandler(Exception)
 def handle_unhandled_exception(e):
     logger.exception('Unhandled exception')
@@ -855,11 +2131,33 @@ def handle_unhandled_exception(e):
     return jsonify({'error': 'Internal server error', 'details': str(e)}), 500
 
 
+def _handle_estop_signal(signum, frame):
+    emergency_stop('signal')
+
+
+def _handle_terminate(signum, frame):
+    emergency_stop('signal')
+    raise SystemExit(0)
+
+
 if __name__ == '__main__':
+    # `kill -USR1 <pid>` triggers the emergency stop; SIGTERM stops then exits
+    signal.signal(signal.SIGUSR1, _handle_estop_signal)
+    signal.signal(signal.SIGTERM, _handle_terminate)
     try:
+        # ROBOTCLI_PORT lets several servers run on one machine (e.g. fleet tests)
+        port = int(os.environ.get('ROBOTCLI_PORT', 8000))
         print("🤖 RobotCLI Web Server starting...")
-        print("📡 Access at: http://<your-pi-ip>:8000")
-        app.run(host='0.0.0.0', port=8000, debug=False)
+        print(f"📡 Access at: http://<your-pi-ip>:{port}")
+        if os.environ.get('ROBOTCLI_TELEOP_PORT'):
+            if os.environ.get('ROBOTCLI_TELEOP_KEY'):
+                udp_port = start_teleop(int(os.environ['ROBOTCLI_TELEOP_PORT']), os.environ['ROBOTCLI_TELEOP_KEY'],
+                                        os.environ.get('ROBOTCLI_HOST', '0.0.0.0'))
+                print(f"🎮 Teleop on udp/{udp_port}")
+            else:
+                print("⚠️ ROBOTCLI_TELEOP_PORT is set but ROBOTCLI_TELEOP_KEY is not; teleop disabled")
+        app.run(host=os.environ.get('ROBOTCLI_HOST', '0.0.0.0'), port=port, debug=False)
     finally:
+        input_watcher.close()
         GPIO.cleanup()
         print("\n✋ GPIO cleanup completed")